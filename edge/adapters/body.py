@@ -0,0 +1,79 @@
+"""
+The request body as every adapter sees it, with any Content-Encoding removed.
+
+Senders may compress their webhooks with gzip, deflate, or zstd (when the
+`zstandard` package is installed). The compressed bytes are still bounded by
+MAX_CONTENT_LENGTH; the decoded body is additionally capped at
+max_decompressed_body_mb, and inflating stops as soon as it passes the cap.
+
+The body is decoded at most once per request, so an adapter that verifies a
+signature and then parses JSON reads the same bytes twice for free.
+Signatures are checked against the decoded body. Adapters call read_body()
+only once the caller is authenticated or a signature has to be checked, so
+anonymous requests are not decompressed.
+"""
+
+from flask import g, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from config.settings import EdgeConfig
+from services.compression import DecompressionError, UnsupportedEncoding, inflate
+
+from .types import IngressError
+
+IDENTITY = 'identity'
+
+
+def read_body(config: EdgeConfig, log_json, correlation_id: str, edge_key: str) -> bytes:
+    """Return the decoded request body, raising IngressError when it is unusable or too large."""
+    if 'decoded_body' not in g:
+        try:
+            g.decoded_body = _decode(config, log_json, correlation_id, edge_key)
+        except RequestEntityTooLarge as exc:
+            # Over MAX_CONTENT_LENGTH; adapters that turn other errors into 400 must not swallow it.
+            log_json('warn', correlation_id, 'Request too large', edge_key=edge_key)
+            raise IngressError(413, 'Request body too large') from exc
+    return g.decoded_body
+
+
+def _decode(config: EdgeConfig, log_json, correlation_id: str, edge_key: str) -> bytes:
+    encoding = request.headers.get('Content-Encoding', IDENTITY).strip().lower()
+    if encoding == IDENTITY:
+        return request.get_data()
+
+    limit = config.max_decompressed_body_mb * 1024 * 1024
+    body = bytearray()
+    try:
+        for chunk in inflate(request.stream, encoding):
+            body += chunk
+            if len(body) > limit:
+                log_json(
+                    'warn',
+                    correlation_id,
+                    'Decompressed body too large',
+                    edge_key=edge_key,
+                    encoding=encoding,
+                    limit=limit,
+                )
+                raise IngressError(413, 'Request body too large')
+    except UnsupportedEncoding as exc:
+        log_json(
+            'warn',
+            correlation_id,
+            'Unsupported Content-Encoding',
+            edge_key=edge_key,
+            encoding=encoding,
+        )
+        raise IngressError(415, f'Unsupported Content-Encoding: {encoding}') from exc
+    except DecompressionError as exc:
+        log_json(
+            'warn',
+            correlation_id,
+            'Corrupt compressed body',
+            edge_key=edge_key,
+            encoding=encoding,
+            error=str(exc),
+        )
+        raise IngressError(400, 'Invalid compressed body') from exc
+
+    return bytes(body)
@@ -2,8 +2,9 @@
 Native ingress adapter.
 
 The original webhook-router protocol: a bearer token from EDGE_KEYS_FILE plus
-a {"destination": ..., "payload": ...} envelope. This remains the default
-escape hatch for any caller that can speak it.
+a {"destination": ..., "payload": ...} envelope, optionally with
+"delay_seconds" or "deliver_at" to schedule the delivery. This remains the
+default escape hatch for any caller that can speak it.
 """
 
 from typing import Dict, Optional
@@ -11,7 +12,10 @@ from typing import Dict, Optional
 from flask import request
 
 from config.settings import EdgeConfig
+from services import json_codec
+from services.edge_key_store import EdgeKeyStore
 
+from .body import read_body
 from .types import IngressError, IngressMessage
 
 
@@ -28,16 +32,18 @@ def adapt(config: EdgeConfig, log_json, correlation_id: str) -> IngressMessage:
         )
         raise IngressError(401, 'Unauthorized')
 
-    body = _parse_request_body(correlation_id, log_json, edge_key_name)
+    body = _parse_request_body(config, correlation_id, log_json, edge_key_name)
 
     return IngressMessage(
         destination=body['destination'],
         payload=body['payload'],
         source=edge_key_name,
+        delay_seconds=body.get('delay_seconds'),
+        deliver_at=body.get('deliver_at'),
     )
 
 
-def _validate_bearer_token(auth_header: Optional[str], edge_keys: Dict[str, str]) -> Optional[str]:
+def _validate_bearer_token(auth_header: Optional[str], edge_keys: EdgeKeyStore) -> Optional[str]:
     """Validate bearer token and return key name if valid."""
     if not auth_header:
         return None
@@ -50,10 +56,13 @@ def _validate_bearer_token(auth_header: Optional[str], edge_keys: Dict[str, str]
     return edge_keys.get(token)
 
 
-def _parse_request_body(correlation_id: str, log_json, edge_key_name: str) -> Dict:
+def _parse_request_body(config: EdgeConfig, correlation_id: str, log_json, edge_key_name: str) -> Dict:
     """Parse the JSON payload and validate required fields."""
     try:
-        body = request.get_json(force=True)
+        body = json_codec.loads(read_body(config, log_json, correlation_id, edge_key_name))
+    except IngressError:
+        # Compressed bodies that cannot be decoded carry their own status.
+        raise
     except Exception as exc:  # pylint: disable=broad-except
         log_json(
             'warn',
@@ -15,20 +15,24 @@ Signature scheme (see https://tailscale.com/kb/1213/webhooks):
 Several v1 values may be present while a webhook secret is being rotated, so
 any matching candidate is accepted.
 
+If the body arrives compressed, the signature is checked against the decoded
+bytes, the same ones that are then parsed.
+
 This module is the only place in the project that knows Tailscale exists. It
 knows nothing about the internal service the events end up at.
 """
 
 import hashlib
 import hmac
-import json
 import time
 from typing import List, Optional, Tuple
 
 from flask import request
 
 from config.settings import EdgeConfig
+from services import json_codec
 
+from .body import read_body
 from .types import IngressError, IngressMessage
 
 SIGNATURE_HEADER = 'Tailscale-Webhook-Signature'
@@ -49,7 +53,7 @@ def adapt(config: EdgeConfig, log_json, correlation_id: str) -> IngressMessage:
         )
         raise IngressError(503, 'Tailscale ingress not configured')
 
-    raw_body = request.get_data()
+    raw_body = read_body(config, log_json, correlation_id, SOURCE)
     signature_header = request.headers.get(SIGNATURE_HEADER)
 
     if not _verify_signature(raw_body, signature_header, config.tailscale_webhook_secret):
@@ -63,7 +67,7 @@ def adapt(config: EdgeConfig, log_json, correlation_id: str) -> IngressMessage:
 
     # Only parse once the bytes are known to be authentic.
     try:
-        events = json.loads(raw_body)
+        events = json_codec.loads(raw_body)
     except (ValueError, UnicodeDecodeError) as exc:
         log_json(
             'warn',
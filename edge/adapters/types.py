@@ -1,7 +1,7 @@
 """Canonical ingress types shared by every ingress adapter."""
 
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Dict
 
 
 @dataclass(frozen=True)
@@ -17,6 +17,19 @@ class IngressMessage:
     destination: str
     payload: Any
     source: str
+    # Optional delayed delivery, passed to the router as given: either
+    # `delay_seconds` or `deliver_at`. The router validates it.
+    delay_seconds: Any = None
+    deliver_at: Any = None
+
+    def envelope(self) -> Dict[str, Any]:
+        """The body sent to the router for this message."""
+        body = {'destination': self.destination, 'payload': self.payload}
+        if self.delay_seconds is not None:
+            body['delay_seconds'] = self.delay_seconds
+        if self.deliver_at is not None:
+            body['deliver_at'] = self.deliver_at
+        return body
 
 
 class IngressError(Exception):
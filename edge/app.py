@@ -11,7 +11,9 @@ from config import load_edge_config
 from http_handlers.error_handlers import register_error_handlers
 from http_handlers.webhook import create_edge_blueprint
 from logging_utils import log_json, setup_logging
+from services.router_batcher import RouterBatcher
 from services.router_forwarder import RouterForwarder
+from services.router_ring import RouterHealthChecker
 
 
 def create_app() -> Flask:
@@ -28,14 +30,77 @@ def create_app() -> Flask:
         config.router_ingress_key,
         config.request_timeout,
         json_logger,
+        config.router_compression,
+        config.router_compression_min_bytes,
+        config.router_envelope_format,
     )
+    router_ring = router_forwarder.ring
+    if config.router_health_check_seconds > 0:
+        RouterHealthChecker(
+            router_ring,
+            config.router_health_check_seconds,
+            config.router_health_check_timeout,
+            json_logger,
+        ).start()
+    if config.router_batch_max_items > 1:
+        router_forwarder = RouterBatcher(
+            router_forwarder,
+            config.router_batch_max_items,
+            config.router_batch_max_bytes,
+            config.router_batch_linger_ms,
+            json_logger,
+            max(1, config.router_batch_flush_workers),
+        )
 
     app.register_blueprint(create_edge_blueprint(config, router_forwarder, json_logger))
     register_error_handlers(app, json_logger)
 
     logger.info('Edge service starting with %s keys configured', len(config.edge_keys))
-    logger.info('Router URL: %s', config.router_url)
+    logger.info('Router URLs: %s', ', '.join(router_ring.urls))
+    if config.router_health_check_seconds > 0:
+        logger.info('Router health checked every %ss', config.router_health_check_seconds)
     logger.info('Request timeout: %ss', config.request_timeout)
+    logger.info('Router envelope format: %s', config.router_envelope_format)
+    if config.router_compression:
+        logger.info(
+            'Router requests of %s bytes or more sent with %s',
+            config.router_compression_min_bytes,
+            config.router_compression,
+        )
+    if config.router_batch_max_items > 1:
+        logger.info(
+            'Router batching: up to %s items / %s bytes, linger %sms, %s batches at once',
+            config.router_batch_max_items,
+            config.router_batch_max_bytes,
+            router_forwarder.linger * 1000,
+            router_forwarder.flush_workers,
+        )
+
+    if config.concurrency_limit_max > 0:
+        logger.info(
+            'Adaptive concurrency limit between %s and %s requests (shed first: %s)',
+            config.concurrency_limit_min,
+            config.concurrency_limit_max,
+            ', '.join(config.shed_first_adapters) or 'none',
+        )
+
+    if config.adapter_priorities or config.edge_key_priorities:
+        logger.info(
+            'Priority lanes: adapters %s, edge keys %s, slots %s',
+            config.adapter_priorities,
+            config.edge_key_priorities,
+            config.lane_slots,
+        )
+
+    for adapter, ip_filter in config.ip_filters.items():
+        logger.info(
+            'Client IP filter for %s: %s allowed networks, %s denied',
+            adapter,
+            len(ip_filter.allow) if ip_filter.allow is not None else 'all',
+            len(ip_filter.deny) if ip_filter.deny is not None else 0,
+        )
+    if config.trusted_proxies is not None:
+        logger.info('Trusting X-Real-IP from loopback and %s proxy networks', len(config.trusted_proxies))
 
     if config.tailscale_webhook_secret:
         logger.info('Tailscale ingress enabled at /tailscale')
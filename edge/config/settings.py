@@ -1,10 +1,23 @@
 import os
 import sys
-import json
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
 from logging import Logger
 
+from services.compression import available_encodings
+from services.edge_key_store import EdgeKeyError, EdgeKeyStore
+from services.ip_filter import CidrTree, IpFilter, parse_cidrs
+from services.envelope_codec import JSON_FORMAT, available_formats
+from services.priority_lanes import LOW, NORMAL, PRIORITIES
+from services.router_ring import parse_router_urls
+
+# Names of the ingress adapters, as used in SHED_FIRST_ADAPTERS.
+ADAPTER_NAMES = ('native', 'tailscale')
+
+# Per-worker defaults sized for gunicorn's --threads 4: a low-priority flood
+# holds at most two threads (slot plus waiter), a normal one at most three.
+DEFAULT_LANE_SLOTS = {NORMAL: 2, LOW: 1}
+
 
 @dataclass(frozen=True)
 class EdgeConfig:
@@ -13,75 +26,116 @@ class EdgeConfig:
     request_timeout: int
     max_body_size_mb: int
     rate_limit_per_minute: int
-    edge_keys: Dict[str, str]  # token -> owner
+    edge_keys: EdgeKeyStore  # token -> owner; anything with .get(token) works
     # Optional: when unset, /tailscale returns 503 but the edge still serves
     # native ingress. Never forwarded to the router.
     tailscale_webhook_secret: str = ''
-
-
-def _load_edge_keys_from_file(logger: Logger) -> Dict[str, str]:
+    # Micro-batching of edge->router requests. One item per batch (the
+    # default) turns it off; linger is capped by RouterBatcher.
+    router_batch_max_items: int = 1
+    router_batch_max_bytes: int = 256 * 1024
+    router_batch_linger_ms: int = 5
+    # Batches in flight to the router at once; keep it at the thread count.
+    router_batch_flush_workers: int = 4
+    # Content-Encoding for edge->router bodies of at least min_bytes; empty
+    # sends everything uncompressed.
+    router_compression: str = ''
+    router_compression_min_bytes: int = 1024
+    # Encoding of edge->router envelopes: json, or msgpack when installed.
+    router_envelope_format: str = JSON_FORMAT
+    # Cap on a compressed webhook's decoded size, on top of max_body_size_mb.
+    max_decompressed_body_mb: int = 10
+    # Interval of the background /health probe of each router; 0 leaves
+    # router health to failed connections alone.
+    router_health_check_seconds: int = 0
+    router_health_check_timeout: int = 2
+    # Adaptive cap on requests in flight; 0 turns the limiter off. Adapters
+    # in shed_first_adapters are shed before the others.
+    concurrency_limit_max: int = 0
+    concurrency_limit_min: int = 4
+    shed_first_adapters: Tuple[str, ...] = ()
+    # Priority lanes; off unless some adapter or edge key (owner name) has a
+    # priority. lane_slots caps each lane's concurrent forwards, 0 = no cap.
+    adapter_priorities: Dict[str, str] = field(default_factory=dict)
+    edge_key_priorities: Dict[str, str] = field(default_factory=dict)
+    lane_slots: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_LANE_SLOTS))
+    lane_stats_seconds: int = 60
+    # Per-adapter client IP filters, compiled from <ADAPTER>_ALLOW_CIDRS and
+    # <ADAPTER>_DENY_CIDRS; adapters without one accept any address.
+    ip_filters: Dict[str, IpFilter] = field(default_factory=dict)
+    # Peers besides loopback whose X-Real-IP is believed, from
+    # TRUSTED_PROXY_CIDRS; everyone else is filtered by their own address.
+    trusted_proxies: Optional[CidrTree] = None
+
+
+def _load_edge_keys_from_file(logger: Logger) -> EdgeKeyStore:
     """
-    Load edge keys from a JSON file pointed to by EDGE_KEYS_FILE.
+    Load edge keys from the file pointed to by EDGE_KEYS_FILE.
 
-    Expected JSON (plaintext, first pass):
+    Expected JSON, tokens in plaintext or as "sha256:<hex digest>":
       {
         "trevor": "SUPER_SECRET_KEY",
-        "dev": "another_edge_key_here"
+        "dev": "sha256:9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
       }
 
-    Returned mapping:
-      { "SUPER_SECRET_KEY": "trevor", "another_edge_key_here": "bob" }
+    or a SQLite index built from such a file; see services.edge_key_store.
+    The store maps a token to its owner, like {"SUPER_SECRET_KEY": "trevor"},
+    and picks up changes to the file every EDGE_KEYS_RELOAD_SECONDS.
     """
     path = os.getenv("EDGE_KEYS_FILE", "").strip()
     if not path:
         logger.error("EDGE_KEYS_FILE environment variable not set")
         sys.exit(1)
 
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            raw = json.load(f)
-    except FileNotFoundError:
-        logger.error("EDGE_KEYS_FILE not found: %s", path)
-        sys.exit(1)
-    except json.JSONDecodeError as exc:
-        logger.error("EDGE_KEYS_FILE contains invalid JSON (%s): %s", path, str(exc))
-        sys.exit(1)
-    except Exception as exc:  # pylint: disable=broad-except
-        logger.error("Failed to read EDGE_KEYS_FILE (%s): %s", path, str(exc))
-        sys.exit(1)
+    pepper = os.getenv("EDGE_KEYS_PEPPER", "").strip()
+    reload_seconds = int(os.getenv("EDGE_KEYS_RELOAD_SECONDS", "60"))
 
-    if not isinstance(raw, dict):
-        logger.error("EDGE_KEYS_FILE must contain a JSON object of {owner: token}")
+    try:
+        return EdgeKeyStore(path, pepper, reload_seconds, logger)
+    except EdgeKeyError as exc:
+        logger.error("%s", exc)
         sys.exit(1)
 
-    edge_keys: Dict[str, str] = {}
-    for owner, token in raw.items():
-        if not isinstance(owner, str) or not isinstance(token, str):
-            logger.error("EDGE_KEYS_FILE entries must be strings. Bad entry: %r: %r", owner, token)
-            sys.exit(1)
-
-        owner_clean = owner.strip()
-        token_clean = token.strip()
 
-        if not owner_clean or not token_clean:
-            logger.error("EDGE_KEYS_FILE contains empty owner/token. Bad entry: %r: %r", owner, token)
+def _parse_pairs(logger: Logger, name: str, allowed_values=None) -> Dict[str, str]:
+    """Parse `key:value,key:value` from env var `name`, exiting when malformed."""
+    pairs: Dict[str, str] = {}
+    for entry in os.getenv(name, "").split(","):
+        if not entry.strip():
+            continue
+        key, sep, value = entry.partition(":")
+        key, value = key.strip(), value.strip().lower()
+        if not sep or not key or not value:
+            logger.error("%s entries must look like name:value. Bad entry: %r", name, entry)
             sys.exit(1)
-
-        if token_clean in edge_keys and edge_keys[token_clean] != owner_clean:
-            logger.error(
-                "Duplicate token found in EDGE_KEYS_FILE for owners %r and %r",
-                edge_keys[token_clean],
-                owner_clean,
-            )
+        if allowed_values is not None and value not in allowed_values:
+            logger.error("%s values must be one of: %s. Bad entry: %r", name, ", ".join(allowed_values), entry)
             sys.exit(1)
+        pairs[key] = value
+    return pairs
 
-        edge_keys[token_clean] = owner_clean
 
-    if not edge_keys:
-        logger.error("No valid edge keys found in EDGE_KEYS_FILE: %s", path)
+def _load_cidr_tree(logger: Logger, name: str) -> Optional[CidrTree]:
+    """Compile the CIDR list in env var `name`, or None when it is empty; exits when malformed."""
+    try:
+        networks = parse_cidrs(os.getenv(name, ""))
+        return CidrTree(networks) if networks else None
+    except OSError as exc:
+        logger.error("Failed to read %s list: %s", name, str(exc))
+        sys.exit(1)
+    except ValueError as exc:
+        logger.error("%s contains an invalid network: %s", name, str(exc))
         sys.exit(1)
 
-    return edge_keys
+
+def _load_ip_filters(logger: Logger) -> Dict[str, IpFilter]:
+    """Compile each adapter's <ADAPTER>_ALLOW_CIDRS / <ADAPTER>_DENY_CIDRS, exiting when malformed."""
+    ip_filters: Dict[str, IpFilter] = {}
+    for adapter in ADAPTER_NAMES:
+        trees = {kind: _load_cidr_tree(logger, f"{adapter.upper()}_{kind}_CIDRS") for kind in ("ALLOW", "DENY")}
+        if trees["ALLOW"] is not None or trees["DENY"] is not None:
+            ip_filters[adapter] = IpFilter(trees["ALLOW"], trees["DENY"])
+    return ip_filters
 
 
 def load_edge_config(logger: Logger) -> EdgeConfig:
@@ -92,6 +146,38 @@ def load_edge_config(logger: Logger) -> EdgeConfig:
     max_body_size_mb = int(os.getenv("MAX_BODY_SIZE_MB", "1"))
     rate_limit_per_minute = int(os.getenv("RATE_LIMIT_PER_MINUTE", "100"))
     tailscale_webhook_secret = os.getenv("TAILSCALE_WEBHOOK_SECRET", "").strip()
+    router_batch_max_items = int(os.getenv("ROUTER_BATCH_MAX_ITEMS", "1"))
+    router_batch_max_bytes = int(os.getenv("ROUTER_BATCH_MAX_BYTES", str(256 * 1024)))
+    router_batch_linger_ms = int(os.getenv("ROUTER_BATCH_LINGER_MS", "5"))
+    router_batch_flush_workers = int(os.getenv("ROUTER_BATCH_FLUSH_WORKERS", "4"))
+    router_compression = os.getenv("ROUTER_COMPRESSION", "").strip().lower()
+    router_compression_min_bytes = int(os.getenv("ROUTER_COMPRESSION_MIN_BYTES", "1024"))
+    max_decompressed_body_mb = int(os.getenv("MAX_DECOMPRESSED_BODY_MB", "10"))
+    router_envelope_format = os.getenv("ROUTER_ENVELOPE_FORMAT", JSON_FORMAT).strip().lower() or JSON_FORMAT
+    router_health_check_seconds = int(os.getenv("ROUTER_HEALTH_CHECK_SECONDS", "0"))
+    router_health_check_timeout = int(os.getenv("ROUTER_HEALTH_CHECK_TIMEOUT", "2"))
+    concurrency_limit_max = int(os.getenv("CONCURRENCY_LIMIT_MAX", "0"))
+    concurrency_limit_min = int(os.getenv("CONCURRENCY_LIMIT_MIN", "4"))
+    shed_first_adapters = tuple(
+        name.strip().lower() for name in os.getenv("SHED_FIRST_ADAPTERS", "").split(",") if name.strip()
+    )
+
+    adapter_priorities = _parse_pairs(logger, "ADAPTER_PRIORITIES", PRIORITIES)
+    edge_key_priorities = _parse_pairs(logger, "EDGE_KEY_PRIORITIES", PRIORITIES)
+    lane_slots = dict(DEFAULT_LANE_SLOTS)
+    for lane, slots in _parse_pairs(logger, "LANE_SLOTS", None).items():
+        if lane not in PRIORITIES or not slots.isdigit():
+            logger.error(
+                "LANE_SLOTS entries must be <%s>:<count>. Bad entry: %s:%s",
+                "|".join(PRIORITIES),
+                lane,
+                slots,
+            )
+            sys.exit(1)
+        lane_slots[lane] = int(slots)
+    lane_stats_seconds = int(os.getenv("LANE_STATS_SECONDS", "60"))
+    ip_filters = _load_ip_filters(logger)
+    trusted_proxies = _load_cidr_tree(logger, "TRUSTED_PROXY_CIDRS")
 
     edge_keys = _load_edge_keys_from_file(logger)
 
@@ -99,6 +185,42 @@ def load_edge_config(logger: Logger) -> EdgeConfig:
         logger.error("ROUTER_INGRESS_KEY environment variable not set")
         sys.exit(1)
 
+    if not parse_router_urls(router_url):
+        logger.error("ROUTER_URL must name at least one router")
+        sys.exit(1)
+
+    unknown_adapters = sorted(set(shed_first_adapters) - set(ADAPTER_NAMES))
+    if unknown_adapters:
+        logger.error(
+            "SHED_FIRST_ADAPTERS has unknown adapter(s) %s (expected: %s)",
+            ", ".join(unknown_adapters),
+            ", ".join(ADAPTER_NAMES),
+        )
+        sys.exit(1)
+
+    unknown_adapters = sorted(set(adapter_priorities) - set(ADAPTER_NAMES))
+    if unknown_adapters:
+        logger.error(
+            "ADAPTER_PRIORITIES has unknown adapter(s) %s (expected: %s)",
+            ", ".join(unknown_adapters),
+            ", ".join(ADAPTER_NAMES),
+        )
+        sys.exit(1)
+
+    if router_compression and router_compression not in available_encodings():
+        logger.error(
+            "ROUTER_COMPRESSION must be one of: %s (zstd needs the zstandard package)",
+            ", ".join(available_encodings()),
+        )
+        sys.exit(1)
+
+    if router_envelope_format not in available_formats():
+        logger.error(
+            "ROUTER_ENVELOPE_FORMAT must be one of: %s (msgpack needs the msgpack package)",
+            ", ".join(available_formats()),
+        )
+        sys.exit(1)
+
     return EdgeConfig(
         router_url=router_url,
         router_ingress_key=router_ingress_key,
@@ -107,4 +229,23 @@ def load_edge_config(logger: Logger) -> EdgeConfig:
         rate_limit_per_minute=rate_limit_per_minute,
         edge_keys=edge_keys,
         tailscale_webhook_secret=tailscale_webhook_secret,
+        router_batch_max_items=router_batch_max_items,
+        router_batch_max_bytes=router_batch_max_bytes,
+        router_batch_linger_ms=router_batch_linger_ms,
+        router_batch_flush_workers=router_batch_flush_workers,
+        router_compression=router_compression,
+        router_compression_min_bytes=router_compression_min_bytes,
+        max_decompressed_body_mb=max_decompressed_body_mb,
+        router_envelope_format=router_envelope_format,
+        router_health_check_seconds=router_health_check_seconds,
+        router_health_check_timeout=router_health_check_timeout,
+        concurrency_limit_max=concurrency_limit_max,
+        concurrency_limit_min=concurrency_limit_min,
+        shed_first_adapters=shed_first_adapters,
+        adapter_priorities=adapter_priorities,
+        edge_key_priorities=edge_key_priorities,
+        lane_slots=lane_slots,
+        lane_stats_seconds=lane_stats_seconds,
+        ip_filters=ip_filters,
+        trusted_proxies=trusted_proxies,
     )
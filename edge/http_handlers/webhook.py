@@ -1,12 +1,16 @@
+import time
 import uuid
 from typing import Callable
 
-from flask import Blueprint, Response, jsonify, request
+from flask import Blueprint, Response, g, jsonify, request
 
 from adapters import IngressError, IngressMessage
 from adapters import native as native_adapter
 from adapters import tailscale as tailscale_adapter
 from config.settings import EdgeConfig
+from services.concurrency_limiter import RETRY_AFTER_SECONDS, ConcurrencyLimiter
+from services.ip_filter import trusted_client_ip
+from services.priority_lanes import LaneFull, PriorityLanes
 from services.router_forwarder import (
     RouterForwarder,
     RouterForwarderError,
@@ -20,6 +24,22 @@ AdaptFn = Callable[[EdgeConfig, Callable[..., None], str], IngressMessage]
 def create_edge_blueprint(config: EdgeConfig, router_forwarder: RouterForwarder, log_json) -> Blueprint:
     """Create the blueprint containing the edge HTTP routes."""
     blueprint = Blueprint('edge', __name__)
+    limiter = None
+    if config.concurrency_limit_max > 0:
+        limiter = ConcurrencyLimiter(
+            config.concurrency_limit_min,
+            config.concurrency_limit_max,
+            config.shed_first_adapters,
+        )
+    lanes = None
+    if config.adapter_priorities or config.edge_key_priorities:
+        lanes = PriorityLanes(
+            config.lane_slots,
+            config.adapter_priorities,
+            config.edge_key_priorities,
+            log_json,
+            config.lane_stats_seconds,
+        )
 
     @blueprint.before_app_request
     def add_correlation_id():
@@ -31,21 +51,61 @@ def create_edge_blueprint(config: EdgeConfig, router_forwarder: RouterForwarder,
 
     @blueprint.route('/webhook', methods=['POST'])
     def webhook():
-        return _handle_ingress(native_adapter.adapt)
+        return _handle_ingress('native', native_adapter.adapt)
 
     @blueprint.route('/tailscale', methods=['POST'])
     def tailscale():
-        return _handle_ingress(tailscale_adapter.adapt)
+        return _handle_ingress('tailscale', tailscale_adapter.adapt)
 
-    def _handle_ingress(adapt: AdaptFn):
+    def _handle_ingress(adapter: str, adapt: AdaptFn):
         """
         Run an ingress adapter and forward its canonical message to the router.
 
         Every ingress path converges here, so this function stays free of
-        provider-specific behaviour.
+        provider-specific behaviour. Clients outside the adapter's IP filter
+        are refused and requests over the concurrency limit are shed, both
+        before the adapter reads anything; with priority lanes, a message is
+        also shed when its lane is full.
         """
         correlation_id = getattr(request, 'correlation_id', str(uuid.uuid4()))
 
+        ip_filter = config.ip_filters.get(adapter)
+        if ip_filter is not None:
+            client_ip = _client_ip(config.trusted_proxies)
+            if not ip_filter.permits(client_ip):
+                log_json(
+                    'warn',
+                    correlation_id,
+                    'Client IP not allowed',
+                    adapter=adapter,
+                    client_ip=client_ip,
+                )
+                return jsonify({'error': 'Forbidden'}), 403
+
+        if limiter is None:
+            return _ingest(adapter, adapt, correlation_id)
+
+        if not limiter.try_acquire(adapter):
+            log_json(
+                'warn',
+                correlation_id,
+                'Shedding request over concurrency limit',
+                adapter=adapter,
+                in_flight=limiter.in_flight,
+                limit=int(limiter.limit),
+            )
+            return _overloaded()
+
+        try:
+            return _ingest(adapter, adapt, correlation_id)
+        finally:
+            sample = g.pop('router_latency', None)
+            if sample is None:
+                limiter.release()
+            else:
+                limiter.release_with_sample(*sample)
+
+    def _ingest(adapter: str, adapt: AdaptFn, correlation_id: str):
         try:
             message = adapt(config, log_json, correlation_id)
         except IngressError as exc:
@@ -60,8 +120,28 @@ def create_edge_blueprint(config: EdgeConfig, router_forwarder: RouterForwarder,
             remote_addr=request.remote_addr,
         )
 
-        body = {'destination': message.destination, 'payload': message.payload}
+        body = message.envelope()
 
+        if lanes is None:
+            return _forward(body, correlation_id, message)
+
+        lane = lanes.lane_for(adapter, message.source)
+        try:
+            with lanes.slot(lane):
+                return _forward(body, correlation_id, message)
+        except LaneFull:
+            log_json(
+                'warn',
+                correlation_id,
+                'Shedding request from full priority lane',
+                edge_key=message.source,
+                destination=message.destination,
+                lane=lane,
+            )
+            return _overloaded()
+
+    def _forward(body, correlation_id: str, message: IngressMessage):
+        started = time.monotonic()
         try:
             router_response = router_forwarder.forward(
                 body,
@@ -69,10 +149,16 @@ def create_edge_blueprint(config: EdgeConfig, router_forwarder: RouterForwarder,
                 message.source,
                 message.destination,
             )
+            # Only a delivery says how long delivering takes; rejections and
+            # 202s (queued, coalesced) answer without one.
+            if 200 <= router_response.status_code < 300 and router_response.status_code != 202:
+                g.router_latency = (message.destination, time.monotonic() - started, False)
             return _proxy_response(router_response)
         except RouterTimeoutError:
+            g.router_latency = (message.destination, time.monotonic() - started, True)
             return jsonify({'error': 'Gateway timeout'}), 504
         except RouterUnavailableError:
+            g.router_latency = (message.destination, time.monotonic() - started, True)
             return jsonify({'error': 'Bad gateway - router unreachable'}), 502
         except RouterForwarderError:
             return jsonify({'error': 'Internal server error'}), 500
@@ -80,6 +166,18 @@ def create_edge_blueprint(config: EdgeConfig, router_forwarder: RouterForwarder,
     return blueprint
 
 
+def _client_ip(trusted_proxies) -> str:
+    """The caller's address as nginx saw it, if nginx is a trusted peer; otherwise the socket peer."""
+    return trusted_client_ip(request.remote_addr or '', request.headers.get('X-Real-IP', ''), trusted_proxies)
+
+
+def _overloaded():
+    """503 telling the caller when to try again."""
+    response = jsonify({'error': 'Service overloaded'})
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response, 503
+
+
 def _proxy_response(router_response) -> Response:
     """Convert the router response into a Flask Response."""
     return Response(
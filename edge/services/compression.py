@@ -0,0 +1,89 @@
+"""
+Compressed request bodies: inbound webhooks and edge->router calls.
+
+gzip is always available; zstd is offered when the optional `zstandard`
+package is installed. Outbound bodies smaller than the configured threshold
+are sent as they are, since compressing them costs more than the bytes it
+saves. Inbound bodies are inflated as a stream of bounded chunks, so the
+caller can stop reading as soon as the output grows too large.
+"""
+import gzip
+import zlib
+from typing import BinaryIO, Iterator
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Kept low: the router decompresses every request it receives.
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+# Bytes read from the request, and produced per step, while inflating.
+CHUNK_BYTES = 64 * 1024
+
+# Content-Encoding values accepted on inbound webhooks, with their zlib
+# window settings; "deflate" is the zlib-wrapped format HTTP specifies.
+_ZLIB_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+class UnsupportedEncoding(ValueError):
+    """Raised for a Content-Encoding this process cannot decode."""
+
+
+class DecompressionError(ValueError):
+    """Raised when a compressed body is corrupt or truncated."""
+
+
+def available_encodings() -> tuple:
+    """The Content-Encoding values this process can produce."""
+    return ('gzip', 'zstd') if zstandard is not None else ('gzip',)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress `data` with one of available_encodings()."""
+    if encoding == 'gzip':
+        # mtime=0 keeps identical bodies byte-identical.
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise UnsupportedEncoding(f'Unsupported encoding: {encoding}')
+
+
+def inflate(stream: BinaryIO, encoding: str) -> Iterator[bytes]:
+    """
+    Yield the decoded body read from `stream`, at most CHUNK_BYTES at a time.
+
+    Raises UnsupportedEncoding before reading anything when `encoding` cannot
+    be decoded, and DecompressionError when the body turns out to be corrupt.
+    """
+    if encoding in _ZLIB_WBITS:
+        return _inflate_zlib(stream, _ZLIB_WBITS[encoding])
+    if encoding == 'zstd' and zstandard is not None:
+        return _inflate_zstd(stream)
+    raise UnsupportedEncoding(f'Unsupported Content-Encoding: {encoding}')
+
+
+def _inflate_zlib(stream: BinaryIO, wbits: int) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_BYTES), b''):
+            while chunk and not decompressor.eof:
+                yield decompressor.decompress(chunk, CHUNK_BYTES)
+                chunk = decompressor.unconsumed_tail
+        yield decompressor.flush()
+    except zlib.error as exc:
+        raise DecompressionError(f'Corrupt compressed body: {exc}') from exc
+
+    if not decompressor.eof:
+        raise DecompressionError('Truncated compressed body')
+
+
+def _inflate_zstd(stream: BinaryIO) -> Iterator[bytes]:
+    try:
+        yield from zstandard.ZstdDecompressor().read_to_iter(
+            stream, read_size=CHUNK_BYTES, write_size=CHUNK_BYTES
+        )
+    except zstandard.ZstdError as exc:
+        raise DecompressionError(f'Corrupt compressed body: {exc}') from exc
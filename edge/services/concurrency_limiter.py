@@ -0,0 +1,127 @@
+"""
+Adaptive concurrency limiting for the edge.
+
+When the router slows down, every request holds an edge thread for longer,
+threads run out, and nginx queues callers until they time out. The limiter
+caps requests in flight instead, and sheds the rest with 503 straight away.
+
+The cap is found by AIMD on router latency. Only delivered messages are
+measured; a rejection or a 202 (queued, coalesced) says nothing about how
+long delivery takes. Each destination's fastest recent round trip is its
+baseline, so a slow route is compared with itself and not with a fast one.
+While responses stay within LATENCY_TOLERANCE times their baseline and the
+limit is actually in use, the limit grows by about one per limit's worth of
+requests. A slower response, a timeout, or an unreachable router cuts it by
+BACKOFF_RATIO, at most once per BACKOFF_INTERVAL_SECONDS so a single slow
+burst is not counted many times.
+
+Adapters named in `shed_first` are admitted only while fewer than
+LOW_PRIORITY_SHARE of the limit is in use, so they are the first to be shed.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+LATENCY_TOLERANCE = 2.0
+BACKOFF_RATIO = 0.9
+LOW_PRIORITY_SHARE = 0.75
+
+# Samples after which the baseline is replaced by the window's fastest one,
+# so a router that got permanently slower gets a new baseline.
+BASELINE_WINDOW = 200
+
+# Destinations with a baseline kept per process; the least recently used
+# goes first, since callers choose destination names.
+MAX_BASELINES = 1024
+
+# Shortest gap between two cuts of the limit.
+BACKOFF_INTERVAL_SECONDS = 1.0
+
+RETRY_AFTER_SECONDS = 1
+
+
+class _Baseline:
+    """One destination's fastest recent round trip."""
+
+    def __init__(self, latency_seconds: float):
+        self.value = latency_seconds
+        self.window_min = math.inf
+        self.window_samples = 0
+
+    def record(self, latency_seconds: float) -> None:
+        self.value = min(self.value, latency_seconds)
+        self.window_min = min(self.window_min, latency_seconds)
+        self.window_samples += 1
+        if self.window_samples >= BASELINE_WINDOW:
+            self.value = self.window_min
+            self.window_min = math.inf
+            self.window_samples = 0
+
+
+class ConcurrencyLimiter:
+    """Admits requests while the in-flight count is below an adaptive limit."""
+
+    def __init__(self, min_limit: int, max_limit: int, shed_first: Iterable[str] = ()):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.shed_first = frozenset(shed_first)
+        self.limit = float(max(self.min_limit, self.max_limit // 2))
+        self.in_flight = 0
+
+        self._baselines: 'OrderedDict[str, _Baseline]' = OrderedDict()
+        self._last_decrease = -math.inf
+        self._lock = threading.Lock()
+
+    def try_acquire(self, adapter: str) -> bool:
+        """Take a slot for a request from `adapter`; False means shed it."""
+        with self._lock:
+            allowed = self.limit * LOW_PRIORITY_SHARE if adapter in self.shed_first else self.limit
+            if self.in_flight >= max(1, int(allowed)):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        """Give back a slot whose request never reached the router."""
+        with self._lock:
+            self.in_flight -= 1
+
+    def release_with_sample(self, destination: str, latency_seconds: float, overloaded: bool = False) -> None:
+        """
+        Give back a slot and adjust the limit by how the router did.
+
+        `overloaded` marks a timeout or unreachable router, which always
+        counts as a slow response.
+        """
+        with self._lock:
+            in_use = self.in_flight
+            self.in_flight -= 1
+
+            if overloaded:
+                slow = True
+            else:
+                slow = latency_seconds > self._record_baseline(destination, latency_seconds) * LATENCY_TOLERANCE
+            if slow:
+                now = time.monotonic()
+                if now - self._last_decrease >= BACKOFF_INTERVAL_SECONDS:
+                    self._last_decrease = now
+                    self.limit = max(float(self.min_limit), self.limit * BACKOFF_RATIO)
+            elif in_use * 2 >= self.limit:
+                # Only grow while the limit is the constraint, or an idle edge
+                # would drift to max_limit and stop protecting anything.
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def _record_baseline(self, destination: str, latency_seconds: float) -> float:
+        """Add a sample to `destination`'s baseline and return the baseline it was judged by."""
+        baseline = self._baselines.get(destination)
+        if baseline is None:
+            baseline = self._baselines[destination] = _Baseline(latency_seconds)
+            if len(self._baselines) > MAX_BASELINES:
+                self._baselines.popitem(last=False)
+        else:
+            self._baselines.move_to_end(destination)
+        judged_by = baseline.value
+        baseline.record(latency_seconds)
+        return judged_by
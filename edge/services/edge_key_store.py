@@ -0,0 +1,294 @@
+"""
+Edge keys, held as digests and reloaded when their file changes.
+
+EDGE_KEYS_FILE is a JSON object of {owner: token}. A token may be written in
+plaintext or as "sha256:<hex digest>", so the file never has to hold the
+secret itself. Digests are HMAC-SHA256 keyed with EDGE_KEYS_PEPPER when that
+is set, and plain SHA-256 otherwise. Plaintext tokens are digested on load
+and never kept.
+
+A lookup digests the presented token and finds candidates by the digest's
+first bytes. It then compares the full digest with hmac.compare_digest, so
+the work does not depend on how much of a stored digest matched.
+
+For thousands of keys, EDGE_KEYS_FILE may instead name a SQLite index
+(a .db or .sqlite file) built with
+
+    python -m services.edge_key_store index edge_keys.json edge_keys.db
+
+Nothing is loaded at start-up then; lookups go to its primary-key index.
+
+Every EDGE_KEYS_RELOAD_SECONDS, the first lookup starts a background thread
+that checks whether the file changed and, if so, loads it into a new index
+and swaps it in whole. Lookups carry on against the old index meanwhile. A
+file that fails to load is logged and ignored, and the previous keys stay in
+force. A lookup the index cannot answer is logged and treated as an unknown
+key, so a broken index refuses requests with 401 rather than failing them. Replace the file by renaming
+over it; with Docker, mount its directory rather than the file, so the
+container sees the new one.
+"""
+import argparse
+import hashlib
+import hmac
+import os
+import sqlite3
+import sys
+import threading
+import time
+from logging import Logger
+from typing import Dict, List, Optional, Tuple
+
+from services import json_codec
+
+DIGEST_PREFIX = 'sha256:'
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+# Leading digest bytes used to find candidate entries.
+_BUCKET_BYTES = 8
+
+_SCHEMA = 'CREATE TABLE IF NOT EXISTS edge_keys (digest BLOB PRIMARY KEY, owner TEXT NOT NULL) WITHOUT ROWID'
+
+
+class EdgeKeyError(ValueError):
+    """Raised when the edge key file cannot be used."""
+
+
+def token_digest(token: str, pepper: str = '') -> bytes:
+    """The digest stored for `token`."""
+    data = token.encode('utf-8')
+    if pepper:
+        return hmac.new(pepper.encode('utf-8'), data, hashlib.sha256).digest()
+    return hashlib.sha256(data).digest()
+
+
+def parse_key_file(path: str, pepper: str = '') -> Dict[bytes, str]:
+    """Read a JSON key file into {digest: owner}, raising EdgeKeyError when it is unusable."""
+    try:
+        with open(path, 'rb') as f:
+            raw = json_codec.loads(f.read())
+    except FileNotFoundError as exc:
+        raise EdgeKeyError(f'EDGE_KEYS_FILE not found: {path}') from exc
+    except ValueError as exc:
+        raise EdgeKeyError(f'EDGE_KEYS_FILE contains invalid JSON ({path}): {exc}') from exc
+    except Exception as exc:  # pylint: disable=broad-except
+        raise EdgeKeyError(f'Failed to read EDGE_KEYS_FILE ({path}): {exc}') from exc
+
+    if not isinstance(raw, dict):
+        raise EdgeKeyError('EDGE_KEYS_FILE must contain a JSON object of {owner: token}')
+
+    digests: Dict[bytes, str] = {}
+    for owner, token in raw.items():
+        if not isinstance(owner, str) or not isinstance(token, str):
+            raise EdgeKeyError(f'EDGE_KEYS_FILE entries must be strings. Bad entry: {owner!r}')
+
+        owner_clean = owner.strip()
+        token_clean = token.strip()
+        if not owner_clean or not token_clean:
+            raise EdgeKeyError(f'EDGE_KEYS_FILE contains empty owner/token. Bad entry: {owner!r}')
+
+        digest = _entry_digest(owner, token_clean, pepper)
+        if digest in digests and digests[digest] != owner_clean:
+            raise EdgeKeyError(
+                f'Duplicate token found in EDGE_KEYS_FILE for owners {digests[digest]!r} and {owner_clean!r}'
+            )
+        digests[digest] = owner_clean
+
+    if not digests:
+        raise EdgeKeyError(f'No valid edge keys found in EDGE_KEYS_FILE: {path}')
+
+    return digests
+
+
+def _entry_digest(owner: str, token: str, pepper: str) -> bytes:
+    if not token.startswith(DIGEST_PREFIX):
+        return token_digest(token, pepper)
+    try:
+        digest = bytes.fromhex(token[len(DIGEST_PREFIX):])
+    except ValueError:
+        digest = b''
+    if len(digest) != hashlib.sha256().digest_size:
+        raise EdgeKeyError(f'EDGE_KEYS_FILE has a malformed sha256 digest for {owner!r}')
+    return digest
+
+
+def write_index(digests: Dict[bytes, str], path: str) -> None:
+    """Write {digest: owner} to a new SQLite index at `path`, replacing any file there."""
+    temporary = f'{path}.tmp'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    conn = sqlite3.connect(temporary)
+    try:
+        conn.execute(_SCHEMA)
+        conn.executemany('INSERT INTO edge_keys (digest, owner) VALUES (?, ?)', digests.items())
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temporary, path)
+
+
+class _MemoryIndex:
+    """Digests from a JSON file, bucketed by their leading bytes."""
+
+    def __init__(self, digests: Dict[bytes, str]):
+        self._buckets: Dict[bytes, List[Tuple[bytes, str]]] = {}
+        for digest, owner in digests.items():
+            self._buckets.setdefault(digest[:_BUCKET_BYTES], []).append((digest, owner))
+        self._count = len(digests)
+
+    def lookup(self, digest: bytes) -> Optional[str]:
+        owner = None
+        for candidate, candidate_owner in self._buckets.get(digest[:_BUCKET_BYTES], ()):
+            if hmac.compare_digest(candidate, digest):
+                owner = candidate_owner
+        return owner
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        pass
+
+
+class _SqliteIndex:
+    """A read-only SQLite index, with one connection per thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        try:
+            self._count = self._connection().execute('SELECT COUNT(*) FROM edge_keys').fetchone()[0]
+        except sqlite3.Error as exc:
+            raise EdgeKeyError(f'EDGE_KEYS_FILE is not a usable key index ({path}): {exc}') from exc
+        if not self._count:
+            raise EdgeKeyError(f'No valid edge keys found in EDGE_KEYS_FILE: {path}')
+
+    def lookup(self, digest: bytes) -> Optional[str]:
+        try:
+            row = self._connection().execute(
+                'SELECT digest, owner FROM edge_keys WHERE digest = ?', (digest,)
+            ).fetchone()
+        except sqlite3.Error:
+            self.close()  # reconnect on the next lookup
+            raise
+        if row is None or not hmac.compare_digest(bytes(row[0]), digest):
+            return None
+        return row[1]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        # Other threads' connections close when they are collected.
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection; sqlite3 connections are not shared between threads."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                raise EdgeKeyError(f'EDGE_KEYS_FILE not found: {self.path}')
+            conn = self._local.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        return conn
+
+
+class EdgeKeyStore:
+    """Maps bearer tokens to owner names, like the dict it replaces."""
+
+    def __init__(self, path: str, pepper: str, reload_seconds: int, logger: Logger):
+        self.path = path
+        self.pepper = pepper
+        self.reload_seconds = reload_seconds
+        self.logger = logger
+        self._signature = self._file_signature()
+        self._index = self._load()
+        self._next_check = time.monotonic() + reload_seconds
+        self._reload_lock = threading.Lock()
+        self._reloader: Optional[threading.Thread] = None
+
+    def get(self, token: str, default: Optional[str] = None) -> Optional[str]:
+        """The owner of `token`, or `default` when it is not a valid key."""
+        if self.reload_seconds > 0 and time.monotonic() >= self._next_check:
+            self._start_reload()
+        try:
+            owner = self._index.lookup(token_digest(token, self.pepper))
+        except (EdgeKeyError, sqlite3.Error) as exc:
+            self.logger.error('Edge key lookup failed, treating the key as unknown: %s', exc)
+            return default
+        return default if owner is None else owner
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def reload_if_changed(self) -> bool:
+        """Swap in the file's keys if it changed; True when new keys were loaded."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False  # another thread is already checking
+        try:
+            self._next_check = time.monotonic() + self.reload_seconds
+            signature = self._file_signature()
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                index = self._load()
+            except EdgeKeyError as exc:
+                self.logger.error('Edge keys not reloaded, keeping %s current keys: %s', len(self._index), exc)
+                return False
+
+            previous, self._index = self._index, index
+            previous.close()
+            self.logger.info('Edge keys reloaded: %s keys', len(index))
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _start_reload(self) -> None:
+        """Check the file on a background thread, so no request waits for a load."""
+        self._next_check = time.monotonic() + self.reload_seconds
+        self._reloader = threading.Thread(target=self.reload_if_changed, name='edge-key-reload', daemon=True)
+        self._reloader.start()
+
+    def _load(self):
+        if self.path.endswith(SQLITE_SUFFIXES):
+            return _SqliteIndex(self.path)
+        return _MemoryIndex(parse_key_file(self.path, self.pepper))
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Digest a token, or build a SQLite index from a JSON key file, with EDGE_KEYS_PEPPER applied."""
+    parser = argparse.ArgumentParser(prog='python -m services.edge_key_store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    digest_cmd = commands.add_parser('digest', help='print the "sha256:..." entry for a token')
+    digest_cmd.add_argument('token')
+    index_cmd = commands.add_parser('index', help='build a SQLite key index from a JSON key file')
+    index_cmd.add_argument('source')
+    index_cmd.add_argument('destination')
+    args = parser.parse_args(argv)
+
+    pepper = os.getenv('EDGE_KEYS_PEPPER', '').strip()
+    if args.command == 'digest':
+        print(DIGEST_PREFIX + token_digest(args.token, pepper).hex())
+        return 0
+
+    try:
+        digests = parse_key_file(args.source, pepper)
+    except EdgeKeyError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    write_index(digests, args.destination)
+    print(f'Wrote {len(digests)} keys to {args.destination}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+The binary envelope the edge may send the router instead of JSON.
+
+A MessagePack frame is a map holding the envelope (`destination` and
+`payload`, or `items` for a batch) together with what JSON requests carry in
+headers: `correlation_id`, `source`, and `deadline_ms`. It needs the optional
+`msgpack` package on both hosts.
+"""
+from typing import Any, Dict
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+JSON_FORMAT = 'json'
+MSGPACK_FORMAT = 'msgpack'
+
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+# The router sets this on a 415 when it cannot decode MessagePack frames.
+UNSUPPORTED_HEADER = 'X-Unsupported-Envelope'
+
+
+def available_formats() -> tuple:
+    """The envelope formats this process can send."""
+    return (JSON_FORMAT, MSGPACK_FORMAT) if msgpack is not None else (JSON_FORMAT,)
+
+
+def encode_frame(body: Dict[str, Any], correlation_id: str, source: str, deadline_ms: int) -> bytes:
+    """Pack an envelope and its request metadata into one MessagePack frame."""
+    frame = {**body, 'correlation_id': correlation_id, 'source': source, 'deadline_ms': deadline_ms}
+    return msgpack.packb(frame, use_bin_type=True)
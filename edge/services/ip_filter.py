@@ -0,0 +1,123 @@
+"""
+Per-adapter CIDR allow and deny lists.
+
+Each adapter may have an allowlist, a denylist, or both. A client is refused
+when its address is in the denylist, or when an allowlist exists and the
+address is not in it. The address is nginx's X-Real-IP, but only when the
+request came from loopback or from a network in TRUSTED_PROXY_CIDRS; from
+anywhere else the header is ignored and the socket peer is used. The edge
+container binds 0.0.0.0:8080 and sits on the webhook-net bridge, so anything
+on that network can reach it and set the header itself. With Docker's port
+publishing, nginx on the host usually arrives from the bridge gateway, which
+then has to be listed as a trusted proxy.
+
+Lists are compiled once at start-up into binary prefix trees, one per IP
+version. A lookup walks at most 32 (or 128) nodes and stops at the first
+covering network, however many networks are listed. A network inside one
+already listed adds nothing to the tree.
+"""
+import ipaddress
+from typing import Iterable, List, Optional, Union
+
+IpAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+# A node is [zero child, one child, covered]; lists keep the tree compact.
+_ZERO, _ONE, _COVERED = 0, 1, 2
+
+
+def _node() -> list:
+    return [None, None, False]
+
+
+class CidrTree:
+    """A set of networks that answers "is this address in any of them?"."""
+
+    def __init__(self, networks: Iterable[str] = ()):
+        self._roots = {4: _node(), 6: _node()}
+        self.size = 0
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: str) -> None:
+        """Add a network such as 10.0.0.0/8 or 2001:db8::/32; raises ValueError when malformed."""
+        parsed = ipaddress.ip_network(network.strip(), strict=False)
+        bits = int(parsed.network_address)
+        width = parsed.max_prefixlen
+        node = self._roots[parsed.version]
+        for depth in range(parsed.prefixlen):
+            if node[_COVERED]:
+                return  # a wider network already covers this one
+            branch = (bits >> (width - 1 - depth)) & 1
+            if node[branch] is None:
+                node[branch] = _node()
+            node = node[branch]
+        # Everything below is covered now, so narrower entries can go.
+        node[_ZERO] = node[_ONE] = None
+        node[_COVERED] = True
+        self.size += 1
+
+    def __contains__(self, address: IpAddress) -> bool:
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        bits = int(address)
+        width = address.max_prefixlen
+        node = self._roots[address.version]
+        for depth in range(width):
+            if node[_COVERED]:
+                return True
+            node = node[(bits >> (width - 1 - depth)) & 1]
+            if node is None:
+                return False
+        return node[_COVERED]
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class IpFilter:
+    """One adapter's allow and deny lists."""
+
+    def __init__(self, allow: Optional[CidrTree] = None, deny: Optional[CidrTree] = None):
+        self.allow = allow
+        self.deny = deny
+
+    def permits(self, client_ip: str) -> bool:
+        """True when `client_ip` may use the adapter; unparseable addresses never may."""
+        try:
+            address = ipaddress.ip_address(client_ip.strip())
+        except ValueError:
+            return False
+        if self.deny is not None and address in self.deny:
+            return False
+        return self.allow is None or address in self.allow
+
+
+def trusted_client_ip(remote_addr: str, real_ip: str, trusted_proxies: Optional[CidrTree] = None) -> str:
+    """`real_ip` when the peer `remote_addr` is loopback or a trusted proxy, else `remote_addr`."""
+    try:
+        peer = ipaddress.ip_address(remote_addr.strip())
+    except ValueError:
+        return remote_addr
+    if peer.version == 6 and peer.ipv4_mapped is not None:
+        peer = peer.ipv4_mapped
+    trusted = peer.is_loopback or (trusted_proxies is not None and peer in trusted_proxies)
+    return real_ip if trusted and real_ip else remote_addr
+
+
+def parse_cidrs(value: str) -> List[str]:
+    """
+    Split a comma-separated CIDR list. An `@/path` entry reads one network per
+    line from that file, ignoring blank lines and # comments.
+    """
+    networks: List[str] = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if entry.startswith('@'):
+            with open(entry[1:], 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#', 1)[0].strip()
+                    if line:
+                        networks.append(line)
+        elif entry:
+            networks.append(entry)
+    return networks
@@ -0,0 +1,69 @@
+"""
+JSON encoding and decoding for the whole service.
+
+Uses orjson when it is installed and the standard library otherwise. Both
+produce the same text: compact separators, non-ASCII characters written as
+UTF-8 rather than escaped, and null for NaN and Infinity, which JSON cannot
+express. The one exception is the spelling of floats in exponent form (1e20
+against 1e+20). Values orjson cannot encode, such as integers beyond 64
+bits, are passed to the standard library, so installing orjson never
+changes what can be sent. orjson rejects the non-standard NaN
+and Infinity literals on input, which the standard library accepts.
+"""
+import json
+import math
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumps_bytes(value: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Encode `value` as UTF-8 JSON."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(value, default=default, option=option)
+        except TypeError:
+            pass  # fall through to the standard library
+    return _stdlib_dumps(value, sort_keys, default).encode('utf-8')
+
+
+def dumps(value: Any, sort_keys: bool = False, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Encode `value` as a JSON string."""
+    if orjson is not None:
+        return dumps_bytes(value, sort_keys, default).decode('utf-8')
+    return _stdlib_dumps(value, sort_keys, default)
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON, raising ValueError when it is malformed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _stdlib_dumps(value: Any, sort_keys: bool, default: Optional[Callable[[Any], Any]]) -> str:
+    options = {'sort_keys': sort_keys, 'default': default, 'separators': (',', ':'), 'ensure_ascii': False}
+    try:
+        return json.dumps(value, allow_nan=False, **options)
+    except ValueError as exc:
+        if not str(exc).startswith('Out of range float'):
+            raise
+    # Rare, so the copy is only made once a non-finite float has turned up.
+    return json.dumps(_finite(value), allow_nan=False, **options)
+
+
+def _finite(value: Any) -> Any:
+    """`value` with NaN and Infinity replaced by None, as orjson writes them."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
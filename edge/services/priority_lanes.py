@@ -0,0 +1,160 @@
+"""
+Priority lanes in front of the router forwarder.
+
+Every request of a gunicorn worker shares the same few threads, so a flood
+from one edge key can hold all of them while /tailscale events wait. Each
+message is put in a lane (high, normal, or low) by its edge key's priority,
+or else its adapter's, or else normal. A lane may forward `slots` messages at
+a time (0 means no limit), and up to half as many again may wait for a slot
+for at most MAX_WAIT_SECONDS. Anything beyond that is shed, so a flooded
+lane holds a bounded number of threads and the other lanes keep theirs.
+
+Each lane counts what it admitted and shed, how long messages waited, and how
+long forwarding took. The counters are logged as 'Lane stats' every
+stats_seconds, from whichever request first notices the interval has passed,
+and then reset.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+HIGH = 'high'
+NORMAL = 'normal'
+LOW = 'low'
+PRIORITIES = (HIGH, NORMAL, LOW)
+
+MAX_WAIT_SECONDS = 1.0
+
+STATS_CORRELATION_ID = 'lane-stats'
+
+
+class LaneFull(Exception):
+    """Raised when a lane has no free slot and no room to wait for one."""
+
+
+class _Lane:
+    """One lane's slots and counters. Only touched while holding its condition."""
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = slots
+        self.max_waiting = max(1, slots // 2)
+        self.in_flight = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        self.admitted = 0
+        self.completed = 0
+        self.shed = 0
+        self.wait_max = 0.0
+        self.forward_total = 0.0
+        self.forward_max = 0.0
+
+    def acquire(self) -> float:
+        """Take a slot, returning how long it took; raises LaneFull."""
+        started = time.monotonic()
+        with self.condition:
+            if self.slots and self.in_flight >= self.slots:
+                if self.waiting >= self.max_waiting:
+                    self.shed += 1
+                    raise LaneFull(self.name)
+                self.waiting += 1
+                try:
+                    freed = self.condition.wait_for(lambda: self.in_flight < self.slots, MAX_WAIT_SECONDS)
+                finally:
+                    self.waiting -= 1
+                if not freed:
+                    self.shed += 1
+                    raise LaneFull(self.name)
+
+            self.in_flight += 1
+            self.admitted += 1
+            waited = time.monotonic() - started
+            self.wait_max = max(self.wait_max, waited)
+            return waited
+
+    def release(self, forward_seconds: float) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.completed += 1
+            self.forward_total += forward_seconds
+            self.forward_max = max(self.forward_max, forward_seconds)
+            self.condition.notify()
+
+    def stats(self, reset: bool = False) -> Dict[str, float]:
+        with self.condition:
+            completed = self.completed
+            stats = {
+                'lane': self.name,
+                'slots': self.slots,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'wait_ms_max': round(self.wait_max * 1000, 1),
+                'forward_ms_avg': round(self.forward_total * 1000 / completed, 1) if completed > 0 else 0.0,
+                'forward_ms_max': round(self.forward_max * 1000, 1),
+            }
+            if reset:
+                self.reset_counters()
+            return stats
+
+
+class PriorityLanes:
+    """Assigns messages to lanes and bounds how many each lane forwards at once."""
+
+    def __init__(
+        self,
+        slots: Dict[str, int],
+        adapter_priorities: Dict[str, str],
+        edge_key_priorities: Dict[str, str],
+        log_json,
+        stats_seconds: int = 60,
+    ):
+        self.lanes = {name: _Lane(name, slots.get(name, 0)) for name in PRIORITIES}
+        self.adapter_priorities = adapter_priorities
+        self.edge_key_priorities = edge_key_priorities
+        self.log_json = log_json
+        self.stats_seconds = stats_seconds
+        self._next_stats = time.monotonic() + stats_seconds
+        self._stats_lock = threading.Lock()
+
+    def lane_for(self, adapter: str, edge_key: str) -> str:
+        """The lane for a message; an edge key's priority wins over its adapter's."""
+        return self.edge_key_priorities.get(edge_key) or self.adapter_priorities.get(adapter) or NORMAL
+
+    @contextmanager
+    def slot(self, lane: str) -> Iterator[float]:
+        """
+        Hold a slot in `lane` while forwarding; yields the seconds spent waiting.
+
+        Raises LaneFull when the lane is saturated.
+        """
+        self._maybe_log_stats()
+        chosen = self.lanes[lane]
+        waited = chosen.acquire()
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            chosen.release(time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def _maybe_log_stats(self) -> None:
+        if self.stats_seconds <= 0 or time.monotonic() < self._next_stats:
+            return
+        if not self._stats_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_stats = time.monotonic() + self.stats_seconds
+            for lane in self.lanes.values():
+                stats = lane.stats(reset=True)
+                if stats['admitted'] or stats['shed'] or stats['in_flight']:
+                    self.log_json('info', STATS_CORRELATION_ID, 'Lane stats', **stats)
+        finally:
+            self._stats_lock.release()
@@ -0,0 +1,212 @@
+"""
+Micro-batching in front of RouterForwarder.
+
+Under heavy inbound load many requests are in flight to the router at once,
+each paying for its own round trip across the tailnet. RouterBatcher collects
+the forwards that arrive within a short linger window and sends them as one
+/ingest/batch request, then hands each waiting request handler its own item's
+response. A window's messages are split by the router the ring assigns their
+destination to, so batching never moves a destination off its router.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from services import json_codec
+from services.router_forwarder import RouterForwarder, RouterTimeoutError
+
+# Upper bound on the linger window, whatever is configured. The window is also
+# measured from the oldest waiting message, so later arrivals never extend it.
+MAX_LINGER_MS = 50
+
+# Source name logged by the router forwarder for a batch mixing many callers.
+BATCH_SOURCE = 'batch'
+
+# Batches sent at once. Each request thread can be waiting on its own batch,
+# so this matches gunicorn's --threads 4; fewer would leave windows queued
+# behind slow router calls while their deadlines run out.
+DEFAULT_FLUSH_WORKERS = 4
+
+
+@dataclass
+class _Pending:
+    body: Dict[str, Any]
+    correlation_id: str
+    edge_key_name: str
+    destination: str
+    size: int
+    enqueued_at: float
+    deadline: float
+    future: Future = field(default_factory=Future)
+
+
+class RouterBatcher:
+    """
+    Coalesces concurrent forwards into batched router requests.
+
+    A drop-in for RouterForwarder.forward: the caller blocks until the batch
+    carrying its message comes back, and then gets a response or exception
+    exactly as an unbatched forward would have produced. A window that closes
+    with only one message in it is sent through the ordinary single endpoint.
+    """
+
+    def __init__(
+        self,
+        forwarder: RouterForwarder,
+        max_items: int,
+        max_bytes: int,
+        linger_ms: int,
+        log_json,
+        flush_workers: int = DEFAULT_FLUSH_WORKERS,
+    ):
+        self.forwarder = forwarder
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.linger = min(linger_ms, MAX_LINGER_MS) / 1000.0
+        self.log_json = log_json
+        self.flush_workers = flush_workers
+
+        self._cond = threading.Condition()
+        self._pending: List[_Pending] = []
+        self._pending_bytes = 0
+        self._executor = None
+        self._flusher = None
+
+    def forward(self, body: Dict[str, Any], correlation_id: str, edge_key_name: str, destination: str):
+        """Queue the message for the next batch and wait for its own response."""
+        now = time.monotonic()
+        entry = _Pending(
+            body=body,
+            correlation_id=correlation_id,
+            edge_key_name=edge_key_name,
+            destination=destination,
+            size=len(json_codec.dumps_bytes(body)),
+            enqueued_at=now,
+            deadline=now + self.forwarder.timeout,
+        )
+
+        with self._cond:
+            self._ensure_started()
+            self._pending.append(entry)
+            self._pending_bytes += entry.size
+            self._cond.notify()
+
+        # The router call itself is bounded by the deadline; this only guards
+        # against a flusher that has died with the entry still queued.
+        try:
+            return entry.future.result(timeout=self.forwarder.timeout + self.linger + 1)
+        except FutureTimeoutError as exc:
+            self.log_json(
+                'error',
+                correlation_id,
+                'Batched router request never completed',
+                edge_key=edge_key_name,
+                destination=destination,
+            )
+            raise RouterTimeoutError('Batched router request timed out') from exc
+
+    def _ensure_started(self) -> None:
+        """Start the flusher on first use, so building the app spawns no threads."""
+        if self._flusher is not None:
+            return
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.flush_workers,
+            thread_name_prefix='router-batch',
+        )
+        self._flusher = threading.Thread(target=self._run, name='router-batcher', daemon=True)
+        self._flusher.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                flush_at = self._pending[0].enqueued_at + self.linger
+                while not self._is_full():
+                    remaining = flush_at - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._take_batch()
+
+            for group in self._by_router(batch):
+                self._executor.submit(self._dispatch, group)
+
+    def _is_full(self) -> bool:
+        return len(self._pending) >= self.max_items or self._pending_bytes >= self.max_bytes
+
+    def _take_batch(self) -> List[_Pending]:
+        """Pop the oldest messages that fit the count and byte limits, at least one."""
+        batch: List[_Pending] = []
+        batch_bytes = 0
+
+        for entry in self._pending:
+            if batch and (len(batch) >= self.max_items or batch_bytes + entry.size > self.max_bytes):
+                break
+            batch.append(entry)
+            batch_bytes += entry.size
+
+        del self._pending[:len(batch)]
+        self._pending_bytes -= batch_bytes
+        return batch
+
+    def _by_router(self, batch: List[_Pending]) -> List[List[_Pending]]:
+        """Split a batch by the router that owns each message's destination, keeping order."""
+        groups: Dict[str, List[_Pending]] = {}
+        for entry in batch:
+            groups.setdefault(self.forwarder.ring.candidates(entry.destination)[0], []).append(entry)
+        return list(groups.values())
+
+    def _dispatch(self, batch: List[_Pending]) -> None:
+        if len(batch) == 1:
+            entry = batch[0]
+            try:
+                entry.future.set_result(self.forwarder.forward(
+                    entry.body,
+                    entry.correlation_id,
+                    entry.edge_key_name,
+                    entry.destination,
+                    deadline=entry.deadline,
+                ))
+            except Exception as exc:  # pylint: disable=broad-except
+                entry.future.set_exception(exc)
+            return
+
+        batch_correlation_id = str(uuid.uuid4())
+        for entry in batch:
+            self.log_json(
+                'info',
+                entry.correlation_id,
+                'Coalesced into router batch',
+                edge_key=entry.edge_key_name,
+                destination=entry.destination,
+                batch_correlation_id=batch_correlation_id,
+                batch_size=len(batch),
+            )
+
+        items = [
+            {**entry.body, 'correlation_id': entry.correlation_id, 'source': entry.edge_key_name}
+            for entry in batch
+        ]
+
+        try:
+            results = self.forwarder.forward_batch(
+                items,
+                batch_correlation_id,
+                BATCH_SOURCE,
+                deadline=min(entry.deadline for entry in batch),
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            for entry in batch:
+                entry.future.set_exception(exc)
+            return
+
+        for entry, result in zip(batch, results):
+            entry.future.set_result(result)
@@ -1,9 +1,33 @@
+import threading
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import requests
 from requests import Response as RequestsResponse
 
+from services import json_codec
+from services.compression import compress
+from services.envelope_codec import (
+    JSON_FORMAT,
+    MSGPACK_CONTENT_TYPE,
+    MSGPACK_FORMAT,
+    UNSUPPORTED_HEADER,
+    encode_frame,
+)
+from services.router_ring import RouterRing, parse_router_urls
+
+# Remaining request budget, in milliseconds, handed to the router so it can
+# stop working on requests the edge has already given up on. A relative budget
+# rather than a wall-clock timestamp keeps it immune to clock skew between hosts.
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+
+# The edge key or adapter a message arrived through. Routes can use it to keep
+# each sender's messages in order.
+SOURCE_HEADER = 'X-Edge-Source'
+
+# Seconds the retry path sleeps before its second attempt.
+RETRY_DELAY_SECONDS = 1
+
 
 class RouterForwarderError(Exception):
     """Base exception for router forwarding issues."""
@@ -17,70 +41,244 @@ class RouterUnavailableError(RouterForwarderError):
     """Raised when the router cannot be reached after retries."""
 
 
+class _DeadlineExhausted(requests.exceptions.Timeout):
+    """The budget ran out before a router was contacted, so no router is to blame."""
+
+
+class BatchItemResponse:
+    """
+    One item's outcome from the router's /ingest/batch.
+
+    Exposes the same attributes the edge reads from a requests.Response, so a
+    batched result can be proxied back to its caller exactly like a single one.
+    """
+
+    def __init__(self, status_code: int, content: bytes, content_type: str):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {'Content-Type': content_type}
+        self.elapsed = None
+
+    @classmethod
+    def from_entry(cls, entry: Dict[str, Any]) -> 'BatchItemResponse':
+        """Rebuild the response body the router carried as `body` or `text`."""
+        if 'body' in entry:
+            content = json_codec.dumps_bytes(entry['body'])
+        else:
+            content = entry.get('text', '').encode('utf-8')
+        return cls(entry['status'], content, entry.get('content_type', 'application/json'))
+
+
 class RouterForwarder:
-    """Encapsulates communication with the router service."""
+    """
+    Encapsulates communication with the router service.
 
-    def __init__(self, router_url: str, ingress_key: str, timeout: int, log_json):
-        self.router_url = router_url
+    `router_url` may list several routers, comma-separated; see RouterRing
+    for how one is chosen per destination and how failover works.
+    """
+
+    def __init__(
+        self,
+        router_url: str,
+        ingress_key: str,
+        timeout: int,
+        log_json,
+        compression: str = '',
+        compression_min_bytes: int = 1024,
+        envelope_format: str = JSON_FORMAT,
+    ):
+        self.ring = RouterRing(parse_router_urls(router_url))
         self.ingress_key = ingress_key
         self.timeout = timeout
         self.log_json = log_json
+        self.compression = compression
+        self.compression_min_bytes = compression_min_bytes
+        self.envelope_format = envelope_format
+        self._format_lock = threading.Lock()
 
-    def forward(self, body: Dict[str, Any], correlation_id: str, edge_key_name: str, destination: str) -> RequestsResponse:
+    def forward(
+        self,
+        body: Dict[str, Any],
+        correlation_id: str,
+        edge_key_name: str,
+        destination: str,
+        deadline: Optional[float] = None,
+    ) -> RequestsResponse:
         """Forward the webhook payload to the router, handling retries and logging."""
-        self.log_json(
-            'info',
+        # One budget covers the first attempt and the retry, so the caller never
+        # waits longer than REQUEST_TIMEOUT in total. A caller that has already
+        # spent part of it (the batcher) passes its own deadline.
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        return self._forward(False, body, correlation_id, edge_key_name, destination, deadline)
+
+    def forward_batch(
+        self,
+        items: List[Dict[str, Any]],
+        correlation_id: str,
+        edge_key_name: str,
+        deadline: Optional[float] = None,
+    ) -> List[Any]:
+        """
+        Deliver several envelopes through the router's /ingest/batch in one request.
+
+        Each item is a {'destination', 'payload'} envelope, optionally with its
+        own 'correlation_id'. Returns one response-like object per item, in
+        order. When the router rejects the batch as a whole, every item gets
+        that same response. Transport failures raise exactly as forward() does.
+
+        The batch goes to the router that owns its first item's destination;
+        RouterBatcher only batches items owned by the same router.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+
+        destinations = ','.join(sorted({str(item.get('destination')) for item in items}))
+        response = self._forward(
+            True,
+            {'items': items},
             correlation_id,
-            'Forwarding to router',
-            edge_key=edge_key_name,
-            destination=destination,
+            edge_key_name,
+            destinations,
+            deadline,
+            ring_key=str(items[0].get('destination')),
         )
 
+        if response.status_code != 200:
+            return [response] * len(items)
+
         try:
-            response = self._send(body, correlation_id)
-            self._log_router_response(response, correlation_id, edge_key_name, destination)
-            return response
-        except requests.exceptions.Timeout as exc:
+            entries = json_codec.loads(response.content)['results']
+            results = [BatchItemResponse.from_entry(entry) for entry in entries]
+        except (ValueError, KeyError, TypeError) as exc:
             self.log_json(
                 'error',
                 correlation_id,
-                'Router timeout',
+                'Malformed batch response from router',
                 edge_key=edge_key_name,
-                destination=destination,
-            )
-            raise RouterTimeoutError('Router request timed out') from exc
-        except requests.exceptions.ConnectionError as exc:
-            self.log_json(
-                'error',
-                correlation_id,
-                'Router connection failed',
-                edge_key=edge_key_name,
-                destination=destination,
                 error=str(exc),
             )
-            return self._retry(body, correlation_id, edge_key_name, destination, exc)
-        except Exception as exc:
+            raise RouterForwarderError('Malformed batch response from router') from exc
+
+        if len(results) != len(items):
             self.log_json(
                 'error',
                 correlation_id,
-                'Unexpected router error',
+                'Batch response size mismatch',
                 edge_key=edge_key_name,
-                destination=destination,
-                error=str(exc),
+                expected=len(items),
+                received=len(results),
             )
-            raise RouterForwarderError('Unexpected router error') from exc
+            raise RouterForwarderError('Batch response size mismatch')
+
+        return results
+
+    def _forward(
+        self,
+        batch: bool,
+        body: Dict[str, Any],
+        correlation_id: str,
+        edge_key_name: str,
+        destination: str,
+        deadline: float,
+        ring_key: Optional[str] = None,
+    ) -> RequestsResponse:
+        """
+        Send to the router chosen for `destination` (or `ring_key`), failing over to the others.
+
+        When no router accepts the connection, the preferred one is retried
+        once after a short delay.
+        """
+        self.log_json(
+            'info',
+            correlation_id,
+            'Forwarding to router',
+            edge_key=edge_key_name,
+            destination=destination,
+        )
+
+        routers = self.ring.candidates(ring_key if ring_key is not None else destination)
+        connection_error = None
+        for router in routers:
+            url = _endpoint_url(router, batch)
+            try:
+                response = self._send(url, body, correlation_id, edge_key_name, deadline)
+            except requests.exceptions.Timeout as exc:
+                if not isinstance(exc, _DeadlineExhausted):
+                    self.ring.record_failure(router)
+                self.log_json(
+                    'error',
+                    correlation_id,
+                    'Router timeout',
+                    edge_key=edge_key_name,
+                    destination=destination,
+                )
+                raise RouterTimeoutError('Router request timed out') from exc
+            except requests.exceptions.ConnectionError as exc:
+                self.ring.record_failure(router)
+                self.log_json(
+                    'error',
+                    correlation_id,
+                    'Router connection failed',
+                    edge_key=edge_key_name,
+                    destination=destination,
+                    router=router,
+                    error=str(exc),
+                )
+                connection_error = exc
+                continue
+            except Exception as exc:
+                self.log_json(
+                    'error',
+                    correlation_id,
+                    'Unexpected router error',
+                    edge_key=edge_key_name,
+                    destination=destination,
+                    error=str(exc),
+                )
+                raise RouterForwarderError('Unexpected router error') from exc
+
+            self.ring.record_success(router)
+            if router != routers[0]:
+                self.log_json(
+                    'warn',
+                    correlation_id,
+                    'Failed over to another router',
+                    edge_key=edge_key_name,
+                    destination=destination,
+                    router=router,
+                )
+            self._log_router_response(response, correlation_id, edge_key_name, destination)
+            return response
+
+        return self._retry(
+            routers[0], batch, body, correlation_id, edge_key_name, destination, deadline, connection_error
+        )
 
     def _retry(
         self,
+        router: str,
+        batch: bool,
         body: Dict[str, Any],
         correlation_id: str,
         edge_key_name: str,
         destination: str,
+        deadline: float,
         original_exc: Exception,
     ) -> RequestsResponse:
         """Retry router communication once after a short delay."""
+        if deadline - time.monotonic() <= RETRY_DELAY_SECONDS:
+            self.log_json(
+                'error',
+                correlation_id,
+                'No time left to retry router connection',
+                edge_key=edge_key_name,
+                destination=destination,
+            )
+            raise RouterUnavailableError('Router unreachable and deadline exhausted') from original_exc
+
         try:
-            time.sleep(1)
+            time.sleep(RETRY_DELAY_SECONDS)
             self.log_json(
                 'info',
                 correlation_id,
@@ -88,7 +286,8 @@ class RouterForwarder:
                 edge_key=edge_key_name,
                 destination=destination,
             )
-            response = self._send(body, correlation_id)
+            response = self._send(_endpoint_url(router, batch), body, correlation_id, edge_key_name, deadline)
+            self.ring.record_success(router)
             self.log_json(
                 'info',
                 correlation_id,
@@ -110,18 +309,66 @@ class RouterForwarder:
             )
             raise RouterUnavailableError('Router unreachable after retry') from original_exc
 
-    def _send(self, body: Dict[str, Any], correlation_id: str) -> RequestsResponse:
-        """Send the payload to the router."""
-        return requests.post(
-            self.router_url,
-            json=body,
-            headers={
-                'Authorization': f'Bearer {self.ingress_key}',
-                'X-Correlation-ID': correlation_id,
-                'Content-Type': 'application/json',
-            },
-            timeout=self.timeout,
-        )
+    def _send(
+        self,
+        url: str,
+        body: Dict[str, Any],
+        correlation_id: str,
+        edge_key_name: str,
+        deadline: float,
+    ) -> RequestsResponse:
+        """
+        Send the payload to the router with whatever budget remains.
+
+        A MessagePack frame carries the correlation ID, source, and budget
+        itself; a JSON body leaves them to headers.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise _DeadlineExhausted('Request deadline exhausted before sending')
+
+        deadline_ms = int(remaining * 1000)
+        headers = {'Authorization': f'Bearer {self.ingress_key}'}
+
+        if self.envelope_format == MSGPACK_FORMAT:
+            headers['Content-Type'] = MSGPACK_CONTENT_TYPE
+            data = encode_frame(body, correlation_id, edge_key_name, deadline_ms)
+            response = self._post(url, data, headers, remaining)
+            # Only a router that says it lacks msgpack support; other 415s
+            # (such as an unsupported Content-Encoding) are passed on.
+            if response.status_code != 415 or response.headers.get(UNSUPPORTED_HEADER) != MSGPACK_FORMAT:
+                return response
+
+            # Stay on JSON from now on.
+            with self._format_lock:
+                if self.envelope_format == MSGPACK_FORMAT:
+                    self.envelope_format = JSON_FORMAT
+                    self.log_json(
+                        'warn',
+                        correlation_id,
+                        'Router does not accept MessagePack envelopes, falling back to JSON',
+                        edge_key=edge_key_name,
+                    )
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise _DeadlineExhausted('Request deadline exhausted before sending')
+            deadline_ms = int(remaining * 1000)
+            headers = {'Authorization': f'Bearer {self.ingress_key}'}
+
+        headers.update({
+            'X-Correlation-ID': correlation_id,
+            'Content-Type': 'application/json',
+            DEADLINE_HEADER: str(deadline_ms),
+            SOURCE_HEADER: edge_key_name,
+        })
+        return self._post(url, json_codec.dumps_bytes(body), headers, remaining)
+
+    def _post(self, url: str, data: bytes, headers: Dict[str, str], timeout: float) -> RequestsResponse:
+        """POST an encoded body, compressing it when it is large enough."""
+        if self.compression and len(data) >= self.compression_min_bytes:
+            headers = {**headers, 'Content-Encoding': self.compression}
+            data = compress(data, self.compression)
+        return requests.post(url, data=data, headers=headers, timeout=timeout)
 
     def _log_router_response(
         self,
@@ -140,3 +387,8 @@ class RouterForwarder:
         if duration_ms is not None:
             payload['duration_ms'] = duration_ms
         self.log_json('info', correlation_id, 'Router responded', **payload)
+
+
+def _endpoint_url(router_url: str, batch: bool) -> str:
+    """ROUTER_URL names a router's /ingest endpoint; the batch endpoint sits beneath it."""
+    return router_url.rstrip('/') + '/batch' if batch else router_url
@@ -0,0 +1,162 @@
+"""
+Spreading router traffic over several routers.
+
+ROUTER_URL may list several routers, comma-separated. Each destination is
+placed on a consistent-hash ring, so its messages keep going to the same
+router, which keeps that router's connection pool to the destination warm.
+Adding or removing a router moves only the destinations next to it on the
+ring.
+
+When the chosen router cannot be reached, the forwarder fails over to the
+next router on the ring. Health is tracked passively: a router that refuses
+connections FAILURE_THRESHOLD times in a row is skipped for EJECTION_SECONDS.
+An optional RouterHealthChecker also probes each router's /health in the
+background. If every router looks unhealthy, all of them are still tried
+rather than failing outright.
+"""
+import bisect
+import hashlib
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import requests
+
+# Consecutive connection failures that take a router out of rotation, and for how long.
+FAILURE_THRESHOLD = 2
+EJECTION_SECONDS = 10.0
+
+# Points per router on the ring; more points spread destinations more evenly.
+VIRTUAL_NODES = 64
+
+
+def parse_router_urls(value: str) -> List[str]:
+    """Split a comma-separated ROUTER_URL into its router URLs."""
+    return [url.strip() for url in value.split(',') if url.strip()]
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class _RouterState:
+    """Health of one router. Only touched while holding the ring lock."""
+
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.check_healthy = True
+
+    def is_healthy(self, now: float) -> bool:
+        return self.check_healthy and now >= self.ejected_until
+
+
+class RouterRing:
+    """Orders the routers to try for a given key, healthy ones first."""
+
+    def __init__(self, urls: List[str], virtual_nodes: int = VIRTUAL_NODES):
+        if not urls:
+            raise ValueError('At least one router URL is required')
+
+        self.urls = list(dict.fromkeys(urls))
+        points: List[Tuple[int, str]] = sorted(
+            (_hash(f'{url}#{index}'), url) for url in self.urls for index in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [url for _, url in points]
+        self._state: Dict[str, _RouterState] = {url: _RouterState() for url in self.urls}
+        self._lock = threading.Lock()
+
+    def candidates(self, key: str) -> List[str]:
+        """Every router, in the order to try them for `key`."""
+        if len(self.urls) == 1:
+            return list(self.urls)
+
+        start = bisect.bisect(self._hashes, _hash(key))
+        ordered: List[str] = []
+        for offset in range(len(self._owners)):
+            url = self._owners[(start + offset) % len(self._owners)]
+            if url not in ordered:
+                ordered.append(url)
+                if len(ordered) == len(self.urls):
+                    break
+
+        with self._lock:
+            now = time.monotonic()
+            healthy = [url for url in ordered if self._state[url].is_healthy(now)]
+        return healthy + [url for url in ordered if url not in healthy]
+
+    def record_success(self, url: str) -> None:
+        with self._lock:
+            state = self._state[url]
+            state.consecutive_failures = 0
+            state.ejected_until = 0.0
+
+    def record_failure(self, url: str) -> None:
+        with self._lock:
+            state = self._state[url]
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= FAILURE_THRESHOLD:
+                state.ejected_until = time.monotonic() + EJECTION_SECONDS
+
+    def set_checked(self, url: str, healthy: bool) -> bool:
+        """Apply the result of an active health check; True when it changed."""
+        with self._lock:
+            state = self._state[url]
+            changed = state.check_healthy != healthy
+            state.check_healthy = healthy
+            return changed
+
+    def snapshot(self) -> Dict[str, bool]:
+        with self._lock:
+            now = time.monotonic()
+            return {url: state.is_healthy(now) for url, state in self._state.items()}
+
+
+def health_url(router_url: str) -> str:
+    """The /health endpoint beside a router's /ingest endpoint."""
+    base = router_url.rstrip('/')
+    if base.endswith('/ingest'):
+        base = base[:-len('/ingest')]
+    return base + '/health'
+
+
+class RouterHealthChecker:
+    """Probes every router's /health on an interval and feeds the ring."""
+
+    def __init__(self, ring: RouterRing, interval_seconds: float, timeout_seconds: float, log_json):
+        self.ring = ring
+        self.interval = interval_seconds
+        self.timeout = timeout_seconds
+        self.log_json = log_json
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='router-health', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check_once(self) -> None:
+        for url in self.ring.urls:
+            try:
+                healthy = requests.get(health_url(url), timeout=self.timeout).status_code == 200
+            except requests.exceptions.RequestException:
+                healthy = False
+
+            if self.ring.set_checked(url, healthy):
+                self.log_json(
+                    'info' if healthy else 'warn',
+                    'health-check',
+                    'Router health changed',
+                    router=url,
+                    healthy=healthy,
+                )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check_once()
+            self._stop.wait(self.interval)
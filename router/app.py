@@ -4,14 +4,19 @@ Receives from edge, validates ingress key, routes to internal services.
 """
 
 import os
+import sqlite3
 import sys
 from functools import partial
 
 from flask import Flask
 
 from config.routes_loader import load_routes
+from config.settings import load_router_config
 from http_handlers.error_handlers import register_error_handlers
+from http_handlers.queue_admin import create_queue_admin_blueprint
 from http_handlers.routes import create_router_blueprint
+from services.delivery_queue import DeliveryQueue, DurableDelivery
+from services.health_monitor import HealthMonitor
 from logging_utils import setup_logging, log_json
 
 # Configuration
@@ -27,15 +32,70 @@ def create_app() -> Flask:
         sys.exit(1)
 
     routes = load_routes()
+    config = load_router_config(logger)
     app = Flask(__name__)
 
     json_logger = partial(log_json, logger)
-    router_blueprint = create_router_blueprint(routes, ROUTER_INGRESS_KEY, json_logger)
+
+    health_monitor = None
+    if config.health_check_interval_seconds:
+        health_monitor = HealthMonitor(
+            routes,
+            json_logger,
+            config.health_check_interval_seconds,
+            config.health_check_concurrency,
+            config.health_check_timeout_seconds,
+        )
+
+    # The queue is only opened when something uses it, so routers without
+    # durable routes or delayed delivery need no writable data directory.
+    durable = None
+    durable_routes = [dest for dest, route_config in routes.items() if route_config.get('delivery') == 'durable']
+    if durable_routes or config.delayed_delivery:
+        try:
+            queue = DeliveryQueue(config.durable_queue_path)
+        except (OSError, sqlite3.Error) as exc:
+            logger.error(
+                'Cannot open the delivery queue at %s (needed by %s): %s. '
+                'Make its directory writable by the router user or set DURABLE_QUEUE_PATH.',
+                config.durable_queue_path,
+                'durable routes' if durable_routes else 'DELAYED_DELIVERY',
+                exc,
+            )
+            sys.exit(1)
+        durable = DurableDelivery(
+            queue,
+            routes,
+            json_logger,
+            config.durable_workers,
+            config.durable_max_attempts,
+            backoff_max_seconds=config.durable_backoff_max_seconds,
+        )
+
+    router_blueprint = create_router_blueprint(
+        routes, ROUTER_INGRESS_KEY, json_logger, config, health_monitor, durable
+    )
     app.register_blueprint(router_blueprint)
+    if durable is not None:
+        app.register_blueprint(create_queue_admin_blueprint(durable.queue, ROUTER_INGRESS_KEY, json_logger))
     register_error_handlers(app, json_logger)
 
     logger.info('Router service starting')
     logger.info('Configured destinations: %s', ', '.join(routes.keys()))
+    if health_monitor is not None:
+        # Started after the blueprint has subscribed the upstream pools.
+        health_monitor.start()
+        logger.info('Health checks every ~%ss, %s at a time',
+                    config.health_check_interval_seconds, config.health_check_concurrency)
+    if durable is not None:
+        # Started after the blueprint has given it a delivery path.
+        durable.start()
+        logger.info('Durable delivery queue at %s, %s workers, %s attempts',
+                    config.durable_queue_path, config.durable_workers, config.durable_max_attempts)
+    if config.delayed_delivery:
+        logger.info('Delayed delivery enabled, up to %ss ahead', config.max_delay_seconds)
+    logger.info('Batch ingest: up to %s items, %s concurrent deliveries',
+                config.batch_max_items, config.batch_max_workers)
 
     return app
 
@@ -5,11 +5,27 @@ from typing import Dict, Any
 
 import yaml
 
+from services.coalescer import COALESCE_MODES
+from services.compression import available_encodings
+from services.key_expression import parse_key_expression
+from services.route_table import PATTERN_FIELDS, WILDCARD, is_pattern
+from services.routing_rules import RuleIndex
+from services.transform import compile_transform
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 ROUTES_FILE = BASE_DIR / 'routes.yml'
 logger = logging.getLogger(__name__)
 
+AGGREGATE_POLICIES = ('all', 'first', 'quorum')
+BALANCER_STRATEGIES = ('round_robin', 'least_outstanding', 'ewma')
+DELIVERY_MODES = ('direct', 'durable')
+
+# Route fields a fan-out target inherits unless it sets its own.
+TARGET_INHERITED_FIELDS = ('method', 'timeout_seconds', 'auth_env')
+# Optional route fields a target inherits, when the route sets them.
+TARGET_OPTIONAL_FIELDS = ('transform', 'compression')
+
 
 def load_routes() -> Dict[str, Dict[str, Any]]:
     """
@@ -26,7 +42,13 @@ def load_routes() -> Dict[str, Dict[str, Any]]:
         routes = config['destinations']
 
         for dest_name, route_config in routes.items():
-            if 'url' not in route_config:
+            if WILDCARD in dest_name:
+                _validate_pattern(dest_name, route_config)
+
+            if 'upstreams' in route_config:
+                _validate_upstreams(dest_name, route_config)
+
+            if 'url' not in route_config and 'targets' not in route_config and 'rules' not in route_config:
                 logger.error('Route "%s" missing required "url" field', dest_name)
                 sys.exit(1)
 
@@ -34,6 +56,36 @@ def load_routes() -> Dict[str, Dict[str, Any]]:
             route_config.setdefault('timeout_seconds', 25)
             route_config.setdefault('auth_env', None)
 
+            if 'transform' in route_config:
+                _compile_transform(dest_name, route_config)
+
+            if 'compression' in route_config:
+                _validate_compression(dest_name, route_config)
+
+            if 'targets' in route_config:
+                _expand_targets(dest_name, route_config)
+
+            if 'cache' in route_config:
+                _validate_cache(dest_name, route_config)
+
+            if 'hedge' in route_config:
+                _validate_hedge(dest_name, route_config)
+
+            if 'adaptive_timeout' in route_config:
+                _validate_adaptive_timeout(dest_name, route_config)
+
+            if 'delivery' in route_config:
+                _validate_delivery(dest_name, route_config)
+
+            if 'ordering' in route_config:
+                _validate_ordering(dest_name, route_config)
+
+            if 'coalesce' in route_config:
+                _validate_coalesce(dest_name, route_config)
+
+            if 'rules' in route_config:
+                _validate_rules(dest_name, route_config, routes)
+
         logger.info('Loaded %d routes from %s', len(routes), ROUTES_FILE)
         return routes
 
@@ -46,3 +98,304 @@ def load_routes() -> Dict[str, Dict[str, Any]]:
     except Exception as exc:  # noqa: BLE001
         logger.error('Failed to load routes: %s', exc)
         sys.exit(1)
+
+
+def _validate_pattern(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate a wildcard route such as `wikimgr.*`."""
+    if not is_pattern(dest_name) or WILDCARD in dest_name[:-1] or dest_name == '.' + WILDCARD:
+        logger.error('Route "%s": a wildcard must be a whole last segment, as in "name.*"', dest_name)
+        sys.exit(1)
+
+    unsupported = sorted(set(route_config) - set(PATTERN_FIELDS))
+    if unsupported:
+        logger.error('Wildcard route "%s" cannot set: %s', dest_name, ', '.join(unsupported))
+        sys.exit(1)
+
+
+def _validate_upstreams(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """
+    Validate a load-balanced route.
+
+    `url` is set to the first replica when absent, so anything that only
+    knows about single-URL routes still has something sensible to log.
+    """
+    upstreams = route_config['upstreams']
+    if (not isinstance(upstreams, list) or not upstreams
+            or not all(isinstance(url, str) and url for url in upstreams)):
+        logger.error('Route "%s" "upstreams" must be a non-empty list of URLs', dest_name)
+        sys.exit(1)
+
+    if len(set(upstreams)) != len(upstreams):
+        logger.error('Route "%s" lists the same upstream more than once', dest_name)
+        sys.exit(1)
+
+    balancer = route_config.setdefault('balancer', 'round_robin')
+    if balancer not in BALANCER_STRATEGIES:
+        logger.error('Route "%s" has unknown balancer "%s" (expected one of: %s)',
+                     dest_name, balancer, ', '.join(BALANCER_STRATEGIES))
+        sys.exit(1)
+
+    route_config.setdefault('url', upstreams[0])
+
+
+def _validate_cache(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate a response cache block. Only idempotent GET routes may cache."""
+    cache = route_config['cache']
+    if not isinstance(cache, dict):
+        logger.error('Route "%s" "cache" must be a mapping', dest_name)
+        sys.exit(1)
+
+    if route_config['method'].upper() != 'GET':
+        logger.error('Route "%s" can only cache responses when its method is GET', dest_name)
+        sys.exit(1)
+
+    cache.setdefault('max_entries', 256)
+    cache.setdefault('max_bytes', 1024 * 1024)
+    for field in ('ttl_seconds', 'max_entries', 'max_bytes'):
+        value = cache.get(field)
+        if not _is_number(value) or value <= 0:
+            logger.error('Route "%s" cache "%s" must be a positive number', dest_name, field)
+            sys.exit(1)
+
+
+def _validate_hedge(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """
+    Validate a hedging policy.
+
+    A hedge sends the same request twice, so it is only allowed on GET routes
+    or routes explicitly marked `idempotent: true`.
+    """
+    hedge = route_config['hedge']
+    if not isinstance(hedge, dict):
+        logger.error('Route "%s" "hedge" must be a mapping', dest_name)
+        sys.exit(1)
+
+    if route_config['method'].upper() != 'GET' and route_config.get('idempotent') is not True:
+        logger.error('Route "%s" can only hedge GET requests unless it sets "idempotent: true"', dest_name)
+        sys.exit(1)
+
+    if 'targets' in route_config:
+        logger.error('Route "%s" cannot combine "hedge" with fan-out "targets"', dest_name)
+        sys.exit(1)
+
+    hedge.setdefault('percentile', 95)
+    hedge.setdefault('max_percent', 10)
+    hedge.setdefault('min_delay_ms', 10)
+
+    if not _is_number(hedge['percentile']) or not 0 < hedge['percentile'] < 100:
+        logger.error('Route "%s" hedge "percentile" must be between 0 and 100', dest_name)
+        sys.exit(1)
+    if not _is_number(hedge['max_percent']) or not 0 < hedge['max_percent'] <= 100:
+        logger.error('Route "%s" hedge "max_percent" must be above 0 and at most 100', dest_name)
+        sys.exit(1)
+    if not _is_number(hedge['min_delay_ms']) or hedge['min_delay_ms'] < 0:
+        logger.error('Route "%s" hedge "min_delay_ms" must not be negative', dest_name)
+        sys.exit(1)
+
+
+def _validate_adaptive_timeout(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate an adaptive timeout policy; `timeout_seconds` stays the ceiling."""
+    policy = route_config['adaptive_timeout']
+    if not isinstance(policy, dict):
+        logger.error('Route "%s" "adaptive_timeout" must be a mapping', dest_name)
+        sys.exit(1)
+
+    if 'targets' in route_config:
+        logger.error('Route "%s" cannot combine "adaptive_timeout" with fan-out "targets"', dest_name)
+        sys.exit(1)
+
+    policy.setdefault('percentile', 99)
+    policy.setdefault('multiplier', 3)
+    policy.setdefault('floor_seconds', 1)
+
+    if not _is_number(policy['percentile']) or not 0 < policy['percentile'] < 100:
+        logger.error('Route "%s" adaptive_timeout "percentile" must be between 0 and 100', dest_name)
+        sys.exit(1)
+    if not _is_number(policy['multiplier']) or policy['multiplier'] < 1:
+        logger.error('Route "%s" adaptive_timeout "multiplier" must be at least 1', dest_name)
+        sys.exit(1)
+    if (not _is_number(policy['floor_seconds']) or policy['floor_seconds'] <= 0
+            or policy['floor_seconds'] > route_config['timeout_seconds']):
+        logger.error('Route "%s" adaptive_timeout "floor_seconds" must be above 0 and at most "timeout_seconds"',
+                     dest_name)
+        sys.exit(1)
+
+
+def _validate_delivery(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate the delivery mode. Durable routes answer 202 at once, so they cannot be cached."""
+    if route_config['delivery'] not in DELIVERY_MODES:
+        logger.error('Route "%s" "delivery" must be one of: %s', dest_name, ', '.join(DELIVERY_MODES))
+        sys.exit(1)
+
+    if route_config['delivery'] == 'durable' and 'cache' in route_config:
+        logger.error('Route "%s" cannot combine durable delivery with "cache"', dest_name)
+        sys.exit(1)
+
+
+def _validate_ordering(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate a per-key ordering block and its key expression."""
+    ordering = route_config['ordering']
+    if not isinstance(ordering, dict) or 'key' not in ordering:
+        logger.error('Route "%s" "ordering" must be a mapping with a "key"', dest_name)
+        sys.exit(1)
+
+    try:
+        parse_key_expression(ordering['key'])
+    except ValueError as exc:
+        logger.error('Route "%s" ordering "key" is invalid: %s', dest_name, exc)
+        sys.exit(1)
+
+    if route_config.get('delivery') == 'durable':
+        logger.error('Route "%s" cannot combine "ordering" with durable delivery', dest_name)
+        sys.exit(1)
+
+
+def _validate_coalesce(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate a coalescing window. Callers are answered 202, so it cannot be combined with a cache."""
+    coalesce = route_config['coalesce']
+    if not isinstance(coalesce, dict):
+        logger.error('Route "%s" "coalesce" must be a mapping', dest_name)
+        sys.exit(1)
+
+    if 'cache' in route_config:
+        logger.error('Route "%s" cannot combine "coalesce" with "cache"', dest_name)
+        sys.exit(1)
+
+    coalesce.setdefault('mode', 'latest')
+    coalesce.setdefault('max_events', 100)
+
+    if 'key' in coalesce:
+        try:
+            parse_key_expression(coalesce['key'])
+        except ValueError as exc:
+            logger.error('Route "%s" coalesce "key" is invalid: %s', dest_name, exc)
+            sys.exit(1)
+
+    if coalesce['mode'] not in COALESCE_MODES:
+        logger.error('Route "%s" coalesce "mode" must be one of: %s', dest_name, ', '.join(COALESCE_MODES))
+        sys.exit(1)
+    if not _is_number(coalesce.get('window_ms')) or coalesce['window_ms'] <= 0:
+        logger.error('Route "%s" coalesce "window_ms" must be a positive number', dest_name)
+        sys.exit(1)
+    max_events = coalesce['max_events']
+    if isinstance(max_events, bool) or not isinstance(max_events, int) or max_events < 1:
+        logger.error('Route "%s" coalesce "max_events" must be a positive integer', dest_name)
+        sys.exit(1)
+
+
+def _validate_rules(dest_name: str, route_config: Dict[str, Any], routes: Dict[str, Any]) -> None:
+    """
+    Validate content-based routing rules and compile them once to check their fields.
+
+    Rules lead to ordinary routes only, never to another route with rules, so
+    a message is routed by content at most once.
+    """
+    rules = route_config['rules']
+    if not isinstance(rules, list) or not rules:
+        logger.error('Route "%s" "rules" must be a non-empty list', dest_name)
+        sys.exit(1)
+
+    for position, rule in enumerate(rules):
+        if (not isinstance(rule, dict) or not isinstance(rule.get('match'), dict) or not rule['match']
+                or 'destination' not in rule):
+            logger.error('Route "%s" rule %d needs a non-empty "match" mapping and a "destination"',
+                         dest_name, position)
+            sys.exit(1)
+
+        target = routes.get(rule['destination'])
+        if not isinstance(target, dict) or 'rules' in target:
+            logger.error('Route "%s" rule %d must lead to a route without rules, not "%s"',
+                         dest_name, position, rule['destination'])
+            sys.exit(1)
+
+    try:
+        RuleIndex(rules)
+    except ValueError as exc:
+        logger.error('Route "%s" has an invalid rule field: %s', dest_name, exc)
+        sys.exit(1)
+
+
+def _compile_transform(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Replace a `transform` block with its compiled form, so no delivery parses it again."""
+    try:
+        route_config['transform'] = compile_transform(route_config['transform'])
+    except ValueError as exc:
+        logger.error('Route "%s" "transform" is invalid: %s', dest_name, exc)
+        sys.exit(1)
+
+
+def _validate_compression(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """Validate request compression; bodies under `min_bytes` are sent as they are."""
+    compression = route_config['compression']
+    if not isinstance(compression, dict):
+        logger.error('Route "%s" "compression" must be a mapping', dest_name)
+        sys.exit(1)
+
+    compression.setdefault('encoding', 'gzip')
+    compression.setdefault('min_bytes', 1024)
+
+    if compression['encoding'] not in available_encodings():
+        logger.error('Route "%s" compression "encoding" must be one of: %s (zstd needs the zstandard package)',
+                     dest_name, ', '.join(available_encodings()))
+        sys.exit(1)
+    min_bytes = compression['min_bytes']
+    if isinstance(min_bytes, bool) or not isinstance(min_bytes, int) or min_bytes < 0:
+        logger.error('Route "%s" compression "min_bytes" must be a non-negative integer', dest_name)
+        sys.exit(1)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _expand_targets(dest_name: str, route_config: Dict[str, Any]) -> None:
+    """
+    Validate a fan-out route and give each target a complete route config.
+
+    Targets inherit method, timeout, auth, transform, and compression from
+    their route, so each one can be forwarded exactly like an ordinary
+    destination.
+    """
+    targets = route_config['targets']
+    if not isinstance(targets, list) or not targets:
+        logger.error('Route "%s" "targets" must be a non-empty list', dest_name)
+        sys.exit(1)
+
+    aggregate = route_config.setdefault('aggregate', 'all')
+    if aggregate not in AGGREGATE_POLICIES:
+        logger.error('Route "%s" has unknown aggregate policy "%s" (expected one of: %s)',
+                     dest_name, aggregate, ', '.join(AGGREGATE_POLICIES))
+        sys.exit(1)
+
+    quorum = route_config.setdefault('quorum', None)
+    if quorum is not None and (not isinstance(quorum, int) or not 1 <= quorum <= len(targets)):
+        logger.error('Route "%s" quorum must be between 1 and %d', dest_name, len(targets))
+        sys.exit(1)
+
+    expanded = []
+    for index, target in enumerate(targets):
+        if isinstance(target, str):
+            target = {'url': target}
+        if not isinstance(target, dict) or 'url' not in target:
+            logger.error('Route "%s" target %d missing required "url" field', dest_name, index)
+            sys.exit(1)
+
+        target = dict(target)
+        target.setdefault('name', f'{dest_name}[{index}]')
+        for field in TARGET_INHERITED_FIELDS:
+            target.setdefault(field, route_config[field])
+        if 'transform' in target:
+            _compile_transform(target['name'], target)
+        if 'compression' in target:
+            _validate_compression(target['name'], target)
+        for field in TARGET_OPTIONAL_FIELDS:
+            if field in route_config:
+                target.setdefault(field, route_config[field])
+        expanded.append(target)
+
+    names = [target['name'] for target in expanded]
+    if len(set(names)) != len(names):
+        logger.error('Route "%s" target names must be unique', dest_name)
+        sys.exit(1)
+
+    route_config['targets'] = expanded
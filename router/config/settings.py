@@ -0,0 +1,99 @@
+import os
+from dataclasses import dataclass
+from logging import Logger
+
+
+@dataclass(frozen=True)
+class RouterConfig:
+    """Service-wide tuning knobs. Per-destination settings live in routes.yml."""
+
+    # Largest number of envelopes accepted by one /ingest/batch request.
+    batch_max_items: int = 100
+    # Destinations contacted concurrently while fanning a batch out.
+    batch_max_workers: int = 8
+    # Pool shared by every fan-out route for delivering to its targets.
+    fanout_max_workers: int = 16
+    # Pool shared by every hedging route for its first and second attempts.
+    hedge_max_workers: int = 16
+    # Pool shared by every route with `ordering`, one delivery per key at a time.
+    ordered_max_workers: int = 8
+    # Pool that makes the one delivery for each closed coalescing window.
+    coalesce_max_workers: int = 4
+    # Background destination probing; an interval of 0 turns it off.
+    health_check_interval_seconds: int = 0
+    health_check_concurrency: int = 4
+    health_check_timeout_seconds: int = 5
+    # SQLite queue for routes with `delivery: durable` and delayed envelopes,
+    # and its delivery workers. Only opened when one of those is in use.
+    durable_queue_path: str = 'data/delivery-queue.db'
+    durable_workers: int = 4
+    # Attempts before a message is moved to the dead-letter table.
+    durable_max_attempts: int = 8
+    # Longest wait between retries of one message or destination.
+    durable_backoff_max_seconds: int = 300
+    # Largest size a compressed /ingest body may decompress to (default 10 MiB).
+    max_decompressed_bytes: int = 10 * 1024 * 1024
+    # Whether envelopes may ask for delayed delivery (delay_seconds or
+    # deliver_at), and how far ahead (default a week).
+    delayed_delivery: bool = False
+    max_delay_seconds: int = 7 * 24 * 3600
+
+
+def _int_env(name: str, default: int, logger: Logger, minimum: int = 1) -> int:
+    raw = os.getenv(name, '').strip()
+    if not raw:
+        return default
+
+    try:
+        value = int(raw)
+    except ValueError:
+        logger.warning('%s must be an integer, using default %s', name, default)
+        return default
+
+    if value < minimum:
+        logger.warning('%s must be at least %s, using default %s', name, minimum, default)
+        return default
+
+    return value
+
+
+def _bool_env(name: str, default: bool, logger: Logger) -> bool:
+    raw = os.getenv(name, '').strip().lower()
+    if not raw:
+        return default
+    if raw in ('1', 'true', 'yes', 'on'):
+        return True
+    if raw in ('0', 'false', 'no', 'off'):
+        return False
+    logger.warning('%s must be true or false, using default %s', name, default)
+    return default
+
+
+def load_router_config(logger: Logger) -> RouterConfig:
+    """Load router tuning from environment variables."""
+    return RouterConfig(
+        batch_max_items=_int_env('BATCH_MAX_ITEMS', RouterConfig.batch_max_items, logger),
+        batch_max_workers=_int_env('BATCH_MAX_WORKERS', RouterConfig.batch_max_workers, logger),
+        fanout_max_workers=_int_env('FANOUT_MAX_WORKERS', RouterConfig.fanout_max_workers, logger),
+        hedge_max_workers=_int_env('HEDGE_MAX_WORKERS', RouterConfig.hedge_max_workers, logger),
+        ordered_max_workers=_int_env('ORDERED_MAX_WORKERS', RouterConfig.ordered_max_workers, logger),
+        coalesce_max_workers=_int_env('COALESCE_MAX_WORKERS', RouterConfig.coalesce_max_workers, logger),
+        health_check_interval_seconds=_int_env(
+            'HEALTH_CHECK_INTERVAL_SECONDS', RouterConfig.health_check_interval_seconds, logger, minimum=0
+        ),
+        health_check_concurrency=_int_env(
+            'HEALTH_CHECK_CONCURRENCY', RouterConfig.health_check_concurrency, logger
+        ),
+        health_check_timeout_seconds=_int_env(
+            'HEALTH_CHECK_TIMEOUT_SECONDS', RouterConfig.health_check_timeout_seconds, logger
+        ),
+        durable_queue_path=os.getenv('DURABLE_QUEUE_PATH', '').strip() or RouterConfig.durable_queue_path,
+        durable_workers=_int_env('DURABLE_WORKERS', RouterConfig.durable_workers, logger),
+        durable_max_attempts=_int_env('DURABLE_MAX_ATTEMPTS', RouterConfig.durable_max_attempts, logger),
+        durable_backoff_max_seconds=_int_env(
+            'DURABLE_BACKOFF_MAX_SECONDS', RouterConfig.durable_backoff_max_seconds, logger
+        ),
+        delayed_delivery=_bool_env('DELAYED_DELIVERY', RouterConfig.delayed_delivery, logger),
+        max_delay_seconds=_int_env('MAX_DELAY_SECONDS', RouterConfig.max_delay_seconds, logger),
+        max_decompressed_bytes=_int_env('MAX_DECOMPRESSED_BYTES', RouterConfig.max_decompressed_bytes, logger),
+    )
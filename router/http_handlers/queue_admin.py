@@ -0,0 +1,95 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Blueprint, jsonify, request
+
+from services.auth import validate_bearer_token
+from services.delivery_queue import STATES, DeliveryQueue
+
+LogJsonFn = Callable[..., None]
+
+# Most messages one listing returns.
+MAX_LIST_LIMIT = 1000
+
+
+def create_queue_admin_blueprint(queue: DeliveryQueue, ingress_key: str, log_json: LogJsonFn) -> Blueprint:
+    """
+    Create the durable delivery queue's admin endpoints under /admin/queue.
+
+    They take the same bearer key as /ingest, which never leaves the
+    internal network.
+    """
+    bp = Blueprint('queue_admin', __name__, url_prefix='/admin/queue')
+
+    @bp.before_request
+    def require_ingress_key():
+        if not validate_bearer_token(request.headers.get('Authorization'), ingress_key):
+            log_json('warn', request.headers.get('X-Correlation-ID', 'unknown'),
+                     'Unauthorized queue admin request',
+                     remote_addr=request.remote_addr)
+            return jsonify({'error': 'Unauthorized'}), 401
+        return None
+
+    @bp.route('', methods=['GET'])
+    def counts():
+        return jsonify(queue.counts()), 200
+
+    @bp.route('/messages', methods=['GET'])
+    def list_messages():
+        state = request.args.get('state', 'dead')
+        if state not in STATES:
+            return jsonify({'error': f'"state" must be one of: {", ".join(STATES)}'}), 400
+
+        try:
+            limit = min(int(request.args.get('limit', 100)), MAX_LIST_LIMIT)
+        except ValueError:
+            return jsonify({'error': '"limit" must be an integer'}), 400
+
+        messages = queue.list(state, request.args.get('destination'), limit)
+        return jsonify({'state': state, 'messages': messages}), 200
+
+    @bp.route('/requeue', methods=['POST'])
+    def requeue():
+        """Give dead letters (all, or those matching `ids`/`destination`) a fresh set of attempts."""
+        body = _request_object()
+        ids = _ids(body)
+        if ids is False:
+            return jsonify({'error': '"ids" must be a list of integers'}), 400
+
+        requeued = queue.requeue(ids, body.get('destination'))
+        log_json('info', 'queue-admin', 'Requeued dead letters',
+                 count=requeued, ids=ids, destination=body.get('destination'))
+        return jsonify({'requeued': requeued}), 200
+
+    @bp.route('/purge', methods=['POST'])
+    def purge():
+        """Delete messages in `state` (default dead), optionally only `ids`/`destination`."""
+        body = _request_object()
+        state = body.get('state', 'dead')
+        if state not in STATES:
+            return jsonify({'error': f'"state" must be one of: {", ".join(STATES)}'}), 400
+
+        ids = _ids(body)
+        if ids is False:
+            return jsonify({'error': '"ids" must be a list of integers'}), 400
+
+        purged = queue.purge(state, ids, body.get('destination'))
+        log_json('warn', 'queue-admin', 'Purged queued messages',
+                 state=state, count=purged, ids=ids, destination=body.get('destination'))
+        return jsonify({'purged': purged}), 200
+
+    return bp
+
+
+def _request_object() -> Dict[str, Any]:
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else {}
+
+
+def _ids(body: Dict[str, Any]) -> Any:
+    """The request's `ids` list, None when absent, or False when malformed."""
+    ids: Optional[List[int]] = body.get('ids')
+    if ids is None:
+        return None
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return False
+    return ids
@@ -1,8 +1,9 @@
-import json
 import logging
 import sys
 from datetime import datetime
 
+from services import json_codec
+
 
 def setup_logging() -> logging.Logger:
     """Configure structured logging to stdout and return the service logger."""
@@ -24,4 +25,4 @@ def log_json(logger: logging.Logger, level: str, correlation_id: str, message: s
         'message': message,
         **kwargs
     }
-    logger.info(json.dumps(log_entry))
+    logger.info(json_codec.dumps(log_entry))
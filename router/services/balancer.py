@@ -0,0 +1,154 @@
+"""
+Load balancing across a destination's upstream replicas.
+
+A route that lists `upstreams` gets one UpstreamPool per router worker
+process. Balancer state (in-flight counts, latency averages, health) is kept
+in memory and is deliberately not shared between gunicorn workers: each worker
+balances its own traffic, which is enough to spread load without any
+coordination.
+
+Strategies:
+
+    round_robin        rotate through healthy replicas in order
+    least_outstanding  fewest requests currently in flight from this worker
+    ewma               lowest latency average, weighted by in-flight requests
+
+A replica is skipped while it is marked unhealthy, either after consecutive
+failed requests or by an external health check. If every replica is
+unhealthy the pool tries all of them rather than failing outright.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+# Consecutive failures that take a replica out of rotation, and for how long.
+FAILURE_THRESHOLD = 3
+EJECTION_SECONDS = 10.0
+
+# Weight of the newest sample in the latency average.
+EWMA_ALPHA = 0.3
+
+
+class Upstream:
+    """Per-replica balancer state. Only touched while holding the pool lock."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_seconds = 0.0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.check_healthy = True
+
+    def is_healthy(self, now: float) -> bool:
+        return self.check_healthy and now >= self.ejected_until
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.is_healthy(now),
+            'outstanding': self.outstanding,
+            'ewma_ms': round(self.ewma_seconds * 1000, 1),
+        }
+
+
+class UpstreamPool:
+    """Picks a replica for each request and learns from how it went."""
+
+    def __init__(self, urls: List[str], strategy: str = 'round_robin'):
+        self.strategy = strategy
+        self._upstreams = [Upstream(url) for url in urls]
+        self._by_url = {upstream.url: upstream for upstream in self._upstreams}
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self) -> List[str]:
+        return [upstream.url for upstream in self._upstreams]
+
+    def acquire(self, exclude: Iterable[str] = ()) -> str:
+        """
+        Choose a replica and count a request against it.
+
+        `exclude` lists replicas the caller does not want, such as the one a
+        hedged request is already waiting on; it is ignored if it would leave
+        nothing to choose from. Every acquire must be paired with a release.
+        """
+        excluded = set(exclude)
+        with self._lock:
+            now = time.monotonic()
+            candidates = self._candidates(now, excluded)
+            upstream = self._choose(candidates)
+            upstream.outstanding += 1
+            return upstream.url
+
+    def release(self, url: str, elapsed_seconds: float, ok: bool) -> None:
+        """Record the outcome of a request started with acquire()."""
+        with self._lock:
+            upstream = self._by_url[url]
+            upstream.outstanding = max(0, upstream.outstanding - 1)
+
+            if ok:
+                upstream.consecutive_failures = 0
+                if upstream.ewma_seconds:
+                    upstream.ewma_seconds += EWMA_ALPHA * (elapsed_seconds - upstream.ewma_seconds)
+                else:
+                    upstream.ewma_seconds = elapsed_seconds
+                return
+
+            upstream.consecutive_failures += 1
+            if upstream.consecutive_failures >= FAILURE_THRESHOLD:
+                upstream.ejected_until = time.monotonic() + EJECTION_SECONDS
+
+    def cancel(self, url: str) -> None:
+        """Hand back a replica acquired for a request that was never sent."""
+        with self._lock:
+            upstream = self._by_url[url]
+            upstream.outstanding = max(0, upstream.outstanding - 1)
+
+    def mark_health(self, url: str, healthy: bool) -> None:
+        """Apply an external health check result to one replica."""
+        with self._lock:
+            upstream = self._by_url.get(url)
+            if upstream is not None:
+                upstream.check_healthy = healthy
+                if healthy:
+                    upstream.consecutive_failures = 0
+                    upstream.ejected_until = 0.0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            return [upstream.snapshot(now) for upstream in self._upstreams]
+
+    def _candidates(self, now: float, excluded: set) -> List[Upstream]:
+        healthy = [u for u in self._upstreams if u.is_healthy(now)] or self._upstreams
+        preferred = [u for u in healthy if u.url not in excluded]
+        return preferred or healthy
+
+    def _choose(self, candidates: List[Upstream]) -> Upstream:
+        if self.strategy == 'least_outstanding':
+            return min(candidates, key=lambda u: u.outstanding)
+
+        if self.strategy == 'ewma':
+            # Unmeasured replicas score zero, so new ones are tried promptly.
+            return min(candidates, key=lambda u: u.ewma_seconds * (u.outstanding + 1))
+
+        # Round robin over the full list keeps the rotation stable while
+        # replicas drop in and out of the candidate set.
+        total = len(self._upstreams)
+        for offset in range(total):
+            upstream = self._upstreams[(self._next + offset) % total]
+            if upstream in candidates:
+                self._next = (self._next + offset + 1) % total
+                return upstream
+        return candidates[0]
+
+
+def build_pools(routes: Dict[str, Dict[str, Any]]) -> Dict[str, UpstreamPool]:
+    """Create a pool for every route that lists upstreams."""
+    return {
+        destination: UpstreamPool(route_config['upstreams'], route_config.get('balancer', 'round_robin'))
+        for destination, route_config in routes.items()
+        if route_config.get('upstreams')
+    }
@@ -0,0 +1,160 @@
+"""
+Coalescing of bursty events for routes with a `coalesce` block.
+
+The first event for a key opens a window of `window_ms`; events for the same
+key that arrive before it closes are folded into it, and one delivery is made
+when it closes:
+
+    latest  deliver only the last payload seen (default)
+    list    deliver every payload seen, as a JSON list in arrival order
+
+A window also closes early once it holds `max_events` events. Windows are
+fixed from their first event rather than extended by each new one, so a
+steady stream still gets a delivery every window instead of never.
+
+Callers are answered 202 as soon as their event is added to a window. Open
+windows live in this router process's memory: events still waiting when the
+process stops are lost.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+COALESCE_MODES = ('latest', 'list')
+
+# deliver(destination, payload, correlation_id, source)
+DeliverFn = Callable[[str, Any, str, Optional[str]], Any]
+
+
+@dataclass
+class _Window:
+    destination: str
+    mode: str
+    max_events: int
+    correlation_id: str
+    source: Optional[str]
+    payloads: List[Any] = field(default_factory=list)
+    correlation_ids: List[str] = field(default_factory=list)
+    closed: bool = False
+
+    def add(self, payload: Any, correlation_id: str) -> None:
+        if self.mode == 'latest':
+            self.payloads[:] = [payload]
+        else:
+            self.payloads.append(payload)
+        self.correlation_ids.append(correlation_id)
+
+    @property
+    def full(self) -> bool:
+        return len(self.correlation_ids) >= self.max_events
+
+    def merged_payload(self) -> Any:
+        return self.payloads[-1] if self.mode == 'latest' else list(self.payloads)
+
+
+class Coalescer:
+    """Holds the open windows of every coalescing route and closes them on time."""
+
+    def __init__(self, deliver: DeliverFn, log_json: Callable[..., None], max_workers: int = 4):
+        self.deliver = deliver
+        self.log_json = log_json
+        self.max_workers = max_workers
+
+        self._windows: Dict[Hashable, _Window] = {}
+        # (closes_at, tiebreak, key, window) for every open window.
+        self._timers: List[Tuple[float, int, Hashable, _Window]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add(
+        self,
+        destination: str,
+        policy: Dict[str, Any],
+        key: Optional[str],
+        payload: Any,
+        correlation_id: str,
+        source: Optional[str],
+    ) -> Tuple[str, int]:
+        """
+        Fold one event into its key's window, opening one if needed.
+
+        Returns the correlation ID the eventual delivery is logged under and
+        how many events the window holds so far.
+        """
+        window_key = (destination, key)
+        flush = None
+        with self._cond:
+            self._ensure_started()
+            window = self._windows.get(window_key)
+            if window is None:
+                window = _Window(destination, policy['mode'], policy['max_events'], correlation_id, source)
+                self._windows[window_key] = window
+                closes_at = time.monotonic() + policy['window_ms'] / 1000.0
+                heapq.heappush(self._timers, (closes_at, next(self._counter), window_key, window))
+                self._cond.notify()
+
+            window.add(payload, correlation_id)
+            held = len(window.correlation_ids)
+            if window.full:
+                flush = self._close(window_key, window)
+
+        if flush is not None:
+            self._executor.submit(self._deliver, flush)
+        return window.correlation_id, held
+
+    def _ensure_started(self) -> None:
+        """Start the timer on first use, so building the blueprint spawns no threads."""
+        if self._thread is not None:
+            return
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='coalesced-delivery',
+        )
+        self._thread = threading.Thread(target=self._run, name='coalescer', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._timers:
+                    self._cond.wait()
+
+                closes_at, _, window_key, window = self._timers[0]
+                wait_for = closes_at - time.monotonic()
+                if wait_for > 0:
+                    self._cond.wait(wait_for)
+                    continue
+
+                heapq.heappop(self._timers)
+                # Already closed early by max_events.
+                flush = None if window.closed else self._close(window_key, window)
+
+            if flush is not None:
+                self._executor.submit(self._deliver, flush)
+
+    def _close(self, window_key: Hashable, window: _Window) -> _Window:
+        """Take a window out of service. Called with the lock held."""
+        window.closed = True
+        del self._windows[window_key]
+        return window
+
+    def _deliver(self, window: _Window) -> None:
+        self.log_json('info', window.correlation_id, 'Delivering coalesced events',
+                      destination=window.destination,
+                      events=len(window.correlation_ids),
+                      mode=window.mode,
+                      correlation_ids=window.correlation_ids)
+        try:
+            self.deliver(window.destination, window.merged_payload(), window.correlation_id, window.source)
+        except Exception as exc:  # noqa: BLE001
+            self.log_json('error', window.correlation_id, 'Coalesced delivery failed',
+                          destination=window.destination,
+                          error=str(exc),
+                          error_type=type(exc).__name__)
@@ -0,0 +1,106 @@
+"""
+Compressed request bodies, in both directions.
+
+The edge may send /ingest bodies with a Content-Encoding, and routes with a
+`compression` block send their own requests compressed. gzip is always
+available; zstd is offered when the optional `zstandard` package is
+installed.
+
+Inbound bodies are decompressed incrementally and abandoned as soon as the
+output passes a limit, so a small, highly compressible request cannot make
+the router allocate gigabytes.
+"""
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+IDENTITY = 'identity'
+
+# Kept low: the destination decompresses every request it receives.
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+# Output produced per decompression step while checking the limit.
+_CHUNK_BYTES = 64 * 1024
+
+
+class UnsupportedEncoding(ValueError):
+    """Raised for a Content-Encoding this process cannot decode."""
+
+
+class DecompressionError(ValueError):
+    """Raised when a compressed body is corrupt."""
+
+
+class BodyTooLarge(ValueError):
+    """Raised when a body decompresses to more than the allowed size."""
+
+
+def available_encodings() -> tuple:
+    """The Content-Encoding values this process can produce and accept."""
+    return ('gzip', 'zstd') if zstandard is not None else ('gzip',)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress `data` with one of available_encodings()."""
+    if encoding == 'gzip':
+        # mtime=0 keeps identical bodies byte-identical.
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise UnsupportedEncoding(f'Unsupported encoding: {encoding}')
+
+
+def decompress(data: bytes, encoding: str, max_bytes: int) -> bytes:
+    """
+    Decode a body sent with Content-Encoding `encoding`.
+
+    Raises BodyTooLarge once the output exceeds `max_bytes`, before the rest
+    is decompressed, and DecompressionError for a corrupt body.
+    """
+    encoding = (encoding or IDENTITY).strip().lower()
+    if encoding == IDENTITY:
+        return data
+    if encoding == 'gzip':
+        return _gunzip(data, max_bytes)
+    if encoding == 'zstd' and zstandard is not None:
+        return _unzstd(data, max_bytes)
+    raise UnsupportedEncoding(f'Unsupported Content-Encoding: {encoding}')
+
+
+def _gunzip(data: bytes, max_bytes: int) -> bytes:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    output = bytearray()
+    pending = data
+    try:
+        while pending:
+            output += decompressor.decompress(pending, _CHUNK_BYTES)
+            if len(output) > max_bytes:
+                raise BodyTooLarge(f'Body decompresses to more than {max_bytes} bytes')
+            pending = decompressor.unconsumed_tail
+        output += decompressor.flush()
+    except zlib.error as exc:
+        raise DecompressionError(f'Corrupt gzip body: {exc}') from exc
+
+    if not decompressor.eof:
+        raise DecompressionError('Truncated gzip body')
+    if len(output) > max_bytes:
+        raise BodyTooLarge(f'Body decompresses to more than {max_bytes} bytes')
+    return bytes(output)
+
+
+def _unzstd(data: bytes, max_bytes: int) -> bytes:
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+            output = reader.read(max_bytes + 1)
+    except zstandard.ZstdError as exc:
+        raise DecompressionError(f'Corrupt zstd body: {exc}') from exc
+
+    if len(output) > max_bytes:
+        raise BodyTooLarge(f'Body decompresses to more than {max_bytes} bytes')
+    return output
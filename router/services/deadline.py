@@ -0,0 +1,57 @@
+"""
+Request deadline propagation.
+
+The edge sends the time it has left before it gives up on a request as a
+relative budget in milliseconds. The router turns that into a local monotonic
+deadline on arrival, caps every destination timeout to what remains, and
+passes the shrinking budget on to the destination in the same header.
+"""
+import time
+from typing import Optional
+
+# Remaining request budget in milliseconds, as set by the edge.
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passed before it could be forwarded."""
+
+
+def parse_deadline(header_value: Optional[str]) -> Optional[float]:
+    """
+    Convert a remaining-budget header into a monotonic deadline.
+
+    Returns None when the header is missing or malformed, so callers that do
+    not send one keep the route's static timeout.
+    """
+    if not header_value:
+        return None
+
+    try:
+        budget_ms = int(header_value)
+    except ValueError:
+        return None
+
+    return time.monotonic() + budget_ms / 1000.0
+
+
+def remaining_seconds(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before `deadline`, or None when there is no deadline."""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def effective_timeout(timeout_seconds: float, deadline: Optional[float]) -> float:
+    """
+    Cap a route timeout to the remaining budget.
+
+    Raises DeadlineExceeded when nothing is left, so the work is dropped
+    before a destination is ever contacted.
+    """
+    remaining = remaining_seconds(deadline)
+    if remaining is None:
+        return timeout_seconds
+    if remaining <= 0:
+        raise DeadlineExceeded('Request deadline passed before forwarding')
+    return min(timeout_seconds, remaining)
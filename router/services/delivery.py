@@ -0,0 +1,132 @@
+"""
+Single-envelope delivery with the router's standard error mapping.
+
+Both /ingest and /ingest/batch deliver envelopes the same way, but batch items
+run on worker threads with no Flask app context, so the outcome is described
+by a plain DeliveryResult rather than a Flask response.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from services import json_codec
+from services.balancer import UpstreamPool
+from services.deadline import DeadlineExceeded, remaining_seconds
+from services.forwarder import forward_to_destination
+
+JSON_CONTENT_TYPE = 'application/json'
+
+
+@dataclass(frozen=True)
+class DeliveryResult:
+    """The status, body, and content type to hand back to the caller."""
+
+    status_code: int
+    content: bytes
+    content_type: str = JSON_CONTENT_TYPE
+
+
+def error_result(status_code: int, message: str) -> DeliveryResult:
+    """Build a result carrying the project's standard {'error': ...} body."""
+    return DeliveryResult(status_code, json_codec.dumps_bytes({'error': message}))
+
+
+def deliver(
+    destination: str,
+    route_config: Dict[str, Any],
+    payload: Any,
+    correlation_id: str,
+    log_json: Callable[..., None],
+    deadline: Optional[float] = None,
+    pool: Optional[UpstreamPool] = None,
+) -> DeliveryResult:
+    """
+    Forward one payload and map transport failures onto gateway statuses.
+
+    With a `pool`, the request goes to the replica the pool picks, and its
+    latency and outcome are reported back so the pool can balance the next one.
+    """
+    if pool is None:
+        return _deliver_to(destination, route_config, payload, correlation_id, log_json, deadline)
+
+    remaining = remaining_seconds(deadline)
+    if remaining is not None and remaining <= 0:
+        # Decided before a replica is chosen, so it counts against none of them.
+        return deadline_exceeded(destination, correlation_id, log_json)
+
+    return deliver_to_upstream(
+        destination, route_config, payload, correlation_id, log_json, deadline, pool, pool.acquire()
+    )
+
+
+def deliver_to_upstream(
+    destination: str,
+    route_config: Dict[str, Any],
+    payload: Any,
+    correlation_id: str,
+    log_json: Callable[..., None],
+    deadline: Optional[float],
+    pool: UpstreamPool,
+    url: str,
+) -> DeliveryResult:
+    """
+    Deliver to a replica already taken from `pool` with acquire(), and release it.
+
+    For callers that need to know which replica they got, such as hedging,
+    which sends its second attempt somewhere else.
+    """
+    started = time.monotonic()
+    result = _deliver_to(destination, {**route_config, 'url': url}, payload, correlation_id, log_json, deadline)
+    pool.release(url, time.monotonic() - started, ok=result.status_code < 500)
+    return result
+
+
+def deadline_exceeded(destination: str, correlation_id: str, log_json: Callable[..., None]) -> DeliveryResult:
+    """The 504 for a request whose deadline passed before it was sent."""
+    log_json('warn', correlation_id, 'Deadline expired before forwarding',
+             destination=destination)
+    return error_result(504, 'Gateway timeout - request deadline exceeded')
+
+
+def _deliver_to(
+    destination: str,
+    route_config: Dict[str, Any],
+    payload: Any,
+    correlation_id: str,
+    log_json: Callable[..., None],
+    deadline: Optional[float],
+) -> DeliveryResult:
+    try:
+        response = forward_to_destination(
+            destination, route_config, payload, correlation_id, log_json, deadline=deadline
+        )
+        return DeliveryResult(
+            response.status_code,
+            response.content,
+            response.headers.get('Content-Type', JSON_CONTENT_TYPE),
+        )
+
+    except DeadlineExceeded:
+        return deadline_exceeded(destination, correlation_id, log_json)
+
+    except requests.exceptions.Timeout:
+        log_json('error', correlation_id, 'Internal service timeout',
+                 destination=destination,
+                 url=route_config['url'])
+        return error_result(504, 'Gateway timeout - internal service did not respond')
+
+    except requests.exceptions.ConnectionError as exc:
+        log_json('error', correlation_id, 'Internal service connection failed',
+                 destination=destination,
+                 url=route_config['url'],
+                 error=str(exc))
+        return error_result(502, 'Bad gateway - internal service unreachable')
+
+    except Exception as exc:  # noqa: BLE001
+        log_json('error', correlation_id, 'Unexpected error',
+                 destination=destination,
+                 error=str(exc),
+                 error_type=type(exc).__name__)
+        return error_result(500, 'Internal server error')
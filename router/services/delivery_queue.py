@@ -0,0 +1,406 @@
+"""
+Durable delivery for routes with `delivery: durable`.
+
+Instead of being forwarded while the caller waits, the envelope is committed
+to a local SQLite queue (WAL mode) and the caller gets 202. A pool of worker
+threads delivers queued messages in the background:
+
+- a 2xx answer removes the message;
+- a 5xx, 408, 429, or transport failure retries it with exponential backoff,
+  and pauses the whole destination for a while so a struggling service is not
+  hammered with the rest of its backlog;
+- any other 4xx, or running out of attempts, moves it to the dead-letter
+  table, where it stays until requeued or purged through the admin endpoints.
+
+Claiming a message pushes its next attempt past the delivery timeout, so
+several router worker processes can share one database without delivering
+the same message twice, and a message claimed by a process that then died is
+picked up again once that lease runs out. Delivery is at-least-once: a
+process that dies after delivering but before recording it will deliver
+again.
+
+The same queue holds delayed deliveries (see services.schedule): a message
+whose first attempt is set in the future simply is not due yet. The index on
+next_attempt_at makes finding due messages cheap however many are waiting,
+and idle workers look for them every POLL_INTERVAL_SECONDS, which is the
+resolution delayed deliveries fire with.
+"""
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from services import json_codec
+from services.delivery import DeliveryResult
+
+# Added to the longest route timeout to get how long a claim lasts.
+LEASE_MARGIN_SECONDS = 30
+# How often idle workers look for messages that have come due.
+POLL_INTERVAL_SECONDS = 1.0
+# Below 500 but still worth retrying.
+RETRYABLE_CLIENT_STATUSES = (408, 429)
+
+STATES = ('pending', 'dead')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    destination TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    correlation_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (next_attempt_at);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY,
+    destination TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    correlation_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+'''
+
+_TABLES = {'pending': 'messages', 'dead': 'dead_letters'}
+
+DeliverFn = Callable[[str, Any, str], DeliveryResult]
+
+
+@dataclass(frozen=True)
+class QueuedMessage:
+    id: int
+    destination: str
+    payload: Any
+    correlation_id: str
+    attempts: int
+
+
+class DeliveryQueue:
+    """The SQLite store behind durable delivery. Safe to share across threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def enqueue(self, destination: str, payload: Any, correlation_id: str,
+                not_before: Optional[float] = None) -> int:
+        """Queue a message for delivery now, or at Unix time `not_before`."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'INSERT INTO messages (destination, payload, correlation_id, next_attempt_at, created_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (destination, json_codec.dumps(payload), correlation_id, max(now, not_before or now), now),
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int, lease_seconds: float,
+              skip_destinations: Sequence[str] = ()) -> List[QueuedMessage]:
+        """Take up to `limit` due messages, hiding them from other claims for `lease_seconds`."""
+        now = time.time()
+        query = 'SELECT id, destination, payload, correlation_id, attempts FROM messages WHERE next_attempt_at <= ?'
+        params: List[Any] = [now]
+        if skip_destinations:
+            query += f' AND destination NOT IN ({", ".join("?" * len(skip_destinations))})'
+            params.extend(skip_destinations)
+        query += ' ORDER BY next_attempt_at, id LIMIT ?'
+        params.append(limit)
+
+        with self._transaction() as conn:
+            rows = conn.execute(query, params).fetchall()
+            conn.executemany(
+                'UPDATE messages SET next_attempt_at = ? WHERE id = ?',
+                [(now + lease_seconds, row[0]) for row in rows],
+            )
+
+        return [
+            QueuedMessage(row[0], row[1], json_codec.loads(row[2]), row[3], row[4])
+            for row in rows
+        ]
+
+    def complete(self, message_id: int) -> None:
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM messages WHERE id = ?', (message_id,))
+
+    def retry(self, message_id: int, attempts: int, error: str, next_attempt_at: float) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE messages SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?',
+                (attempts, error, next_attempt_at, message_id),
+            )
+
+    def dead_letter(self, message_id: int, attempts: int, error: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO dead_letters'
+                ' (id, destination, payload, correlation_id, attempts, last_error, created_at, failed_at)'
+                ' SELECT id, destination, payload, correlation_id, ?, ?, created_at, ?'
+                ' FROM messages WHERE id = ?',
+                (attempts, error, time.time(), message_id),
+            )
+            conn.execute('DELETE FROM messages WHERE id = ?', (message_id,))
+
+    def list(self, state: str, destination: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Messages in `state` ('pending' or 'dead'), oldest first, for the admin API."""
+        table = _TABLES[state]
+        where, params = _filter(None, destination)
+        with self._transaction() as conn:
+            conn.row_factory = sqlite3.Row
+            try:
+                rows = conn.execute(
+                    f'SELECT * FROM {table}{where} ORDER BY id LIMIT ?', (*params, limit)
+                ).fetchall()
+            finally:
+                conn.row_factory = None
+
+        messages = []
+        for row in rows:
+            message = dict(row)
+            message['payload'] = json_codec.loads(message['payload'])
+            messages.append(message)
+        return messages
+
+    def counts(self) -> Dict[str, int]:
+        with self._transaction() as conn:
+            return {
+                state: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                for state, table in _TABLES.items()
+            }
+
+    def requeue(self, ids: Optional[Sequence[int]] = None, destination: Optional[str] = None) -> int:
+        """Move dead letters back to the queue with a fresh set of attempts."""
+        where, params = _filter(ids, destination)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'INSERT INTO messages'
+                ' (id, destination, payload, correlation_id, attempts, next_attempt_at, last_error, created_at)'
+                f' SELECT id, destination, payload, correlation_id, 0, ?, last_error, created_at FROM dead_letters{where}',
+                (time.time(), *params),
+            )
+            conn.execute(f'DELETE FROM dead_letters{where}', params)
+            return cursor.rowcount
+
+    def purge(self, state: str, ids: Optional[Sequence[int]] = None, destination: Optional[str] = None) -> int:
+        where, params = _filter(ids, destination)
+        with self._transaction() as conn:
+            return conn.execute(f'DELETE FROM {_TABLES[state]}{where}', params).rowcount
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """This thread's connection; sqlite3 connections are not shared between threads."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, so _transaction decides exactly where each begins.
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # A 202 promises the message survives a crash, so commits are fsynced.
+            conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+
+def _filter(ids: Optional[Sequence[int]], destination: Optional[str]) -> Tuple[str, List[Any]]:
+    clauses = []
+    params: List[Any] = []
+    if ids is not None:
+        clauses.append(f'id IN ({", ".join("?" * len(ids))})' if ids else '0')
+        params.extend(ids)
+    if destination is not None:
+        clauses.append('destination = ?')
+        params.append(destination)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+class DurableDelivery:
+    """Background workers draining a DeliveryQueue."""
+
+    def __init__(
+        self,
+        queue: DeliveryQueue,
+        routes: Dict[str, Dict[str, Any]],
+        log_json: Callable[..., None],
+        workers: int = 4,
+        max_attempts: int = 8,
+        backoff_base_seconds: float = 1.0,
+        backoff_max_seconds: float = 300.0,
+    ):
+        self.queue = queue
+        self.log_json = log_json
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self._lease_seconds = max(
+            (route_config['timeout_seconds'] for route_config in routes.values()), default=0
+        ) + LEASE_MARGIN_SECONDS
+        self._deliver: Optional[DeliverFn] = None
+        # Per-destination backoff: consecutive failures and when to try again.
+        self._failures: Dict[str, int] = {}
+        self._paused_until: Dict[str, float] = {}
+        self._in_flight = 0
+        self._lock = threading.Condition()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def set_delivery(self, deliver: DeliverFn) -> None:
+        """Set how queued messages are delivered: `deliver(destination, payload, correlation_id)`."""
+        self._deliver = deliver
+
+    def enqueue(self, destination: str, payload: Any, correlation_id: str,
+                not_before: Optional[float] = None) -> int:
+        message_id = self.queue.enqueue(destination, payload, correlation_id, not_before)
+        if not_before is None:
+            self.log_json('info', correlation_id, 'Queued for durable delivery',
+                          destination=destination, message_id=message_id)
+            self._wake.set()
+        else:
+            self.log_json('info', correlation_id, 'Scheduled for delayed delivery',
+                          destination=destination, message_id=message_id,
+                          delay_seconds=round(max(0.0, not_before - time.time()), 3))
+        return message_id
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if self._deliver is None:
+            raise RuntimeError('set_delivery() must be called before start()')
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='durable-delivery',
+        )
+        self._thread = threading.Thread(target=self._run, name='durable-delivery', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def backoff_seconds(self, failures: int) -> float:
+        """Exponential backoff with jitter, so retries from a burst spread out."""
+        ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (failures - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def drain_once(self) -> int:
+        """Claim and deliver whatever is due right now, synchronously. Returns how many were tried."""
+        messages = self._claim(self.workers)
+        for message in messages:
+            self._attempt(message)
+        return len(messages)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                while self._in_flight >= self.workers and not self._stop.is_set():
+                    self._lock.wait()
+                free = self.workers - self._in_flight
+
+            try:
+                messages = self._claim(free)
+            except sqlite3.Error as exc:
+                self.log_json('error', 'durable-delivery', 'Failed to read delivery queue', error=str(exc))
+                messages = []
+
+            if not messages:
+                self._wake.wait(POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+                continue
+
+            with self._lock:
+                self._in_flight += len(messages)
+            for message in messages:
+                self._executor.submit(self._attempt_and_release, message)
+
+    def _claim(self, limit: int) -> List[QueuedMessage]:
+        now = time.time()
+        with self._lock:
+            paused = [dest for dest, until in self._paused_until.items() if until > now]
+        return self.queue.claim(limit, self._lease_seconds, paused)
+
+    def _attempt_and_release(self, message: QueuedMessage) -> None:
+        try:
+            self._attempt(message)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._lock.notify()
+
+    def _attempt(self, message: QueuedMessage) -> None:
+        attempts = message.attempts + 1
+        try:
+            result = self._deliver(message.destination, message.payload, message.correlation_id)
+            status_code, error = result.status_code, _describe(result)
+        except Exception as exc:  # noqa: BLE001
+            status_code, error = None, f'{type(exc).__name__}: {exc}'
+
+        try:
+            self._record(message, attempts, status_code, error)
+        except sqlite3.Error as exc:
+            # The lease runs out and the message is tried again.
+            self.log_json('error', message.correlation_id, 'Failed to record durable delivery outcome',
+                          destination=message.destination, message_id=message.id, error=str(exc))
+
+    def _record(self, message: QueuedMessage, attempts: int, status_code: Optional[int], error: str) -> None:
+        destination = message.destination
+        log_fields = {
+            'destination': destination,
+            'message_id': message.id,
+            'attempts': attempts,
+            'status_code': status_code,
+        }
+
+        if status_code is not None and 200 <= status_code < 300:
+            self.queue.complete(message.id)
+            with self._lock:
+                self._failures.pop(destination, None)
+                self._paused_until.pop(destination, None)
+            self.log_json('info', message.correlation_id, 'Durable delivery succeeded', **log_fields)
+            return
+
+        retryable = status_code is None or status_code >= 500 or status_code in RETRYABLE_CLIENT_STATUSES
+        if retryable:
+            with self._lock:
+                failures = self._failures[destination] = self._failures.get(destination, 0) + 1
+                self._paused_until[destination] = time.time() + self.backoff_seconds(failures)
+
+        if not retryable or attempts >= self.max_attempts:
+            self.queue.dead_letter(message.id, attempts, error)
+            self.log_json('error', message.correlation_id, 'Moved to dead-letter queue',
+                          error=error, **log_fields)
+            return
+
+        retry_in = self.backoff_seconds(attempts)
+        self.queue.retry(message.id, attempts, error, time.time() + retry_in)
+        self.log_json('warn', message.correlation_id, 'Durable delivery failed, will retry',
+                      error=error, retry_in_seconds=round(retry_in, 1), **log_fields)
+
+
+def _describe(result: DeliveryResult) -> str:
+    body = result.content[:500].decode('utf-8', errors='replace')
+    return f'HTTP {result.status_code}: {body}'
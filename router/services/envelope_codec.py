@@ -0,0 +1,44 @@
+"""
+The binary envelope the edge may send instead of JSON.
+
+A MessagePack frame is a map holding the envelope (`destination` and
+`payload`, or `items` for /ingest/batch) together with what JSON requests
+carry in headers: `correlation_id`, `source`, and `deadline_ms`, the
+remaining budget in milliseconds. It is chosen by Content-Type, and needs the
+optional `msgpack` package; without it such requests are answered 415 with
+UNSUPPORTED_HEADER set, and the edge falls back to JSON. Other 415s (an
+unsupported Content-Encoding) leave the header out.
+"""
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+# Set on the 415 for a MessagePack frame this router cannot decode.
+UNSUPPORTED_HEADER = 'X-Unsupported-Envelope'
+MSGPACK_CONTENT_TYPES = (MSGPACK_CONTENT_TYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+class UnsupportedFormat(ValueError):
+    """Raised for a MessagePack frame when msgpack is not installed."""
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    """Whether a request's Content-Type names a MessagePack frame."""
+    mimetype = (content_type or '').split(';', 1)[0].strip().lower()
+    return mimetype in MSGPACK_CONTENT_TYPES
+
+
+def decode_frame(data: bytes) -> Any:
+    """Decode a MessagePack frame, raising ValueError when it is malformed."""
+    if msgpack is None:
+        raise UnsupportedFormat('MessagePack envelopes are not supported by this router')
+    try:
+        return msgpack.unpackb(data, raw=False)
+    except ValueError:
+        raise
+    except Exception as exc:  # msgpack's errors do not share one base class
+        raise ValueError(f'Invalid MessagePack frame: {exc}') from exc
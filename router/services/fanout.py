@@ -0,0 +1,125 @@
+"""
+Fan-out delivery for routes that list several `targets`.
+
+One envelope is delivered to every target concurrently from a shared worker
+pool, and the route's aggregation policy decides when the caller gets an
+answer:
+
+    all     every target must succeed
+    first   the first success answers; the rest finish in the background
+    quorum  `quorum` successes answer (a majority when unset)
+
+Every target's outcome is logged under the envelope's correlation ID.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from services import json_codec
+from services.delivery import DeliveryResult, deliver
+
+
+def required_successes(route_config: Dict[str, Any]) -> int:
+    """How many targets must succeed for the route's policy to be met."""
+    target_count = len(route_config['targets'])
+    policy = route_config['aggregate']
+
+    if policy == 'first':
+        return 1
+    if policy == 'quorum':
+        return route_config.get('quorum') or target_count // 2 + 1
+    return target_count
+
+
+def _succeeded(result: DeliveryResult) -> bool:
+    return 200 <= result.status_code < 300
+
+
+class FanoutDispatcher:
+    """Delivers fan-out routes on one bounded pool shared by every request."""
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='fanout-delivery',
+        )
+
+    def deliver(
+        self,
+        destination: str,
+        route_config: Dict[str, Any],
+        payload: Any,
+        correlation_id: str,
+        log_json: Callable[..., None],
+        deadline: Optional[float] = None,
+    ) -> DeliveryResult:
+        """
+        Deliver to every target and summarise the outcome.
+
+        Answers 200 once the policy is met and 502 as soon as it no longer
+        can be. The body lists each target's status, or `pending` for targets
+        still running when the answer was decided.
+        """
+        targets = route_config['targets']
+        required = required_successes(route_config)
+
+        pending = {
+            self._executor.submit(
+                self._deliver_target,
+                destination, target, payload, correlation_id, log_json, deadline,
+            ): target['name']
+            for target in targets
+        }
+        statuses: Dict[str, Any] = {target['name']: 'pending' for target in targets}
+        succeeded = failed = 0
+
+        while pending and succeeded < required and failed <= len(targets) - required:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                result = future.result()
+                statuses[name] = result.status_code
+                if _succeeded(result):
+                    succeeded += 1
+                else:
+                    failed += 1
+
+        met = succeeded >= required
+        log_json('info' if met else 'warn', correlation_id, 'Fan-out complete',
+                 destination=destination,
+                 aggregate=route_config['aggregate'],
+                 succeeded=succeeded,
+                 failed=failed,
+                 required=required,
+                 still_running=len(pending))
+
+        summary = {
+            'destination': destination,
+            'aggregate': route_config['aggregate'],
+            'required': required,
+            'succeeded': succeeded,
+            'targets': _target_statuses(targets, statuses),
+        }
+        if not met:
+            summary['error'] = 'Bad gateway - fan-out policy not met'
+
+        return DeliveryResult(200 if met else 502, json_codec.dumps_bytes(summary))
+
+    @staticmethod
+    def _deliver_target(
+        destination: str,
+        target: Dict[str, Any],
+        payload: Any,
+        correlation_id: str,
+        log_json: Callable[..., None],
+        deadline: Optional[float],
+    ) -> DeliveryResult:
+        result = deliver(target['name'], target, payload, correlation_id, log_json, deadline)
+        log_json('info' if _succeeded(result) else 'warn', correlation_id, 'Fan-out target responded',
+                 destination=destination,
+                 target=target['name'],
+                 status_code=result.status_code)
+        return result
+
+
+def _target_statuses(targets: List[Dict[str, Any]], statuses: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{'target': target['name'], 'status': statuses[target['name']]} for target in targets]
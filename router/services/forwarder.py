@@ -1,8 +1,12 @@
 import os
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, Optional
 
 import requests
 
+from services import json_codec
+from services.compression import compress
+from services.deadline import DEADLINE_HEADER, effective_timeout
+
 LogFn = Callable[[str, str, str], None]
 
 
@@ -16,14 +20,28 @@ def forward_to_destination(
     payload: Dict[str, Any],
     correlation_id: str,
     log_json: Callable[..., None],
+    deadline: Optional[float] = None,
 ) -> requests.Response:
     """
     Forward a payload to an internal destination and return the upstream response.
+
+    When `deadline` is set the route timeout is capped to the time remaining,
+    and DeadlineExceeded is raised instead of contacting an abandoned request's
+    destination. A route's compiled `transform` reshapes the payload on its way
+    out, and its `compression` block compresses bodies of at least `min_bytes`.
     """
+    timeout = effective_timeout(route_config['timeout_seconds'], deadline)
+
+    transform = route_config.get('transform')
+    if transform is not None:
+        payload = transform(payload)
+
     forward_headers = {
         'X-Correlation-ID': correlation_id,
         'Content-Type': 'application/json'
     }
+    if deadline is not None:
+        forward_headers[DEADLINE_HEADER] = str(int(timeout * 1000))
 
     if route_config['auth_env']:
         auth_token = os.getenv(route_config['auth_env'])
@@ -46,15 +64,22 @@ def forward_to_destination(
         'Forwarding to internal service',
         destination=destination,
         url=route_config['url'],
-        method=route_config['method']
+        method=route_config['method'],
+        timeout_seconds=round(timeout, 3)
     )
 
+    data = json_codec.dumps_bytes(payload)
+    compression = route_config.get('compression')
+    if compression and len(data) >= compression['min_bytes']:
+        forward_headers['Content-Encoding'] = compression['encoding']
+        data = compress(data, compression['encoding'])
+
     response = requests.request(
         method=route_config['method'],
         url=route_config['url'],
-        json=payload,
+        data=data,
         headers=forward_headers,
-        timeout=route_config['timeout_seconds']
+        timeout=timeout
     )
 
     _emit_log(
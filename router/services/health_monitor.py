@@ -0,0 +1,250 @@
+"""
+Active background health checking of destinations.
+
+Each destination is probed on its own jittered interval with a GET: its
+`health_url` when the route sets one, otherwise each URL it would deliver to
+(the route's `url`, every `upstreams` replica, every fan-out target). Probes
+run on a small pool, so at most `max_concurrent` are in flight at once.
+
+For a route with `upstreams`, a relative `health_url` such as `/health` is
+probed on every replica, and an absolute one stands for all of them, so
+either way each replica in the route's pool hears its health.
+
+A `health_url` is healthy when it answers 2xx. A delivery URL only has to
+answer at all, below 500: GET against a POST-only endpoint typically returns
+405, which still proves the service is up.
+
+Results go into an in-memory table that /health returns as-is, and listeners
+(the upstream pools) hear about every change in a URL's health.
+"""
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+
+from services.route_table import is_pattern
+
+# Each interval is stretched or shrunk by up to this fraction, so probes from
+# several router workers do not land on a destination in lockstep.
+JITTER_FRACTION = 0.2
+
+HealthListener = Callable[[str, str, bool], None]
+
+
+@dataclass(frozen=True)
+class Probe:
+    destination: str
+    url: str
+    # True for a dedicated health_url, which must answer 2xx.
+    strict: bool
+    # Delivery URLs this probe's result applies to, when not `url` itself.
+    replicas: Tuple[str, ...] = ()
+
+
+def build_probes(routes: Dict[str, Dict[str, Any]]) -> List[Probe]:
+    """List what to probe for every route."""
+    probes: List[Probe] = []
+    for destination, route_config in routes.items():
+        health_url = route_config.get('health_url')
+        if health_url:
+            upstreams = route_config.get('upstreams') or []
+            if not upstreams:
+                probes.append(Probe(destination, urljoin(route_config.get('url', ''), health_url), strict=True))
+            elif urlsplit(health_url).scheme:
+                probes.append(Probe(destination, health_url, strict=True, replicas=tuple(upstreams)))
+            else:
+                probes.extend(
+                    Probe(destination, urljoin(upstream, health_url), strict=True, replicas=(upstream,))
+                    for upstream in upstreams
+                )
+            continue
+        if is_pattern(destination):
+            # Its url is a template; only a health_url can be probed.
+            continue
+
+        if route_config.get('upstreams'):
+            urls = route_config['upstreams']
+        elif route_config.get('targets'):
+            urls = [target['url'] for target in route_config['targets']]
+        else:
+            # A route with only `rules` delivers nowhere itself.
+            urls = [route_config['url']] if 'url' in route_config else []
+        probes.extend(Probe(destination, url, strict=False) for url in urls)
+
+    return probes
+
+
+class HealthMonitor:
+    """Schedules probes and keeps the shared destination status table."""
+
+    def __init__(
+        self,
+        routes: Dict[str, Dict[str, Any]],
+        log_json: Callable[..., None],
+        interval_seconds: float,
+        max_concurrent: int = 4,
+        timeout_seconds: float = 5.0,
+    ):
+        self.log_json = log_json
+        self.interval_seconds = interval_seconds
+        self.max_concurrent = max_concurrent
+        self.timeout_seconds = timeout_seconds
+
+        self._probes = build_probes(routes)
+        self._probes_by_destination: Dict[str, List[Probe]] = {destination: [] for destination in routes}
+        for probe in self._probes:
+            self._probes_by_destination[probe.destination].append(probe)
+        self._results: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._snapshot: Dict[str, Any] = {
+            destination: self._destination_status(destination) for destination in routes
+        }
+        self._listeners: List[HealthListener] = []
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def add_listener(self, listener: HealthListener) -> None:
+        """Call `listener(destination, url, healthy)` whenever a URL's health changes."""
+        self._listeners.append(listener)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        The current status table.
+
+        Rebuilt by the probe that changed it, so reading it costs nothing
+        however many destinations there are. Callers must not mutate it.
+        """
+        return self._snapshot
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent,
+            thread_name_prefix='health-probe',
+        )
+        self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def check_now(self) -> None:
+        """Probe everything once, synchronously. Useful as a startup warmup."""
+        for probe in self._probes:
+            self._check(probe)
+
+    def _run(self) -> None:
+        now = time.monotonic()
+        # Spread the first round over one interval instead of probing
+        # everything at startup.
+        schedule = [
+            (now + random.uniform(0, self.interval_seconds), index)
+            for index in range(len(self._probes))
+        ]
+        heapq.heapify(schedule)
+
+        while schedule and not self._stop.is_set():
+            due, index = schedule[0]
+            wait_for = due - time.monotonic()
+            if wait_for > 0:
+                self._stop.wait(wait_for)
+                continue
+
+            heapq.heappop(schedule)
+            probe = self._probes[index]
+            with self._lock:
+                skip = probe in self._in_flight
+                if not skip:
+                    self._in_flight.add(probe)
+            if not skip:
+                self._executor.submit(self._check, probe)
+
+            heapq.heappush(schedule, (time.monotonic() + self._jittered_interval(), index))
+
+    def _jittered_interval(self) -> float:
+        return self.interval_seconds * random.uniform(1 - JITTER_FRACTION, 1 + JITTER_FRACTION)
+
+    def _check(self, probe: Probe) -> None:
+        # However the probe ends, it must leave _in_flight, or _run would skip
+        # this probe for good.
+        try:
+            self._probe(probe)
+        except Exception as exc:  # pylint: disable=broad-except
+            self.log_json('error', 'health-check', 'Health probe failed',
+                          destination=probe.destination,
+                          url=probe.url,
+                          error=f'{type(exc).__name__}: {exc}')
+        finally:
+            with self._lock:
+                self._in_flight.discard(probe)
+
+    def _probe(self, probe: Probe) -> None:
+        started = time.monotonic()
+        result: Dict[str, Any] = {'url': probe.url}
+
+        try:
+            response = requests.get(probe.url, timeout=self.timeout_seconds)
+            result['status_code'] = response.status_code
+            if probe.strict:
+                result['healthy'] = 200 <= response.status_code < 300
+            else:
+                result['healthy'] = response.status_code < 500
+        except requests.exceptions.RequestException as exc:
+            result['healthy'] = False
+            result['error'] = type(exc).__name__
+
+        result['latency_ms'] = int((time.monotonic() - started) * 1000)
+        result['checked_at'] = datetime.utcnow().isoformat() + 'Z'
+        self._record(probe, result)
+
+    def _record(self, probe: Probe, result: Dict[str, Any]) -> None:
+        key = (probe.destination, probe.url)
+        with self._lock:
+            previous = self._results.get(key)
+            self._results[key] = result
+            # Copy-on-write: readers keep whichever table they already hold.
+            snapshot = dict(self._snapshot)
+            snapshot[probe.destination] = self._destination_status(probe.destination)
+            self._snapshot = snapshot
+
+        changed = previous is None or previous['healthy'] != result['healthy']
+        if not changed:
+            return
+
+        self.log_json('info' if result['healthy'] else 'warn', 'health-check',
+                      'Destination health changed',
+                      destination=probe.destination,
+                      url=probe.url,
+                      healthy=result['healthy'],
+                      status_code=result.get('status_code'),
+                      error=result.get('error'))
+
+        for listener in self._listeners:
+            for url in probe.replicas or (probe.url,):
+                listener(probe.destination, url, result['healthy'])
+
+    def _destination_status(self, destination: str) -> Dict[str, Any]:
+        """Summarise one destination's probe results. Called with the lock held."""
+        probes = [
+            self._results[(probe.destination, probe.url)]
+            for probe in self._probes_by_destination[destination]
+            if (probe.destination, probe.url) in self._results
+        ]
+        return {
+            # Unknown until the first probe lands; then up if any URL is.
+            'healthy': any(p['healthy'] for p in probes) if probes else None,
+            'probes': probes,
+        }
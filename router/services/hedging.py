@@ -0,0 +1,170 @@
+"""
+Hedged requests for idempotent, latency-sensitive routes.
+
+A route with a `hedge` policy sends its request as usual, and if no answer has
+arrived by the route's observed latency at `percentile`, sends a second
+attempt: to a different replica when the route has upstreams, otherwise on a
+fresh connection to the same URL. Whichever answers first without a server
+error wins. The loser is cancelled if it has not started yet; one already on
+the wire cannot be recalled, so it finishes in the background and is
+discarded.
+
+Hedges are capped at `max_percent` of the route's requests, so a slow
+destination sees at most that much extra load. Until enough latency has been
+observed to pick a delay, requests are not hedged.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from services.balancer import UpstreamPool
+from services.deadline import remaining_seconds
+from services.delivery import DeliveryResult, deadline_exceeded, deliver, deliver_to_upstream
+from services.latency import LatencyTracker
+
+# Hedge accounting is halved once a route has seen this many requests, so the
+# cap follows recent traffic rather than all-time totals.
+BUDGET_DECAY_REQUESTS = 1000
+
+
+class _HedgeBudget:
+    def __init__(self):
+        self.requests = 0
+        self.hedges = 0
+
+
+class Hedger:
+    """Runs hedged deliveries on a pool shared by every hedging route."""
+
+    def __init__(self, max_workers: int, latency: LatencyTracker):
+        self.latency = latency
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='hedged-delivery',
+        )
+        self._budgets: Dict[str, _HedgeBudget] = {}
+        self._lock = threading.Lock()
+
+    def deliver(
+        self,
+        destination: str,
+        route_config: Dict[str, Any],
+        payload: Any,
+        correlation_id: str,
+        log_json: Callable[..., None],
+        deadline: Optional[float] = None,
+        pool: Optional[UpstreamPool] = None,
+    ) -> DeliveryResult:
+        policy = route_config['hedge']
+        if _expired(deadline):
+            # Decided before a replica is chosen, so it counts against none of them.
+            return deadline_exceeded(destination, correlation_id, log_json)
+        self._count_request(destination)
+
+        estimate = self.latency.percentile(destination, policy['percentile'])
+        first_url = pool.acquire() if pool is not None else None
+        first = self._executor.submit(
+            self._attempt, destination, route_config, payload, correlation_id, log_json,
+            deadline, pool, first_url,
+        )
+
+        if estimate is None:
+            return first.result()
+
+        delay = max(estimate, policy['min_delay_ms'] / 1000.0)
+        remaining = remaining_seconds(deadline)
+        if remaining is not None and remaining <= delay:
+            return first.result()
+
+        done, _ = wait([first], timeout=delay)
+        if done or _expired(deadline) or not self._take_hedge(destination, policy['max_percent']):
+            return first.result()
+
+        second_url = pool.acquire(exclude=[first_url]) if pool is not None else None
+        log_json('info', correlation_id, 'Sending hedged request',
+                 destination=destination,
+                 delay_ms=int(delay * 1000),
+                 first_url=first_url or route_config['url'],
+                 hedge_url=second_url or route_config['url'])
+        second = self._executor.submit(
+            self._attempt, destination, route_config, payload, correlation_id, log_json,
+            deadline, pool, second_url,
+        )
+
+        attempts = {first: ('primary', first_url), second: ('hedge', second_url)}
+        pending = set(attempts)
+        fallback = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result.status_code < 500:
+                    self._cancel_losers(pending, attempts, pool)
+                    log_json('info', correlation_id, 'Hedged request answered',
+                             destination=destination,
+                             winner=attempts[future][0],
+                             status_code=result.status_code)
+                    return result
+                fallback = fallback or result
+
+        return fallback
+
+    def _attempt(
+        self,
+        destination: str,
+        route_config: Dict[str, Any],
+        payload: Any,
+        correlation_id: str,
+        log_json: Callable[..., None],
+        deadline: Optional[float],
+        pool: Optional[UpstreamPool],
+        url: Optional[str],
+    ) -> DeliveryResult:
+        if pool is not None and _expired(deadline):
+            # Queued until after the deadline; the replica was never contacted.
+            pool.cancel(url)
+            return deadline_exceeded(destination, correlation_id, log_json)
+
+        started = time.monotonic()
+        if pool is not None:
+            result = deliver_to_upstream(
+                destination, route_config, payload, correlation_id, log_json, deadline, pool, url
+            )
+        else:
+            result = deliver(destination, route_config, payload, correlation_id, log_json, deadline)
+
+        if result.status_code < 500:
+            self.latency.record(destination, time.monotonic() - started)
+        return result
+
+    @staticmethod
+    def _cancel_losers(pending, attempts, pool: Optional[UpstreamPool]) -> None:
+        for future in pending:
+            # Only an attempt still queued can be cancelled; it never took a
+            # connection, so its replica slot is handed straight back.
+            if future.cancel() and pool is not None:
+                pool.cancel(attempts[future][1])
+
+    def _count_request(self, destination: str) -> None:
+        with self._lock:
+            budget = self._budgets.setdefault(destination, _HedgeBudget())
+            budget.requests += 1
+            if budget.requests >= BUDGET_DECAY_REQUESTS:
+                budget.requests //= 2
+                budget.hedges //= 2
+
+    def _take_hedge(self, destination: str, max_percent: float) -> bool:
+        """Claim a hedge if the route is still under its share of hedged traffic."""
+        with self._lock:
+            budget = self._budgets[destination]
+            if (budget.hedges + 1) * 100 > budget.requests * max_percent:
+                return False
+            budget.hedges += 1
+            return True
+
+
+def _expired(deadline: Optional[float]) -> bool:
+    remaining = remaining_seconds(deadline)
+    return remaining is not None and remaining <= 0
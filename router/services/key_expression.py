@@ -0,0 +1,74 @@
+"""
+Keys picked out of an envelope by a small path expression in routes.yml.
+
+    source            the edge key (or adapter) the message arrived through
+    payload           the whole payload
+    payload.a.b       a nested field; list items are addressed by index,
+                      e.g. payload.events.0.nodeId
+
+Routes use these to group related messages, for example to keep one sender's
+events in order, and routing rules use them to pick a destination by content.
+Expressions are parsed once when routes are loaded.
+"""
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from services import json_codec
+
+ROOTS = ('source', 'payload')
+
+# Returned by KeyExpression.value() when the path does not exist.
+MISSING = object()
+
+
+@dataclass(frozen=True)
+class KeyExpression:
+    text: str
+    root: str
+    path: Tuple[str, ...]
+
+    def extract(self, payload: Any, source: Optional[str]) -> Optional[str]:
+        """The key for one message, or None when the expression finds nothing."""
+        value = self.value(payload, source)
+        if value is MISSING or value is None:
+            return None
+        if isinstance(value, str):
+            return value or None
+        return json_codec.dumps(value, sort_keys=True)
+
+    def value(self, payload: Any, source: Optional[str]) -> Any:
+        """The raw value the expression points at, or MISSING."""
+        if self.root == 'source':
+            return source if source is not None else MISSING
+
+        value = payload
+        for part in self.path:
+            value = _step(value, part)
+            if value is MISSING:
+                return MISSING
+        return value
+
+
+def parse_key_expression(text: Any) -> KeyExpression:
+    """Parse an expression, raising ValueError when it is malformed."""
+    if not isinstance(text, str) or not text:
+        raise ValueError('key expression must be a non-empty string')
+
+    root, *path = text.split('.')
+    if root not in ROOTS:
+        raise ValueError(f'key expression must start with one of: {", ".join(ROOTS)}')
+    if root == 'source' and path:
+        raise ValueError('"source" has no fields')
+    if not all(path):
+        raise ValueError(f'empty field name in "{text}"')
+
+    return KeyExpression(text, root, tuple(path))
+
+
+def _step(value: Any, part: str) -> Any:
+    if isinstance(value, dict):
+        return value.get(part, MISSING)
+    if isinstance(value, list) and part.isdigit():
+        index = int(part)
+        return value[index] if index < len(value) else MISSING
+    return MISSING
@@ -0,0 +1,134 @@
+"""
+Rolling per-destination latency histograms.
+
+Each destination records how long successful deliveries took into
+log-spaced buckets, so recording is a binary search and a percentile is one
+pass over a few dozen counters, however much traffic there is. Counts live
+in two generations that rotate every `window_seconds`; percentiles read both,
+so they always cover between one and two windows of recent traffic and old
+behaviour ages out on its own.
+
+Hedging uses the percentiles to decide when to send a second attempt, and
+routes with `adaptive_timeout` use them to cut their timeout down to what the
+destination actually needs. Only those routes are measured, keyed by their
+configured name, and at most MAX_TRACKED histograms are kept, the least
+recently used going first.
+"""
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def _log_spaced_bounds(start: float, factor: float, limit: float) -> List[float]:
+    bounds = []
+    bound = start
+    while bound < limit:
+        bounds.append(bound)
+        bound *= factor
+    bounds.append(float('inf'))
+    return bounds
+
+
+# Bucket upper bounds in seconds: 1ms growing by 25% per bucket, up to ~2min.
+BUCKET_BOUNDS = _log_spaced_bounds(0.001, 1.25, 120)
+
+# Below this many samples a percentile is too noisy to act on.
+MIN_SAMPLES = 20
+
+# Histograms kept per process.
+MAX_TRACKED = 1024
+
+
+class LatencyHistogram:
+    """A two-generation rolling histogram. Callers hold the tracker lock."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._current = [0] * len(BUCKET_BOUNDS)
+        self._previous = [0] * len(BUCKET_BOUNDS)
+        self._rotated_at = time.monotonic()
+
+    def record(self, seconds: float) -> None:
+        self._maybe_rotate()
+        self._current[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given percentile, in seconds."""
+        self._maybe_rotate()
+        counts = [a + b for a, b in zip(self._current, self._previous)]
+        total = sum(counts)
+        if total < MIN_SAMPLES:
+            return None
+
+        rank = total * percent / 100.0
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKET_BOUNDS[-1]
+
+    def _maybe_rotate(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._rotated_at
+        if elapsed < self.window_seconds:
+            return
+
+        # After two idle windows nothing recent is left at all.
+        self._previous = self._current if elapsed < 2 * self.window_seconds else [0] * len(BUCKET_BOUNDS)
+        self._current = [0] * len(BUCKET_BOUNDS)
+        self._rotated_at = now
+
+
+class LatencyTracker:
+    """One rolling histogram per destination, shared by every request thread."""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self._histograms: 'OrderedDict[str, LatencyHistogram]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, destination: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(destination)
+            if histogram is None:
+                histogram = self._histograms[destination] = LatencyHistogram(self.window_seconds)
+                if len(self._histograms) > MAX_TRACKED:
+                    self._histograms.popitem(last=False)
+            else:
+                self._histograms.move_to_end(destination)
+            histogram.record(seconds)
+
+    def percentile(self, destination: str, percent: float) -> Optional[float]:
+        """Recent latency at `percent`, or None until enough has been observed."""
+        with self._lock:
+            histogram = self._histograms.get(destination)
+            return histogram.percentile(percent) if histogram is not None else None
+
+    def __len__(self) -> int:
+        return len(self._histograms)
+
+
+def adaptive_timeout(tracker: LatencyTracker, destination: str, route_config: Dict[str, Any]) -> float:
+    """
+    The timeout to use for the route's next delivery.
+
+    A multiple of the recent latency percentile, kept between the policy's
+    floor and the route's static `timeout_seconds`. Only answered requests are
+    measured, so if a destination slows down for good, requests cut off by the
+    shorter timeout are not counted. Once its old samples age out there is too
+    little data, and the static timeout applies again until the new latency
+    has been learned.
+    """
+    static_timeout = route_config['timeout_seconds']
+    policy = route_config.get('adaptive_timeout')
+    if not policy:
+        return static_timeout
+
+    estimate = tracker.percentile(destination, policy['percentile'])
+    if estimate is None:
+        return static_timeout
+
+    return min(static_timeout, max(policy['floor_seconds'], estimate * policy['multiplier']))
@@ -0,0 +1,64 @@
+"""
+Per-key FIFO delivery for routes with an `ordering` block.
+
+Messages whose keys match are delivered strictly one after another, in the
+order they reached this router process; messages with different keys run
+concurrently on one bounded pool shared by every ordered route. A key never
+has more than one delivery in flight, and goes to the back of the line for a
+worker after each one, so a busy sender cannot crowd out the others.
+
+Order is kept within one router worker process. Run the router with a single
+gunicorn worker (and as many threads as needed) if ordered routes must hold
+across the whole service.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, Tuple
+
+from services.delivery import DeliveryResult
+
+Task = Callable[[], DeliveryResult]
+
+
+class PartitionedScheduler:
+    """Runs tasks in submission order per key, and across keys in parallel."""
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='ordered-delivery',
+        )
+        # Keys with a task running; each maps to the tasks waiting behind it.
+        self._queues: Dict[Hashable, Deque[Tuple[Task, Future]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, task: Task) -> 'Future[DeliveryResult]':
+        future: 'Future[DeliveryResult]' = Future()
+        with self._lock:
+            waiting = self._queues.get(key)
+            if waiting is not None:
+                waiting.append((task, future))
+                return future
+            self._queues[key] = deque()
+
+        self._executor.submit(self._run, key, task, future)
+        return future
+
+    def _run(self, key: Hashable, task: Task, future: Future) -> None:
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(task())
+            except BaseException as exc:  # noqa: BLE001
+                future.set_exception(exc)
+
+        with self._lock:
+            waiting = self._queues[key]
+            if not waiting:
+                del self._queues[key]
+                return
+            next_task, next_future = waiting.popleft()
+
+        # Queued behind whatever other keys are waiting for a worker, rather
+        # than run here, so one busy key cannot hold a worker indefinitely.
+        self._executor.submit(self._run, key, next_task, next_future)
@@ -0,0 +1,132 @@
+"""
+Opt-in response caching for idempotent GET routes.
+
+A route with a `cache` block keeps recent successful responses in memory,
+keyed by destination plus a digest of the payload, for `ttl_seconds`. The
+cache is bounded by entry count and by total body bytes, evicting the least
+recently used entry first.
+
+Concurrent misses for the same key are collapsed: the first caller fetches
+from upstream and everyone else arriving meanwhile waits for that result
+instead of sending their own request. Like the balancer, each router worker
+process has its own cache.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services import json_codec
+from services.delivery import DeliveryResult
+
+
+def cache_key(destination: str, payload: Any) -> str:
+    """Destination plus a digest of the payload's canonical JSON form."""
+    canonical = json_codec.dumps_bytes(payload, sort_keys=True, default=str)
+    digest = hashlib.sha256(canonical).hexdigest()
+    return f'{destination}:{digest}'
+
+
+class ResponseCache:
+    """A TTL + LRU cache of DeliveryResults with single-flight loading."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: 'OrderedDict[str, Tuple[float, DeliveryResult]]' = OrderedDict()
+        self._bytes = 0
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(
+        self,
+        key: str,
+        load: Callable[[], DeliveryResult],
+        wait_timeout: Optional[float] = None,
+    ) -> Tuple[DeliveryResult, str]:
+        """
+        Return the cached result for `key`, loading it if needed.
+
+        The second element says where the result came from: `hit`, `miss`
+        (this caller loaded it), or `shared` (another caller's load). Only 2xx
+        results are stored. A caller waiting on someone else's load gives up
+        after `wait_timeout` seconds with concurrent.futures.TimeoutError.
+        """
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                return cached, 'hit'
+
+            in_flight = self._loading.get(key)
+            if in_flight is None:
+                in_flight = Future()
+                self._loading[key] = in_flight
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            return in_flight.result(timeout=wait_timeout), 'shared'
+
+        try:
+            result = load()
+        except BaseException as exc:
+            with self._lock:
+                del self._loading[key]
+            in_flight.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            if 200 <= result.status_code < 300:
+                self._store(key, result)
+        in_flight.set_result(result)
+        return result, 'miss'
+
+    def _lookup(self, key: str) -> Optional[DeliveryResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, result = entry
+        if time.monotonic() >= expires_at:
+            self._evict(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return result
+
+    def _store(self, key: str, result: DeliveryResult) -> None:
+        size = len(result.content)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._evict(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        _, result = self._entries.pop(key)
+        self._bytes -= len(result.content)
+
+
+def build_caches(routes: Dict[str, Dict[str, Any]]) -> Dict[str, ResponseCache]:
+    """Create a cache for every route with a `cache` block."""
+    return {
+        destination: ResponseCache(
+            route_config['cache']['ttl_seconds'],
+            route_config['cache']['max_entries'],
+            route_config['cache']['max_bytes'],
+        )
+        for destination, route_config in routes.items()
+        if route_config.get('cache')
+    }
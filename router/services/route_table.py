@@ -0,0 +1,128 @@
+"""
+Destination lookup, including wildcard routes.
+
+A route named `prefix.*` serves every destination under that prefix that has
+no route of its own:
+
+    wikimgr.*:
+      url: http://192.168.1.100:8000/{suffix}
+      auth_env: DEST_WIKIMGR_SECRET
+
+`wikimgr.logs.captured` then goes to http://192.168.1.100:8000/logs/captured:
+the part after the prefix, dots turned into slashes, replaces `{suffix}` (or
+is appended as a path when the url has no placeholder), and everything else
+is inherited from the wildcard route. The resolved route also names the
+wildcard it came from under `route`, for state kept per configured route.
+
+Each suffix segment must consist of letters, digits, `_` and `-`, since it
+becomes part of an internal URL; anything else (`?`, `#`, `%`, ...) matches
+no route, so a caller cannot add a query string or an encoded `..`.
+
+Exact names always win; among wildcards the longest prefix does. Wildcard
+prefixes are kept in a trie of name segments, so a lookup walks only as many
+nodes as the name has segments, however many routes there are.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+WILDCARD = '*'
+SUFFIX_PLACEHOLDER = '{suffix}'
+SUFFIX_SEGMENT = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Wildcard routes may only set these; features that keep per-route state
+# (pools, caches, ordering, ...) need a route of their own.
+PATTERN_FIELDS = (
+    'url', 'method', 'timeout_seconds', 'auth_env', 'delivery', 'adaptive_timeout', 'health_url', 'transform',
+    'compression',
+)
+
+# Resolved wildcard destinations remembered per process.
+MAX_RESOLVED = 4096
+
+
+def route_name(destination: str, route_config: Dict[str, Any]) -> str:
+    """The configured route serving `destination`: its wildcard, or the name itself."""
+    return route_config.get('route', destination)
+
+
+def is_pattern(name: str) -> bool:
+    return name.endswith('.' + WILDCARD)
+
+
+def expand_url(template: str, suffix: str) -> str:
+    path = suffix.replace('.', '/')
+    if SUFFIX_PLACEHOLDER in template:
+        return template.replace(SUFFIX_PLACEHOLDER, path)
+    return template.rstrip('/') + '/' + path
+
+
+class _Node:
+    __slots__ = ('children', 'pattern')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        # Name of the `<path to here>.*` route, if there is one.
+        self.pattern: Optional[str] = None
+
+
+class RouteTable:
+    """Exact routes plus a trie of wildcard prefixes."""
+
+    def __init__(self, routes: Dict[str, Dict[str, Any]]):
+        self.routes = routes
+        self._root = _Node()
+        for name in routes:
+            if is_pattern(name):
+                node = self._root
+                for segment in name.split('.')[:-1]:
+                    node = node.children.setdefault(segment, _Node())
+                node.pattern = name
+
+        self._resolved: 'OrderedDict[str, Optional[Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, destination: Any) -> Optional[Dict[str, Any]]:
+        """The route for `destination`, or None when nothing serves it."""
+        if not isinstance(destination, str) or WILDCARD in destination:
+            return None
+
+        route_config = self.routes.get(destination)
+        if route_config is not None:
+            return route_config
+
+        with self._lock:
+            if destination in self._resolved:
+                self._resolved.move_to_end(destination)
+                return self._resolved[destination]
+
+        route_config = self._match(destination)
+        with self._lock:
+            self._resolved[destination] = route_config
+            if len(self._resolved) > MAX_RESOLVED:
+                self._resolved.popitem(last=False)
+        return route_config
+
+    def _match(self, destination: str) -> Optional[Dict[str, Any]]:
+        segments = destination.split('.')
+        node = self._root
+        best: Optional[str] = None
+        depth = 0
+        # The wildcard needs at least one segment after its prefix.
+        for index, segment in enumerate(segments[:-1]):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.pattern is not None:
+                best, depth = node.pattern, index + 1
+
+        if best is None:
+            return None
+
+        if not all(SUFFIX_SEGMENT.match(segment) for segment in segments[depth:]):
+            return None
+
+        pattern_config = self.routes[best]
+        suffix = '.'.join(segments[depth:])
+        return {**pattern_config, 'url': expand_url(pattern_config['url'], suffix), 'route': best}
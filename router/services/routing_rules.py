@@ -0,0 +1,76 @@
+"""
+Content-based routing for routes with `rules`.
+
+Each rule matches key expressions against values and names the destination
+a matching message goes to; the first rule, in file order, that matches
+wins:
+
+    rules:
+      - match: {payload.action: opened}
+        destination: github.new_issues
+      - match: {payload.action: [closed, reopened], source: ci-bot}
+        destination: github.issue_state
+
+A list of values matches any of them. Rules are compiled into one hash table
+per distinct set of matched fields, so finding the winner costs a lookup per
+field set, however many rules share it.
+"""
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import json_codec
+from services.key_expression import MISSING, KeyExpression, parse_key_expression
+
+# (the matched expressions, {values: (rule position, destination)})
+_FieldTable = Tuple[Tuple[KeyExpression, ...], Dict[Tuple[str, ...], Tuple[int, str]]]
+
+
+def _canonical(value: Any) -> str:
+    """A hashable form that keeps 1, "1", and true apart."""
+    return json_codec.dumps(value, sort_keys=True)
+
+
+class RuleIndex:
+    """The compiled rules of one route."""
+
+    def __init__(self, rules: List[Dict[str, Any]]):
+        tables: Dict[Tuple[str, ...], _FieldTable] = {}
+
+        for position, rule in enumerate(rules):
+            fields = sorted(rule['match'])
+            if tuple(fields) not in tables:
+                tables[tuple(fields)] = (tuple(parse_key_expression(f) for f in fields), {})
+            table = tables[tuple(fields)][1]
+
+            choices = [
+                value if isinstance(value, list) else [value]
+                for value in (rule['match'][field] for field in fields)
+            ]
+            for values in itertools.product(*choices):
+                # An earlier rule with the same match keeps priority.
+                table.setdefault(tuple(_canonical(v) for v in values), (position, rule['destination']))
+
+        self._tables = list(tables.values())
+
+    def lookup(self, payload: Any, source: Optional[str]) -> Optional[str]:
+        """The destination of the first matching rule, or None."""
+        best: Optional[Tuple[int, str]] = None
+        for expressions, table in self._tables:
+            values = [expression.value(payload, source) for expression in expressions]
+            if any(value is MISSING for value in values):
+                continue
+
+            hit = table.get(tuple(_canonical(value) for value in values))
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best = hit
+
+        return best[1] if best is not None else None
+
+
+def build_rule_indexes(routes: Dict[str, Dict[str, Any]]) -> Dict[str, RuleIndex]:
+    """Compile the rules of every route that has them."""
+    return {
+        destination: RuleIndex(route_config['rules'])
+        for destination, route_config in routes.items()
+        if route_config.get('rules')
+    }
@@ -0,0 +1,75 @@
+"""
+Delayed delivery requested by the envelope itself.
+
+An envelope may carry either `delay_seconds` (a number) or `deliver_at` (an
+ISO 8601 timestamp with a UTC offset, or Unix seconds). Such envelopes are
+committed to the durable delivery queue with their first attempt set to that
+time, so they survive restarts and are retried like any durable message.
+
+The queue delivers straight to the destination, so routes whose `cache`,
+`coalesce`, or `ordering` it would bypass refuse delays instead.
+"""
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+# Route features the delivery queue cannot honour.
+UNSCHEDULABLE_FEATURES = ('cache', 'coalesce', 'ordering')
+
+
+class ScheduleError(ValueError):
+    """Raised when an envelope's delay fields are malformed or out of range."""
+
+
+def parse_schedule(envelope: Dict[str, Any], max_delay_seconds: float) -> Optional[float]:
+    """
+    The Unix time an envelope asks to be delivered at, or None to deliver now.
+
+    Times in the past mean "as soon as possible".
+    """
+    has_delay = 'delay_seconds' in envelope
+    has_time = 'deliver_at' in envelope
+    if not has_delay and not has_time:
+        return None
+    if has_delay and has_time:
+        raise ScheduleError('Use either "delay_seconds" or "deliver_at", not both')
+
+    now = time.time()
+    if has_delay:
+        delay = envelope['delay_seconds']
+        if isinstance(delay, bool) or not isinstance(delay, (int, float)) or not math.isfinite(delay) or delay < 0:
+            raise ScheduleError('"delay_seconds" must be a non-negative number')
+        deliver_at = now + delay
+    else:
+        deliver_at = _parse_time(envelope['deliver_at'])
+
+    if deliver_at - now > max_delay_seconds:
+        raise ScheduleError(f'Delivery cannot be scheduled more than {int(max_delay_seconds)}s ahead')
+    return max(deliver_at, now)
+
+
+def check_schedulable(route_config: Dict[str, Any]) -> None:
+    """Raise ScheduleError when the route uses a feature delayed delivery would skip."""
+    features = [feature for feature in UNSCHEDULABLE_FEATURES if route_config.get(feature)]
+    if features:
+        raise ScheduleError(f'Delayed delivery is not supported on routes with {", ".join(features)}')
+
+
+def _parse_time(value: Any) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if math.isfinite(value):
+            return float(value)
+        raise ScheduleError('"deliver_at" must be a finite number of Unix seconds')
+
+    if isinstance(value, str):
+        try:
+            # fromisoformat() before 3.11 does not accept a trailing Z.
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            parsed = None
+        if parsed is not None and parsed.tzinfo is not None:
+            return parsed.timestamp()
+
+    raise ScheduleError('"deliver_at" must be an ISO 8601 time with a UTC offset, or Unix seconds')
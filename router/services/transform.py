@@ -0,0 +1,237 @@
+"""
+Reshaping a payload before it is forwarded, declared per route:
+
+    transform:
+      flatten: events                  # forward the items of this list
+      select: [nodeId, actor.loginName]
+      rename: {actor.loginName: user}
+      static: {source: webhook-router}
+
+Steps run in that order. Paths are dotted and relative to the payload (list
+items by index, as in `events.0`); `select` keeps only the listed paths,
+`rename` moves a value to a new path, and `static` sets fixed values. A list
+keeps just its selected items, in order, and an item moved out of a list is
+removed from it. A batch
+payload (a list) is transformed item by item, and `flatten` concatenates the
+lists it finds. A payload (or batch item) without a non-empty list at the
+`flatten` path is passed through unchanged, untouched by the other steps,
+rather than flattened into nothing. Other paths that do not exist are skipped, and items
+that are not objects are passed through unchanged.
+
+Specs are compiled once when routes load, into a Transform that only walks
+precomputed paths. The payload itself is never modified, since durable and
+coalesced deliveries hold on to it.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+STEPS = ('flatten', 'select', 'rename', 'static')
+
+Path = Tuple[str, ...]
+_MISSING = object()
+
+
+class Transform:
+    """A compiled `transform` block; call it with a payload to get the reshaped one."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self._flatten = _parse_path(spec['flatten']) if 'flatten' in spec else None
+        self._item_steps = _compile_item_steps(spec)
+
+    def __call__(self, payload: Any) -> Any:
+        if isinstance(payload, list):
+            if self._flatten is None:
+                return [self._apply_steps(item) for item in payload]
+            flattened = []
+            for item in payload:
+                items = self._flattened(item)
+                if items is None:
+                    flattened.append(item)
+                else:
+                    flattened.extend(items)
+            return flattened
+
+        if self._flatten is None:
+            return self._apply_steps(payload)
+        items = self._flattened(payload)
+        return payload if items is None else items
+
+    def __repr__(self) -> str:
+        return f'Transform({self.spec!r})'
+
+    def _flattened(self, payload: Any) -> Optional[List[Any]]:
+        """The transformed items at the flatten path, or None when there are none."""
+        items = _get(payload, self._flatten)
+        if not isinstance(items, list) or not items:
+            return None
+        return [self._apply_steps(item) for item in items]
+
+    def _apply_steps(self, item: Any) -> Any:
+        if not isinstance(item, dict):
+            return item
+        for step in self._item_steps:
+            item = step(item)
+        return item
+
+
+def compile_transform(spec: Any) -> Transform:
+    """Compile a `transform` block, raising ValueError when it is malformed."""
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError('must be a non-empty mapping')
+
+    unknown = sorted(set(spec) - set(STEPS))
+    if unknown:
+        raise ValueError(f'unknown step(s) {", ".join(unknown)} (expected: {", ".join(STEPS)})')
+
+    if 'select' in spec and (not isinstance(spec['select'], list) or not spec['select']):
+        raise ValueError('"select" must be a non-empty list of paths')
+    for step in ('rename', 'static'):
+        if step in spec and (not isinstance(spec[step], dict) or not spec[step]):
+            raise ValueError(f'"{step}" must be a non-empty mapping')
+
+    return Transform(spec)
+
+
+def _compile_item_steps(spec: Dict[str, Any]) -> List[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+    steps: List[Callable[[Dict[str, Any]], Dict[str, Any]]] = []
+
+    if 'select' in spec:
+        tree = _selection_tree([_parse_path(path) for path in spec['select']])
+        steps.append(lambda item: _select(item, tree))
+
+    if 'rename' in spec:
+        moves = [(_parse_path(old), _parse_path(new)) for old, new in spec['rename'].items()]
+
+        def rename(item: Dict[str, Any]) -> Dict[str, Any]:
+            for old, new in moves:
+                value = _get(item, old)
+                if value is not _MISSING:
+                    item = _with(_without(item, old), new, value)
+            return item
+
+        steps.append(rename)
+
+    if 'static' in spec:
+        fields = [(_parse_path(path), value) for path, value in spec['static'].items()]
+
+        def static(item: Dict[str, Any]) -> Dict[str, Any]:
+            for path, value in fields:
+                item = _with(item, path, value)
+            return item
+
+        steps.append(static)
+
+    return steps
+
+
+def _parse_path(text: Any) -> Path:
+    if not isinstance(text, str) or not text:
+        raise ValueError('paths must be non-empty strings')
+    path = tuple(text.split('.'))
+    if not all(path):
+        raise ValueError(f'empty field name in "{text}"')
+    return path
+
+
+def _selection_tree(paths: List[Path]) -> Dict[str, Optional[dict]]:
+    """Merge selected paths into a tree; None marks a whole value to keep."""
+    tree: Dict[str, Optional[dict]] = {}
+    for path in paths:
+        node = tree
+        for part in path[:-1]:
+            child = node.get(part, {})
+            if child is None:
+                break  # an ancestor is already kept whole
+            node = node.setdefault(part, child)
+        else:
+            node[path[-1]] = None
+    return tree
+
+
+def _select(value: Any, tree: Dict[str, Optional[dict]]) -> Any:
+    """The parts of a dict, or the items of a list, named by `tree`."""
+    if isinstance(value, list):
+        # Selected items keep their order; the others are dropped.
+        picked = sorted(
+            ((_index(value, key), subtree) for key, subtree in tree.items() if _index(value, key) is not None),
+            key=lambda pick: pick[0],
+        )
+        return [
+            value[index] if subtree is None else _select(value[index], subtree)
+            for index, subtree in picked
+            if subtree is None or isinstance(value[index], (dict, list))
+        ]
+
+    selected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        if subtree is None:
+            selected[key] = value[key]
+        elif isinstance(value[key], (dict, list)):
+            selected[key] = _select(value[key], subtree)
+    return selected
+
+
+def _index(value: List[Any], part: str) -> Optional[int]:
+    """`part` as an index into `value`, or None when it is not one."""
+    if part.isdigit() and int(part) < len(value):
+        return int(part)
+    return None
+
+
+def _get(value: Any, path: Path) -> Any:
+    for part in path:
+        if isinstance(value, dict):
+            value = value.get(part, _MISSING)
+        elif isinstance(value, list) and _index(value, part) is not None:
+            value = value[int(part)]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _with(item: Any, path: Path, value: Any) -> Any:
+    """A copy of `item` with `path` set, copying only the objects and lists along the path."""
+    head, rest = path[0], path[1:]
+    if isinstance(item, list):
+        index = _index(item, head)
+        if index is None:
+            return item  # lists are not grown or replaced
+        updated_list = list(item)
+        updated_list[index] = value if not rest else _with(item[index], rest, value)
+        return updated_list
+
+    updated = dict(item) if isinstance(item, dict) else {}
+    if not rest:
+        updated[head] = value
+    else:
+        child = updated.get(head)
+        updated[head] = _with(child if isinstance(child, (dict, list)) else {}, rest, value)
+    return updated
+
+
+def _without(item: Any, path: Path) -> Any:
+    """A copy of `item` with `path` removed, copying only the objects and lists along the path."""
+    head, rest = path[0], path[1:]
+    if isinstance(item, list):
+        index = _index(item, head)
+        if index is None:
+            return item
+        updated_list = list(item)
+        if not rest:
+            del updated_list[index]
+        else:
+            updated_list[index] = _without(item[index], rest)
+        return updated_list
+
+    if not isinstance(item, dict) or head not in item:
+        return item
+    updated = dict(item)
+    if not rest:
+        del updated[head]
+    else:
+        updated[head] = _without(item[head], rest)
+    return updated
@@ -0,0 +1,97 @@
+"""Compressed inbound webhooks on both ingress paths."""
+
+import gzip
+import json
+import os
+import zlib
+
+import pytest
+
+from edge_support import OWNER, VALID_TOKEN, sign
+
+ENVELOPE = {'destination': 'wikimgr', 'payload': {'text': 'hello ' * 200}}
+
+
+def native_headers(encoding):
+    return {'Authorization': f'Bearer {VALID_TOKEN}', 'Content-Encoding': encoding}
+
+
+@pytest.mark.parametrize(
+    ('encoding', 'compress'),
+    [('gzip', gzip.compress), ('deflate', zlib.compress), ('GZIP', gzip.compress)],
+    ids=['gzip', 'deflate', 'case-insensitive'],
+)
+def test_native_ingress_accepts_compressed_bodies(make_edge_client, encoding, compress):
+    client, forwarder, _ = make_edge_client()
+
+    response = client.post(
+        '/webhook', headers=native_headers(encoding), data=compress(json.dumps(ENVELOPE).encode('utf-8'))
+    )
+
+    assert response.status_code == 200
+    assert forwarder.calls[0]['body'] == ENVELOPE
+    assert forwarder.calls[0]['edge_key_name'] == OWNER
+
+
+def test_zstd_bodies_are_accepted(make_edge_client):
+    zstandard = pytest.importorskip('zstandard')
+    client, forwarder, _ = make_edge_client()
+
+    data = zstandard.ZstdCompressor().compress(json.dumps(ENVELOPE).encode('utf-8'))
+    response = client.post('/webhook', headers=native_headers('zstd'), data=data)
+
+    assert response.status_code == 200
+    assert forwarder.calls[0]['body'] == ENVELOPE
+
+
+def test_tailscale_signature_covers_the_decoded_body(make_edge_client):
+    client, forwarder, _ = make_edge_client()
+    body = json.dumps([{'type': 'nodeCreated'}]).encode('utf-8')
+
+    response = client.post(
+        '/tailscale',
+        headers={'Tailscale-Webhook-Signature': sign(body), 'Content-Encoding': 'gzip'},
+        data=gzip.compress(body),
+    )
+
+    assert response.status_code == 200
+    assert forwarder.calls[0]['body']['payload'] == [{'type': 'nodeCreated'}]
+
+
+@pytest.mark.parametrize(
+    ('data', 'encoding', 'status'),
+    [
+        # 11 MiB of padding compresses to a few KiB, well under MAX_CONTENT_LENGTH.
+        (gzip.compress(b' ' * (11 * 1024 * 1024)), 'gzip', 413),
+        (gzip.compress(json.dumps(ENVELOPE).encode('utf-8'))[:-20], 'gzip', 400),
+        (b'{}', 'br', 415),
+    ],
+    ids=['bomb', 'truncated', 'unsupported'],
+)
+def test_unusable_compressed_bodies_are_rejected(make_edge_client, data, encoding, status):
+    client, forwarder, _ = make_edge_client()
+
+    response = client.post('/webhook', headers=native_headers(encoding), data=data)
+
+    assert response.status_code == status
+    assert forwarder.calls == []
+
+
+def test_compressed_bodies_over_max_content_length_are_refused_with_413(make_edge_client):
+    client, forwarder, _ = make_edge_client(max_body_size_mb=1)
+
+    # Random bytes barely compress, so this stays over the 1 MiB limit.
+    data = gzip.compress(os.urandom(2 * 1024 * 1024))
+    response = client.post('/webhook', headers=native_headers('gzip'), data=data)
+
+    assert response.status_code == 413
+    assert forwarder.calls == []
+
+
+def test_anonymous_compressed_bodies_are_not_inflated(make_edge_client):
+    client, _, log_json = make_edge_client()
+
+    response = client.post('/webhook', headers={'Content-Encoding': 'br'}, data=b'{}')
+
+    assert response.status_code == 401
+    assert 'Unsupported Content-Encoding' not in [entry['message'] for entry in log_json.entries]
@@ -0,0 +1,168 @@
+"""Adaptive concurrency limiting and load shedding at the edge."""
+
+import threading
+
+import pytest
+
+from edge_support import VALID_TOKEN, FakeForwarder
+from helpers import FakeResponse, import_service_module
+
+
+@pytest.fixture
+def limiter_module():
+    return import_service_module('edge', 'services.concurrency_limiter')
+
+
+class BlockingForwarder(FakeForwarder):
+    """Holds every forward until released, so requests stay in flight."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def forward(self, body, correlation_id, edge_key_name, destination):
+        self.entered.set()
+        self.release.wait(timeout=5)
+        return super().forward(body, correlation_id, edge_key_name, destination)
+
+
+def test_requests_over_the_limit_are_shed(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(2, 2)
+
+    assert limiter.try_acquire('native')
+    assert limiter.try_acquire('native')
+    assert not limiter.try_acquire('native')
+
+    limiter.release()
+    assert limiter.try_acquire('native')
+
+
+def test_shed_first_adapters_get_a_smaller_share(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(8, 8, shed_first=['tailscale'])
+
+    for _ in range(6):
+        assert limiter.try_acquire('native')
+
+    assert not limiter.try_acquire('tailscale')
+    assert limiter.try_acquire('native')
+
+
+def test_slow_responses_shrink_the_limit(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(4, 40)
+    start = limiter.limit
+
+    limiter.try_acquire('native')
+    limiter.release_with_sample('wikimgr', 0.01)
+    limiter.try_acquire('native')
+    limiter.release_with_sample('wikimgr', 1.0)
+
+    assert limiter.limit == pytest.approx(start * limiter_module.BACKOFF_RATIO)
+
+
+def test_slow_routes_are_judged_against_themselves(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(4, 40)
+    start = limiter.limit
+
+    for destination, seconds in [('fast', 0.005), ('slow', 0.5)] * 10:
+        limiter.try_acquire('native')
+        limiter.release_with_sample(destination, seconds)
+
+    assert limiter.limit == start
+
+
+def test_decreases_are_spaced_out(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(4, 40)
+    start = limiter.limit
+
+    for _ in range(10):
+        limiter.try_acquire('native')
+        limiter.release_with_sample('wikimgr', 5.0, overloaded=True)
+
+    # A burst of timeouts within one interval costs a single backoff.
+    assert limiter.limit == pytest.approx(start * limiter_module.BACKOFF_RATIO)
+
+
+def test_overload_never_drops_below_the_minimum(limiter_module, monkeypatch):
+    monkeypatch.setattr(limiter_module, 'BACKOFF_INTERVAL_SECONDS', 0)
+    limiter = limiter_module.ConcurrencyLimiter(4, 40)
+
+    for _ in range(100):
+        limiter.try_acquire('native')
+        limiter.release_with_sample('wikimgr', 5.0, overloaded=True)
+
+    assert limiter.limit == 4
+
+
+def test_fast_responses_grow_a_busy_limit(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(2, 10)
+    start = limiter.limit
+
+    for _ in range(int(start)):
+        limiter.try_acquire('native')
+    for _ in range(int(start)):
+        limiter.release_with_sample('wikimgr', 0.01)
+
+    assert start < limiter.limit <= 10
+
+
+def test_idle_limit_does_not_grow(limiter_module):
+    limiter = limiter_module.ConcurrencyLimiter(2, 10)
+    start = limiter.limit
+
+    for _ in range(50):
+        limiter.try_acquire('native')
+        limiter.release_with_sample('wikimgr', 0.01)
+
+    assert limiter.limit == start
+
+
+def test_edge_sheds_with_503_and_retry_after(make_edge_client):
+    forwarder = BlockingForwarder()
+    client, _, log_json = make_edge_client(forwarder, concurrency_limit_max=1, concurrency_limit_min=1)
+    request = {
+        'headers': {'Authorization': f'Bearer {VALID_TOKEN}'},
+        'json': {'destination': 'wikimgr', 'payload': {}},
+    }
+
+    first = {}
+    worker = threading.Thread(target=lambda: first.update(response=client.post('/webhook', **request)))
+    worker.start()
+    assert forwarder.entered.wait(timeout=5)
+
+    try:
+        shed = client.post('/webhook', **request)
+    finally:
+        forwarder.release.set()
+        worker.join(timeout=5)
+
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == '1'
+    assert first['response'].status_code == 200
+    assert len(forwarder.calls) == 1
+    assert any(entry['message'] == 'Shedding request over concurrency limit' for entry in log_json.entries)
+
+    # The slot is free again once the first request finishes.
+    forwarder.release.set()
+    assert client.post('/webhook', **request).status_code == 200
+
+
+def test_only_delivered_messages_are_sampled(make_edge_client, limiter_module, monkeypatch):
+    samples = []
+    monkeypatch.setattr(
+        limiter_module.ConcurrencyLimiter,
+        'release_with_sample',
+        lambda self, *sample: (samples.append(sample), self.release()),
+    )
+    forwarder = FakeForwarder()
+    client, _, _ = make_edge_client(forwarder, concurrency_limit_max=4)
+    request = {
+        'headers': {'Authorization': f'Bearer {VALID_TOKEN}'},
+        'json': {'destination': 'wikimgr', 'payload': {}},
+    }
+
+    for status_code in (200, 202, 404):
+        forwarder.response = FakeResponse(status_code=status_code)
+        client.post('/webhook', **request)
+
+    assert [sample[0] for sample in samples] == ['wikimgr']
@@ -0,0 +1,159 @@
+"""Hashed edge key store with live reload."""
+
+import json
+import logging
+import os
+
+import pytest
+
+from helpers import import_service_module
+
+PEPPER = 'pepper'
+
+
+@pytest.fixture
+def store_module():
+    return import_service_module('edge', 'services.edge_key_store')
+
+
+def write_keys(path, keys):
+    # Write beside the file and rename over it, as an operator would.
+    temporary = f'{path}.new'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(keys, f)
+    os.replace(temporary, path)
+
+
+def make_store(store_module, path, reload_seconds=0, pepper=PEPPER):
+    return store_module.EdgeKeyStore(str(path), pepper, reload_seconds, logging.getLogger('test'))
+
+
+def test_plaintext_and_digest_entries_are_both_accepted(store_module, tmp_path):
+    path = tmp_path / 'edge_keys.json'
+    digest = store_module.DIGEST_PREFIX + store_module.token_digest('bob-token', PEPPER).hex()
+    write_keys(path, {'alice': 'alice-token', 'bob': digest})
+
+    store = make_store(store_module, path)
+
+    assert store.get('alice-token') == 'alice'
+    assert store.get('bob-token') == 'bob'
+    assert store.get('nope') is None
+    assert store.get(digest) is None
+    assert len(store) == 2
+
+
+def test_pepper_changes_what_a_digest_matches(store_module, tmp_path):
+    path = tmp_path / 'edge_keys.json'
+    digest = store_module.DIGEST_PREFIX + store_module.token_digest('bob-token', PEPPER).hex()
+    write_keys(path, {'bob': digest})
+
+    assert make_store(store_module, path, pepper='other').get('bob-token') is None
+
+
+@pytest.mark.parametrize('keys, message', [
+    ({}, 'No valid edge keys'),
+    (['token'], 'JSON object'),
+    ({'alice': 'same', 'bob': 'same'}, 'Duplicate token'),
+    ({'alice': 'sha256:beef'}, 'malformed sha256 digest'),
+])
+def test_unusable_files_are_rejected(store_module, tmp_path, keys, message):
+    path = tmp_path / 'edge_keys.json'
+    write_keys(path, keys)
+
+    with pytest.raises(store_module.EdgeKeyError, match=message):
+        make_store(store_module, path)
+
+
+def test_changed_file_is_reloaded(store_module, tmp_path):
+    path = tmp_path / 'edge_keys.json'
+    write_keys(path, {'alice': 'alice-token'})
+    store = make_store(store_module, path)
+
+    write_keys(path, {'alice': 'rotated-token', 'carol': 'carol-token'})
+
+    assert store.reload_if_changed()
+    assert store.get('alice-token') is None
+    assert store.get('rotated-token') == 'alice'
+    assert store.get('carol-token') == 'carol'
+    assert not store.reload_if_changed()
+
+
+def test_lookup_reloads_once_the_interval_passes(store_module, tmp_path):
+    path = tmp_path / 'edge_keys.json'
+    write_keys(path, {'alice': 'alice-token'})
+    store = make_store(store_module, path, reload_seconds=60)
+
+    write_keys(path, {'alice': 'rotated-token'})
+    assert store.get('rotated-token') is None
+
+    store._next_check = 0  # pylint: disable=protected-access
+    store.get('rotated-token')  # starts the reload in the background
+    store._reloader.join(timeout=5)  # pylint: disable=protected-access
+    assert store.get('rotated-token') == 'alice'
+
+
+def test_broken_reload_keeps_the_current_keys(store_module, tmp_path):
+    path = tmp_path / 'edge_keys.json'
+    write_keys(path, {'alice': 'alice-token'})
+    store = make_store(store_module, path)
+
+    path.write_text('{not json', encoding='utf-8')
+
+    assert not store.reload_if_changed()
+    assert store.get('alice-token') == 'alice'
+
+
+def test_sqlite_index_serves_and_reloads_lookups(store_module, tmp_path):
+    source = tmp_path / 'edge_keys.json'
+    index = tmp_path / 'edge_keys.db'
+    write_keys(source, {'alice': 'alice-token', 'bob': 'bob-token'})
+    assert store_module.main(['index', str(source), str(index)]) == 0
+
+    store = make_store(store_module, index, pepper='')
+
+    assert len(store) == 2
+    assert store.get('bob-token') == 'bob'
+    assert store.get('nope') is None
+
+    write_keys(source, {'carol': 'carol-token'})
+    store_module.main(['index', str(source), str(index)])
+
+    assert store.reload_if_changed()
+    assert store.get('carol-token') == 'carol'
+    assert store.get('bob-token') is None
+
+
+def test_failed_lookup_is_treated_as_an_unknown_key(store_module, tmp_path, make_edge_client):
+    source = tmp_path / 'edge_keys.json'
+    index = tmp_path / 'edge_keys.db'
+    write_keys(source, {'alice': 'alice-token'})
+    store_module.main(['index', str(source), str(index)])
+    store = make_store(store_module, index, pepper='')
+    client, forwarder, _ = make_edge_client(edge_keys=store)
+
+    index.write_bytes(b'not a database' * 512)
+    store._index.close()  # pylint: disable=protected-access
+
+    response = client.post(
+        '/webhook',
+        headers={'Authorization': 'Bearer alice-token'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    assert response.status_code == 401
+    assert not forwarder.calls
+
+
+def test_native_ingress_accepts_keys_from_the_store(store_module, tmp_path, make_edge_client):
+    path = tmp_path / 'edge_keys.json'
+    write_keys(path, {'alice': 'alice-token'})
+    client, forwarder, _ = make_edge_client(edge_keys=make_store(store_module, path))
+
+    response = client.post(
+        '/webhook',
+        headers={'Authorization': 'Bearer alice-token'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    assert response.status_code == 200
+    assert forwarder.calls[0]['edge_key_name'] == 'alice'
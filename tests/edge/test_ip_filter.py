@@ -0,0 +1,131 @@
+"""Per-adapter client IP filtering."""
+
+import pytest
+
+from edge_support import VALID_TOKEN
+from helpers import import_service_module
+
+
+@pytest.fixture
+def ip_filter_module():
+    return import_service_module('edge', 'services.ip_filter')
+
+
+def test_tree_matches_covering_networks_only(ip_filter_module):
+    tree = ip_filter_module.CidrTree(['10.0.0.0/8', '192.168.1.0/24', '2001:db8::/32', '203.0.113.9'])
+
+    def contains(address):
+        return ip_filter_module.ipaddress.ip_address(address) in tree
+
+    assert contains('10.200.3.4')
+    assert contains('192.168.1.255')
+    assert not contains('192.168.2.1')
+    assert contains('203.0.113.9')
+    assert not contains('203.0.113.10')
+    assert contains('2001:db8:1::1')
+    assert not contains('2001:db9::1')
+    # IPv4-mapped IPv6 addresses match their IPv4 networks.
+    assert contains('::ffff:10.1.1.1')
+
+
+def test_networks_inside_listed_ones_are_absorbed(ip_filter_module):
+    tree = ip_filter_module.CidrTree(['10.0.0.0/8', '10.1.0.0/16'])
+    assert len(tree) == 1
+
+    tree = ip_filter_module.CidrTree(['10.1.0.0/16', '10.0.0.0/8'])
+    assert ip_filter_module.ipaddress.ip_address('10.1.2.3') in tree
+    assert ip_filter_module.ipaddress.ip_address('10.9.2.3') in tree
+
+
+def test_deny_wins_over_allow(ip_filter_module):
+    ip_filter = ip_filter_module.IpFilter(
+        allow=ip_filter_module.CidrTree(['10.0.0.0/8']),
+        deny=ip_filter_module.CidrTree(['10.6.6.0/24']),
+    )
+
+    assert ip_filter.permits('10.1.1.1')
+    assert not ip_filter.permits('10.6.6.6')
+    assert not ip_filter.permits('172.16.0.1')
+    assert not ip_filter.permits('not-an-ip')
+
+
+def test_parse_cidrs_reads_files(ip_filter_module, tmp_path):
+    listing = tmp_path / 'deny.txt'
+    listing.write_text('# abusers\n198.51.100.0/24\n\n203.0.113.7  # one host\n', encoding='utf-8')
+
+    assert ip_filter_module.parse_cidrs(f'10.0.0.0/8, @{listing}') == [
+        '10.0.0.0/8',
+        '198.51.100.0/24',
+        '203.0.113.7',
+    ]
+
+
+def test_refused_clients_get_403_before_authentication(make_edge_client, ip_filter_module):
+    ip_filter = ip_filter_module.IpFilter(allow=ip_filter_module.CidrTree(['192.0.2.0/24']))
+    client, forwarder, log_json = make_edge_client(ip_filters={'native': ip_filter})
+
+    refused = client.post(
+        '/webhook',
+        headers={'Authorization': f'Bearer {VALID_TOKEN}', 'X-Real-IP': '198.51.100.1'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+    allowed = client.post(
+        '/webhook',
+        headers={'Authorization': f'Bearer {VALID_TOKEN}', 'X-Real-IP': '192.0.2.10'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    assert refused.status_code == 403
+    assert allowed.status_code == 200
+    assert len(forwarder.calls) == 1
+    assert [entry['client_ip'] for entry in log_json.entries if entry['message'] == 'Client IP not allowed'] == [
+        '198.51.100.1'
+    ]
+
+
+def test_filters_apply_per_adapter(make_edge_client, ip_filter_module):
+    ip_filter = ip_filter_module.IpFilter(deny=ip_filter_module.CidrTree(['0.0.0.0/0']))
+    client, _, _ = make_edge_client(ip_filters={'tailscale': ip_filter})
+
+    response = client.post(
+        '/webhook',
+        headers={'Authorization': f'Bearer {VALID_TOKEN}', 'X-Real-IP': '198.51.100.1'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+    assert response.status_code == 200
+
+    assert client.post('/tailscale', headers={'X-Real-IP': '198.51.100.1'}, data=b'{}').status_code == 403
+
+
+def test_real_ip_is_only_trusted_from_proxies(ip_filter_module):
+    proxies = ip_filter_module.CidrTree(['172.18.0.0/16'])
+
+    assert ip_filter_module.trusted_client_ip('127.0.0.1', '192.0.2.10') == '192.0.2.10'
+    assert ip_filter_module.trusted_client_ip('::1', '192.0.2.10') == '192.0.2.10'
+    assert ip_filter_module.trusted_client_ip('172.18.0.1', '192.0.2.10', proxies) == '192.0.2.10'
+    assert ip_filter_module.trusted_client_ip('172.19.0.5', '192.0.2.10', proxies) == '172.19.0.5'
+    assert ip_filter_module.trusted_client_ip('172.18.0.1', '', proxies) == '172.18.0.1'
+
+
+def test_spoofed_real_ip_from_untrusted_peer_is_ignored(make_edge_client, ip_filter_module):
+    ip_filter = ip_filter_module.IpFilter(allow=ip_filter_module.CidrTree(['192.0.2.0/24']))
+    client, forwarder, log_json = make_edge_client(
+        ip_filters={'native': ip_filter},
+        trusted_proxies=ip_filter_module.CidrTree(['172.18.0.0/16']),
+    )
+
+    def post(peer):
+        return client.post(
+            '/webhook',
+            headers={'Authorization': f'Bearer {VALID_TOKEN}', 'X-Real-IP': '192.0.2.10'},
+            json={'destination': 'wikimgr', 'payload': {}},
+            environ_base={'REMOTE_ADDR': peer},
+        )
+
+    # A container on the bridge network claiming an allowed address.
+    assert post('172.19.0.7').status_code == 403
+    assert post('172.18.0.1').status_code == 200
+    assert len(forwarder.calls) == 1
+    assert [entry['client_ip'] for entry in log_json.entries if entry['message'] == 'Client IP not allowed'] == [
+        '172.19.0.7'
+    ]
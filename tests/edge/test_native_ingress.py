@@ -206,10 +206,9 @@ def test_health_is_unauthenticated(make_edge_client):
 
 def test_oversized_body_is_rejected(make_edge_client):
     """
-    Pins pre-existing behaviour: MAX_CONTENT_LENGTH makes Werkzeug raise while
-    the body is being read, inside the adapter's broad except, so the native
-    path reports 400 rather than reaching the app's 413 handler. Preserved as
-    is for backward compatibility.
+    MAX_CONTENT_LENGTH makes Werkzeug raise while the body is being read; the
+    native path reports it as 413, like the tailscale path, rather than as
+    invalid JSON.
     """
     client, forwarder, _ = make_edge_client()
 
@@ -220,7 +219,7 @@ def test_oversized_body_is_rejected(make_edge_client):
         data=oversized,
     )
 
-    assert response.status_code == 400
+    assert response.status_code == 413
     assert forwarder.calls == []
 
 
@@ -0,0 +1,136 @@
+"""Priority lanes per adapter and edge key."""
+
+import threading
+import time
+
+import pytest
+
+from edge_support import OWNER, VALID_TOKEN, FakeForwarder
+from helpers import collecting_logger, import_service_module
+
+BULK_TOKEN = 'bulk-edge-token'
+BULK_OWNER = 'bulk-importer'
+
+
+@pytest.fixture
+def lanes_module():
+    return import_service_module('edge', 'services.priority_lanes')
+
+
+class GatedForwarder(FakeForwarder):
+    """Holds forwards for one destination until the gate opens."""
+
+    def __init__(self, gated_destination):
+        super().__init__()
+        self.gated_destination = gated_destination
+        self.gate = threading.Event()
+        self.gated_calls = threading.Semaphore(0)
+
+    def forward(self, body, correlation_id, edge_key_name, destination):
+        if destination == self.gated_destination:
+            self.gated_calls.release()
+            self.gate.wait(timeout=5)
+        return super().forward(body, correlation_id, edge_key_name, destination)
+
+
+def make_lanes(lanes_module, slots=None, log_json=None, stats_seconds=60):
+    return lanes_module.PriorityLanes(
+        slots if slots is not None else {'normal': 2, 'low': 1},
+        {'tailscale': 'high'},
+        {BULK_OWNER: 'low', 'tailscale': 'normal'},
+        log_json or collecting_logger(),
+        stats_seconds,
+    )
+
+
+def test_edge_key_priority_wins_over_adapter(lanes_module):
+    lanes = make_lanes(lanes_module)
+
+    assert lanes.lane_for('native', BULK_OWNER) == 'low'
+    assert lanes.lane_for('native', OWNER) == 'normal'
+    assert lanes.lane_for('tailscale', 'tailscale') == 'normal'
+    assert lanes.lane_for('tailscale', 'someone') == 'high'
+
+
+def test_full_lane_sheds_after_a_bounded_wait(lanes_module, monkeypatch):
+    monkeypatch.setattr(lanes_module, 'MAX_WAIT_SECONDS', 0.05)
+    lanes = make_lanes(lanes_module)
+    holding = threading.Event()
+    done = threading.Event()
+
+    def hold_low_slot():
+        with lanes.slot('low'):
+            holding.set()
+            done.wait(timeout=5)
+
+    holder = threading.Thread(target=hold_low_slot)
+    holder.start()
+    assert holding.wait(timeout=5)
+
+    try:
+        # The one allowed waiter times out; other lanes are unaffected.
+        with pytest.raises(lanes_module.LaneFull):
+            with lanes.slot('low'):
+                pass
+        with lanes.slot('high'):
+            pass
+    finally:
+        done.set()
+        holder.join(timeout=5)
+
+    stats = lanes.snapshot()
+    assert stats['low']['admitted'] == 1
+    assert stats['low']['shed'] == 1
+    assert stats['high']['admitted'] == 1
+
+
+def test_lane_stats_are_logged_and_reset(lanes_module):
+    log_json = collecting_logger()
+    lanes = make_lanes(lanes_module, log_json=log_json, stats_seconds=1)
+
+    with lanes.slot('normal'):
+        pass
+    lanes._next_stats = time.monotonic()  # pylint: disable=protected-access
+    with lanes.slot('high'):
+        pass
+
+    reports = [entry for entry in log_json.entries if entry['message'] == 'Lane stats']
+    assert [(entry['lane'], entry['admitted']) for entry in reports] == [('normal', 1)]
+    assert lanes.snapshot()['normal']['admitted'] == 0
+
+
+def test_low_priority_flood_does_not_block_other_keys(make_edge_client, lanes_module, monkeypatch):
+    monkeypatch.setattr(lanes_module, 'MAX_WAIT_SECONDS', 0.05)
+    forwarder = GatedForwarder('bulk')
+    client, _, log_json = make_edge_client(
+        forwarder,
+        edge_keys={VALID_TOKEN: OWNER, BULK_TOKEN: BULK_OWNER},
+        edge_key_priorities={BULK_OWNER: 'low'},
+        lane_slots={'low': 1},
+    )
+
+    def post(token, destination):
+        return client.post(
+            '/webhook',
+            headers={'Authorization': f'Bearer {token}'},
+            json={'destination': destination, 'payload': {}},
+        )
+
+    first = {}
+    flood = threading.Thread(target=lambda: first.update(response=post(BULK_TOKEN, 'bulk')))
+    flood.start()
+    assert forwarder.gated_calls.acquire(timeout=5)
+
+    try:
+        shed = post(BULK_TOKEN, 'bulk')
+        other = post(VALID_TOKEN, 'wikimgr')
+    finally:
+        forwarder.gate.set()
+        flood.join(timeout=5)
+
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == '1'
+    assert other.status_code == 200
+    assert first['response'].status_code == 200
+    shed_logs = [entry for entry in log_json.entries if entry['message'] == 'Shedding request from full priority lane']
+    assert [(entry['edge_key'], entry['lane']) for entry in shed_logs] == [(BULK_OWNER, 'low')]
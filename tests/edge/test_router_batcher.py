@@ -0,0 +1,128 @@
+"""Micro-batching of edge->router requests."""
+
+import threading
+import time
+
+import pytest
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+
+
+class FakeBatchForwarder:
+    """Records single and batched router calls."""
+
+    timeout = 5
+
+    def __init__(self, error=None):
+        self.ring = import_service_module('edge', 'services.router_ring').RouterRing(['http://router.test/ingest'])
+        self.single_calls = []
+        self.single_deadlines = []
+        self.batch_calls = []
+        self.error = error
+
+    def forward(self, body, correlation_id, edge_key_name, destination, deadline=None):
+        self.single_calls.append(correlation_id)
+        self.single_deadlines.append(deadline)
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(content=b'single')
+
+    def forward_batch(self, items, correlation_id, edge_key_name, deadline=None):
+        self.batch_calls.append(items)
+        if self.error is not None:
+            raise self.error
+        return [FakeResponse(content=item['correlation_id'].encode('utf-8')) for item in items]
+
+
+def make_batcher(forwarder, max_items=4, max_bytes=1024 * 1024, linger_ms=50):
+    module = import_service_module('edge', 'services.router_batcher')
+    return module.RouterBatcher(forwarder, max_items, max_bytes, linger_ms, collecting_logger())
+
+
+def forward_concurrently(batcher, count):
+    results = [None] * count
+    errors = [None] * count
+
+    def _call(index):
+        try:
+            results[index] = batcher.forward(
+                {'destination': 'wikimgr', 'payload': {'n': index}},
+                f'cid-{index}',
+                'trevor',
+                'wikimgr',
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            errors[index] = exc
+
+    threads = [threading.Thread(target=_call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    return results, errors
+
+
+def test_concurrent_forwards_share_one_batch():
+    forwarder = FakeBatchForwarder()
+    batcher = make_batcher(forwarder, max_items=4)
+
+    results, errors = forward_concurrently(batcher, 4)
+
+    assert errors == [None] * 4
+    assert len(forwarder.batch_calls) == 1
+    assert len(forwarder.batch_calls[0]) == 4
+    # Every caller gets its own item back, not a neighbour's.
+    assert [r.content for r in results] == [f'cid-{i}'.encode('utf-8') for i in range(4)]
+
+
+def test_lone_message_uses_the_single_endpoint():
+    forwarder = FakeBatchForwarder()
+    batcher = make_batcher(forwarder, linger_ms=1)
+
+    response = batcher.forward({'destination': 'wikimgr', 'payload': {}}, 'only', 'trevor', 'wikimgr')
+
+    assert response.content == b'single'
+    assert forwarder.single_calls == ['only']
+    assert forwarder.batch_calls == []
+
+
+def test_lone_message_keeps_its_deadline():
+    forwarder = FakeBatchForwarder()
+    batcher = make_batcher(forwarder, linger_ms=1)
+
+    queued_at = time.monotonic()
+    batcher.forward({'destination': 'wikimgr', 'payload': {}}, 'only', 'trevor', 'wikimgr')
+
+    # The budget started when the message was queued, not when it was flushed.
+    [deadline] = forwarder.single_deadlines
+    assert queued_at + forwarder.timeout <= deadline < queued_at + forwarder.timeout + 0.5
+
+
+def test_byte_limit_splits_batches():
+    forwarder = FakeBatchForwarder()
+    batcher = make_batcher(forwarder, max_items=10, max_bytes=1, linger_ms=1)
+
+    _, errors = forward_concurrently(batcher, 3)
+
+    assert errors == [None] * 3
+    # Each message alone exceeds the byte limit, so none are coalesced.
+    assert len(forwarder.single_calls) == 3
+    assert forwarder.batch_calls == []
+
+
+def test_batch_failure_reaches_every_caller():
+    router_forwarder = import_service_module('edge', 'services.router_forwarder')
+    forwarder = FakeBatchForwarder(error=router_forwarder.RouterUnavailableError('down'))
+    batcher = make_batcher(forwarder, max_items=2)
+
+    _, errors = forward_concurrently(batcher, 2)
+
+    assert all(isinstance(exc, router_forwarder.RouterUnavailableError) for exc in errors)
+
+
+def test_linger_is_capped():
+    batcher = make_batcher(FakeBatchForwarder(), linger_ms=10_000)
+    module = import_service_module('edge', 'services.router_batcher')
+
+    assert batcher.linger == pytest.approx(module.MAX_LINGER_MS / 1000.0)
@@ -6,6 +6,7 @@ Authorization: Bearer <ROUTER_INGRESS_KEY>, with the correlation ID attached.
 The Tailscale webhook secret must never leave the edge.
 """
 
+import gzip
 import json
 from unittest.mock import patch
 
@@ -13,7 +14,7 @@ import pytest
 from flask import Flask
 
 from edge_support import TAILSCALE_SECRET, VALID_TOKEN, sign
-from helpers import FakeResponse, collecting_logger, import_service_module
+from helpers import FakeResponse, collecting_logger, import_service_module, sent_json
 
 ROUTER_INGRESS_KEY = 'router-ingress-key'
 ROUTER_URL = 'http://router.test/ingest'
@@ -64,7 +65,29 @@ def test_native_ingress_uses_router_ingress_key(real_forwarder_client):
     assert args[0] == ROUTER_URL
     assert kwargs['headers']['Authorization'] == f'Bearer {ROUTER_INGRESS_KEY}'
     assert kwargs['headers']['X-Correlation-ID']
-    assert kwargs['json'] == {'destination': 'wikimgr', 'payload': {'a': 1}}
+    assert kwargs['headers']['X-Edge-Source'] == 'trevor'
+    assert sent_json(kwargs) == {'destination': 'wikimgr', 'payload': {'a': 1}}
+
+
+def test_schedule_fields_are_forwarded(real_forwarder_client):
+    client, mock_post = real_forwarder_client
+
+    client.post(
+        '/webhook',
+        headers={'Authorization': f'Bearer {VALID_TOKEN}'},
+        json={'destination': 'wikimgr', 'payload': {}, 'delay_seconds': 30},
+    )
+    client.post(
+        '/webhook',
+        headers={'Authorization': f'Bearer {VALID_TOKEN}'},
+        json={'destination': 'wikimgr', 'payload': {}, 'deliver_at': '2030-01-01T00:00:00Z'},
+    )
+
+    sent = [sent_json(call.kwargs) for call in mock_post.call_args_list]
+    assert sent == [
+        {'destination': 'wikimgr', 'payload': {}, 'delay_seconds': 30},
+        {'destination': 'wikimgr', 'payload': {}, 'deliver_at': '2030-01-01T00:00:00Z'},
+    ]
 
 
 def test_tailscale_ingress_uses_router_ingress_key(real_forwarder_client):
@@ -87,7 +110,7 @@ def test_tailscale_ingress_uses_router_ingress_key(real_forwarder_client):
 
     _, kwargs = mock_post.call_args
     assert kwargs['headers']['Authorization'] == f'Bearer {ROUTER_INGRESS_KEY}'
-    assert kwargs['json'] == {'destination': 'tailscale', 'payload': events}
+    assert sent_json(kwargs) == {'destination': 'tailscale', 'payload': events}
 
 
 def test_tailscale_secret_never_reaches_the_router(real_forwarder_client):
@@ -108,7 +131,7 @@ def test_tailscale_secret_never_reaches_the_router(real_forwarder_client):
     _, kwargs = mock_post.call_args
     serialized = json.dumps({
         'headers': kwargs['headers'],
-        'json': kwargs['json'],
+        'json': sent_json(kwargs),
     })
 
     assert TAILSCALE_SECRET not in serialized
@@ -126,3 +149,163 @@ def test_edge_key_is_not_forwarded_to_the_router(real_forwarder_client):
 
     _, kwargs = mock_post.call_args
     assert VALID_TOKEN not in json.dumps(kwargs['headers'])
+
+
+def test_remaining_budget_is_sent_to_the_router(real_forwarder_client, make_edge_config):
+    client, mock_post = real_forwarder_client
+    timeout = make_edge_config().request_timeout
+
+    client.post(
+        '/webhook',
+        headers={'Authorization': f'Bearer {VALID_TOKEN}'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    _, kwargs = mock_post.call_args
+    assert 0 < int(kwargs['headers']['X-Request-Deadline-Ms']) <= timeout * 1000
+    assert 0 < kwargs['timeout'] <= timeout
+
+
+def test_retry_is_skipped_when_budget_is_spent(make_edge_config):
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 0.5, collecting_logger()
+    )
+
+    with patch.object(router_forwarder_module.requests, 'post') as mock_post, \
+            patch.object(router_forwarder_module.time, 'sleep') as mock_sleep:
+        mock_post.side_effect = router_forwarder_module.requests.exceptions.ConnectionError('down')
+
+        with pytest.raises(router_forwarder_module.RouterUnavailableError):
+            forwarder.forward({'destination': 'wikimgr', 'payload': {}}, 'cid', 'trevor', 'wikimgr')
+
+    assert mock_post.call_count == 1
+    assert mock_sleep.call_count == 0
+
+
+def test_forward_batch_posts_to_batch_endpoint_and_splits_results():
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 5, collecting_logger()
+    )
+    router_reply = json.dumps({'results': [
+        {'index': 0, 'status': 201, 'content_type': 'application/json', 'body': {'ok': True}},
+        {'index': 1, 'status': 502, 'content_type': 'text/plain', 'text': 'bad gateway'},
+    ]}).encode('utf-8')
+
+    items = [
+        {'destination': 'wikimgr', 'payload': {}, 'correlation_id': 'a'},
+        {'destination': 'tailscale', 'payload': [], 'correlation_id': 'b'},
+    ]
+    with patch.object(router_forwarder_module.requests, 'post') as mock_post:
+        mock_post.return_value = FakeResponse(content=router_reply)
+        results = forwarder.forward_batch(items, 'batch-cid', 'trevor')
+
+    args, kwargs = mock_post.call_args
+    assert args[0] == ROUTER_URL + '/batch'
+    assert sent_json(kwargs) == {'items': items}
+    assert kwargs['headers']['Authorization'] == f'Bearer {ROUTER_INGRESS_KEY}'
+
+    assert [r.status_code for r in results] == [201, 502]
+    assert json.loads(results[0].content) == {'ok': True}
+    assert results[1].content == b'bad gateway'
+    assert results[1].headers['Content-Type'] == 'text/plain'
+
+
+def test_forward_batch_rejection_applies_to_every_item():
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 5, collecting_logger()
+    )
+    rejection = FakeResponse(content=b'{"error": "Unauthorized"}', status_code=401)
+
+    with patch.object(router_forwarder_module.requests, 'post', return_value=rejection):
+        results = forwarder.forward_batch(
+            [{'destination': 'a', 'payload': {}}, {'destination': 'b', 'payload': {}}],
+            'batch-cid',
+            'trevor',
+        )
+
+    assert [r.status_code for r in results] == [401, 401]
+
+
+def test_large_bodies_are_compressed_for_the_router():
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 5, collecting_logger(), compression='gzip', compression_min_bytes=200
+    )
+    small = {'destination': 'wikimgr', 'payload': {}}
+    large = {'destination': 'wikimgr', 'payload': {'text': 'x' * 500}}
+
+    with patch.object(router_forwarder_module.requests, 'post', return_value=FakeResponse()) as mock_post:
+        forwarder.forward(small, 'cid-1', 'trevor', 'wikimgr')
+        forwarder.forward(large, 'cid-2', 'trevor', 'wikimgr')
+
+    small_call, large_call = mock_post.call_args_list
+    assert sent_json(small_call.kwargs) == small
+    assert 'Content-Encoding' not in small_call.kwargs['headers']
+    assert large_call.kwargs['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(large_call.kwargs['data'])) == large
+
+
+def test_msgpack_frame_carries_request_context():
+    msgpack = pytest.importorskip('msgpack')
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 5, collecting_logger(), envelope_format='msgpack'
+    )
+    body = {'destination': 'wikimgr', 'payload': {'text': 'hello'}}
+
+    with patch.object(router_forwarder_module.requests, 'post', return_value=FakeResponse()) as mock_post:
+        forwarder.forward(body, 'cid-1', 'trevor', 'wikimgr')
+
+    kwargs = mock_post.call_args.kwargs
+    assert kwargs['headers'] == {
+        'Authorization': f'Bearer {ROUTER_INGRESS_KEY}',
+        'Content-Type': 'application/msgpack',
+    }
+    frame = msgpack.unpackb(kwargs['data'])
+    assert frame.pop('deadline_ms') <= 5000
+    assert frame == {**body, 'correlation_id': 'cid-1', 'source': 'trevor'}
+
+
+def test_router_rejecting_msgpack_switches_to_json():
+    pytest.importorskip('msgpack')
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    log_json = collecting_logger()
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 5, log_json, envelope_format='msgpack'
+    )
+    body = {'destination': 'wikimgr', 'payload': {}}
+
+    unsupported = FakeResponse(status_code=415)
+    unsupported.headers['X-Unsupported-Envelope'] = 'msgpack'
+
+    with patch.object(router_forwarder_module.requests, 'post') as mock_post:
+        mock_post.side_effect = [unsupported, FakeResponse(), FakeResponse()]
+        first = forwarder.forward(body, 'cid-1', 'trevor', 'wikimgr')
+        forwarder.forward(body, 'cid-2', 'trevor', 'wikimgr')
+
+    assert first.status_code == 200
+    assert [call.kwargs['headers']['Content-Type'] for call in mock_post.call_args_list] == [
+        'application/msgpack', 'application/json', 'application/json',
+    ]
+    assert [sent_json(call.kwargs) for call in mock_post.call_args_list[1:]] == [body, body]
+    assert forwarder.envelope_format == 'json'
+    assert any('falling back to JSON' in entry['message'] for entry in log_json.entries)
+
+
+def test_other_415s_keep_msgpack():
+    pytest.importorskip('msgpack')
+    router_forwarder_module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = router_forwarder_module.RouterForwarder(
+        ROUTER_URL, ROUTER_INGRESS_KEY, 5, collecting_logger(), envelope_format='msgpack'
+    )
+
+    # A router rejecting the Content-Encoding, not the envelope format.
+    with patch.object(router_forwarder_module.requests, 'post', return_value=FakeResponse(status_code=415)) as mock_post:
+        response = forwarder.forward({'destination': 'wikimgr', 'payload': {}}, 'cid-1', 'trevor', 'wikimgr')
+
+    assert response.status_code == 415
+    assert mock_post.call_count == 1
+    assert forwarder.envelope_format == 'msgpack'
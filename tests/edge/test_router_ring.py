@@ -0,0 +1,179 @@
+"""Spreading edge traffic over several routers."""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+
+ROUTERS = ['http://router-a.test/ingest', 'http://router-b.test/ingest', 'http://router-c.test/ingest']
+
+
+@pytest.fixture
+def ring_module():
+    return import_service_module('edge', 'services.router_ring')
+
+
+def make_forwarder(router_url, log_json=None):
+    module = import_service_module('edge', 'services.router_forwarder')
+    forwarder = module.RouterForwarder(router_url, 'router-key', 5, log_json or collecting_logger())
+    return module, forwarder
+
+
+def test_parse_router_urls_splits_and_trims(ring_module):
+    assert ring_module.parse_router_urls(' http://a/ingest , ,http://b/ingest ') == [
+        'http://a/ingest',
+        'http://b/ingest',
+    ]
+
+
+def test_each_key_keeps_its_router(ring_module):
+    ring = ring_module.RouterRing(ROUTERS)
+
+    owners = {f'dest-{n}': ring.candidates(f'dest-{n}')[0] for n in range(200)}
+
+    assert owners == {key: ring.candidates(key)[0] for key in owners}
+    # Every router owns a share of the destinations.
+    assert set(owners.values()) == set(ROUTERS)
+
+
+def test_removing_a_router_only_moves_its_own_keys(ring_module):
+    before = ring_module.RouterRing(ROUTERS)
+    after = ring_module.RouterRing(ROUTERS[:2])
+
+    for n in range(200):
+        owner = before.candidates(f'dest-{n}')[0]
+        if owner != ROUTERS[2]:
+            assert after.candidates(f'dest-{n}')[0] == owner
+
+
+def test_failing_router_is_ejected_then_readmitted(ring_module):
+    ring = ring_module.RouterRing(ROUTERS)
+    owner = ring.candidates('wikimgr')[0]
+
+    for _ in range(ring_module.FAILURE_THRESHOLD):
+        ring.record_failure(owner)
+
+    candidates = ring.candidates('wikimgr')
+    assert candidates[0] != owner
+    # Still tried as a last resort.
+    assert candidates[-1] == owner
+
+    ring.record_success(owner)
+    assert ring.candidates('wikimgr')[0] == owner
+
+
+def test_forwarder_fails_over_on_connection_error():
+    module, forwarder = make_forwarder(','.join(ROUTERS))
+    first, second = forwarder.ring.candidates('wikimgr')[:2]
+
+    def post(url, **kwargs):
+        if url == first:
+            raise requests.exceptions.ConnectionError('refused')
+        return FakeResponse()
+
+    with patch.object(module.requests, 'post', side_effect=post) as mock_post:
+        response = forwarder.forward({'destination': 'wikimgr', 'payload': {}}, 'cid', 'trevor', 'wikimgr')
+
+    assert response.status_code == 200
+    assert [call.args[0] for call in mock_post.call_args_list] == [first, second]
+
+
+def test_forwarder_does_not_fail_over_on_timeout():
+    module, forwarder = make_forwarder(','.join(ROUTERS))
+
+    with patch.object(module.requests, 'post', side_effect=requests.exceptions.Timeout()) as mock_post:
+        with pytest.raises(module.RouterTimeoutError):
+            forwarder.forward({'destination': 'wikimgr', 'payload': {}}, 'cid', 'trevor', 'wikimgr')
+
+    assert mock_post.call_count == 1
+
+
+def test_batches_go_to_the_chosen_routers_batch_endpoint():
+    module, forwarder = make_forwarder(','.join(ROUTERS))
+    router = forwarder.ring.candidates('a')[0]
+    items = [
+        {'correlation_id': 'c1', 'destination': 'a', 'payload': {}},
+        {'correlation_id': 'c2', 'destination': 'b', 'payload': {}},
+    ]
+    results = b'{"results": [{"status": 200, "body": {}}, {"status": 200, "body": {}}]}'
+
+    with patch.object(module.requests, 'post', return_value=FakeResponse(content=results)) as mock_post:
+        forwarder.forward_batch(items, 'batch', 'trevor')
+
+    assert mock_post.call_args.args[0] == router + '/batch'
+
+
+def test_batcher_sends_each_destination_to_its_own_router():
+    module, forwarder = make_forwarder(','.join(ROUTERS))
+    batcher = import_service_module('edge', 'services.router_batcher').RouterBatcher(
+        forwarder, 4, 1024 * 1024, 50, collecting_logger()
+    )
+    owners = {}
+    for n in range(50):
+        owners.setdefault(forwarder.ring.candidates(f'dest-{n}')[0], f'dest-{n}')
+    first, second = list(owners.values())[:2]
+    sent = {}
+
+    def post(url, data=None, **kwargs):
+        items = module.json_codec.loads(data)['items']
+        sent[url] = sorted(item['destination'] for item in items)
+        return FakeResponse(content=module.json_codec.dumps_bytes(
+            {'results': [{'status': 200, 'body': {}} for _ in items]}
+        ))
+
+    destinations = [first, second, first, second]
+    threads = [
+        threading.Thread(target=batcher.forward, args=({'destination': d, 'payload': {}}, f'c{i}', 'trevor', d))
+        for i, d in enumerate(destinations)
+    ]
+    with patch.object(module.requests, 'post', side_effect=post):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    # One batch per owning router, never mixing the two destinations.
+    assert sent == {
+        forwarder.ring.candidates(first)[0] + '/batch': [first, first],
+        forwarder.ring.candidates(second)[0] + '/batch': [second, second],
+    }
+
+
+def test_exhausted_deadline_does_not_mark_the_router_down():
+    module, forwarder = make_forwarder(','.join(ROUTERS))
+
+    ring_module = import_service_module('edge', 'services.router_ring')
+
+    with patch.object(module.requests, 'post') as mock_post:
+        for _ in range(ring_module.FAILURE_THRESHOLD):
+            with pytest.raises(module.RouterTimeoutError):
+                forwarder.forward({'destination': 'wikimgr', 'payload': {}}, 'cid', 'trevor', 'wikimgr',
+                                  deadline=module.time.monotonic() - 1)
+
+    assert not mock_post.called
+    assert all(forwarder.ring.snapshot().values())
+
+
+def test_health_url_replaces_ingest(ring_module):
+    assert ring_module.health_url('http://router.test:8081/ingest') == 'http://router.test:8081/health'
+    assert ring_module.health_url('http://router.test:8081/') == 'http://router.test:8081/health'
+
+
+def test_health_check_marks_unresponsive_routers(ring_module):
+    ring = ring_module.RouterRing(ROUTERS)
+    log_json = collecting_logger()
+    checker = ring_module.RouterHealthChecker(ring, 5, 1, log_json)
+
+    def get(url, **kwargs):
+        if url == 'http://router-b.test/health':
+            raise requests.exceptions.ConnectionError('down')
+        return FakeResponse()
+
+    with patch.object(ring_module.requests, 'get', side_effect=get):
+        checker.check_once()
+
+    assert ring.snapshot() == {ROUTERS[0]: True, ROUTERS[1]: False, ROUTERS[2]: True}
+    assert [entry['message'] for entry in log_json.entries] == ['Router health changed']
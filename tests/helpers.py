@@ -17,6 +17,7 @@ blueprint factories directly, which already take everything by injection.
 """
 
 import importlib
+import json
 import sys
 from datetime import timedelta
 from pathlib import Path
@@ -96,3 +97,8 @@ def collecting_logger():
 
     log_json.entries = entries
     return log_json
+
+
+def sent_json(request_kwargs):
+    """The JSON body a mocked requests call sent, decoded from its `data`."""
+    return json.loads(request_kwargs['data'])
@@ -0,0 +1,141 @@
+"""Load-balanced upstream pools."""
+
+from unittest.mock import patch
+
+import pytest
+import requests
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+from router_support import INGRESS_KEY
+
+URLS = ['http://a.internal/hook', 'http://b.internal/hook', 'http://c.internal/hook']
+
+
+@pytest.fixture
+def balancer():
+    return import_service_module('router', 'services.balancer')
+
+
+def test_round_robin_rotates(balancer):
+    pool = balancer.UpstreamPool(URLS, 'round_robin')
+
+    picked = []
+    for _ in range(6):
+        url = pool.acquire()
+        pool.release(url, 0.01, ok=True)
+        picked.append(url)
+
+    assert picked == URLS + URLS
+
+
+def test_least_outstanding_avoids_busy_replicas(balancer):
+    pool = balancer.UpstreamPool(URLS, 'least_outstanding')
+
+    first = pool.acquire()
+    second = pool.acquire()
+    third = pool.acquire()
+
+    assert len({first, second, third}) == 3
+
+
+def test_ewma_prefers_the_faster_replica(balancer):
+    pool = balancer.UpstreamPool(URLS[:2], 'ewma')
+    pool.release(pool.acquire(), 0.5, ok=True)   # a: slow
+    pool.release(pool.acquire(), 0.01, ok=True)  # b: fast (unmeasured, so picked next)
+
+    assert pool.acquire() == URLS[1]
+
+
+def test_repeated_failures_eject_a_replica(balancer):
+    pool = balancer.UpstreamPool(URLS[:2], 'round_robin')
+    for _ in range(balancer.FAILURE_THRESHOLD):
+        pool.acquire()
+        pool.release(URLS[0], 0.01, ok=False)
+
+    assert {pool.acquire() for _ in range(4)} == {URLS[1]}
+
+
+def test_health_check_marks_replica_down_and_up(balancer):
+    pool = balancer.UpstreamPool(URLS[:2], 'round_robin')
+
+    pool.mark_health(URLS[0], False)
+    assert {pool.acquire() for _ in range(4)} == {URLS[1]}
+
+    pool.mark_health(URLS[0], True)
+    assert URLS[0] in {pool.acquire() for _ in range(4)}
+
+
+def test_all_unhealthy_still_tries_someone(balancer):
+    pool = balancer.UpstreamPool(URLS[:2], 'round_robin')
+    for url in URLS[:2]:
+        pool.mark_health(url, False)
+
+    assert pool.acquire() in URLS[:2]
+
+
+def test_exclude_picks_another_replica(balancer):
+    pool = balancer.UpstreamPool(URLS[:2], 'round_robin')
+
+    assert pool.acquire(exclude=[URLS[0]]) == URLS[1]
+    assert pool.acquire(exclude=[URLS[0]]) == URLS[1]
+
+
+def test_ingest_spreads_requests_over_upstreams(router_modules):
+    route = {
+        'method': 'POST',
+        'url': URLS[0],
+        'upstreams': URLS,
+        'balancer': 'round_robin',
+        'auth_env': None,
+        'timeout_seconds': 5,
+    }
+    app = Flask(__name__)
+    app.register_blueprint(router_modules['routes'].create_router_blueprint(
+        {'slack.ingest': route}, INGRESS_KEY, collecting_logger()
+    ))
+    client = app.test_client()
+
+    with patch.object(router_modules['forwarder'].requests, 'request') as mock_request:
+        mock_request.return_value = FakeResponse()
+        for _ in range(3):
+            client.post(
+                '/ingest',
+                headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+                json={'destination': 'slack.ingest', 'payload': {}},
+            )
+
+    assert [call.kwargs['url'] for call in mock_request.call_args_list] == URLS
+
+
+def test_unreachable_replica_is_reported_to_the_pool(router_modules):
+    route = {
+        'method': 'POST',
+        'url': URLS[0],
+        'upstreams': URLS[:2],
+        'balancer': 'round_robin',
+        'auth_env': None,
+        'timeout_seconds': 5,
+    }
+    app = Flask(__name__)
+    app.register_blueprint(router_modules['routes'].create_router_blueprint(
+        {'svc': route}, INGRESS_KEY, collecting_logger()
+    ))
+    client = app.test_client()
+
+    def _request(method, url, **kwargs):
+        if url == URLS[0]:
+            raise requests.exceptions.ConnectionError('refused')
+        return FakeResponse()
+
+    with patch.object(router_modules['forwarder'].requests, 'request', side_effect=_request) as mock_request:
+        for _ in range(10):
+            client.post(
+                '/ingest',
+                headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+                json={'destination': 'svc', 'payload': {}},
+            )
+
+    calls_to_a = [c for c in mock_request.call_args_list if c.kwargs['url'] == URLS[0]]
+    balancer = import_service_module('router', 'services.balancer')
+    assert len(calls_to_a) == balancer.FAILURE_THRESHOLD
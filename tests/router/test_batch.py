@@ -0,0 +1,135 @@
+"""Router /ingest/batch behaviour."""
+
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+from router_support import INGRESS_KEY, ROUTES
+
+
+def auth(key=INGRESS_KEY):
+    return {'Authorization': f'Bearer {key}'}
+
+
+@pytest.fixture
+def mock_request(router_modules):
+    with patch.object(router_modules['forwarder'].requests, 'request') as mock:
+        mock.return_value = FakeResponse()
+        yield mock
+
+
+def test_each_item_is_delivered_and_reported_in_order(router_client, mock_request):
+    client, _ = router_client
+
+    response = client.post(
+        '/ingest/batch',
+        headers={**auth(), 'X-Correlation-ID': 'batch-1'},
+        json={'items': [
+            {'destination': 'wikimgr', 'payload': {'n': 1}},
+            {'destination': 'tailscale', 'payload': [{'n': 2}]},
+        ]},
+    )
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['index'] for r in results] == [0, 1]
+    assert [r['destination'] for r in results] == ['wikimgr', 'tailscale']
+    assert [r['status'] for r in results] == [200, 200]
+    assert results[0]['body'] == {'status': 'ok'}
+    assert results[0]['correlation_id'] == 'batch-1.0'
+
+    urls = sorted(call.kwargs['url'] for call in mock_request.call_args_list)
+    assert urls == sorted([ROUTES['wikimgr']['url'], ROUTES['tailscale']['url']])
+
+
+def test_item_failures_do_not_fail_the_batch(router_client, mock_request):
+    client, _ = router_client
+
+    response = client.post(
+        '/ingest/batch',
+        headers=auth(),
+        json={'items': [
+            {'destination': 'wikimgr', 'payload': {}},
+            {'destination': 'not-configured', 'payload': {}},
+            {'payload': {}},
+        ]},
+    )
+
+    assert response.status_code == 200
+    statuses = [r['status'] for r in response.get_json()['results']]
+    assert statuses == [200, 404, 400]
+    assert mock_request.call_count == 1
+
+
+def test_item_correlation_id_is_kept(router_client, mock_request):
+    client, _ = router_client
+
+    response = client.post(
+        '/ingest/batch',
+        headers=auth(),
+        json={'items': [{'destination': 'wikimgr', 'payload': {}, 'correlation_id': 'req-9'}]},
+    )
+
+    assert response.get_json()['results'][0]['correlation_id'] == 'req-9'
+    assert mock_request.call_args.kwargs['headers']['X-Correlation-ID'] == 'req-9'
+
+
+def test_non_json_item_response_is_carried_as_text(router_client, mock_request):
+    mock_request.return_value = FakeResponse(content=b'accepted', content_type='text/plain')
+    client, _ = router_client
+
+    response = client.post(
+        '/ingest/batch',
+        headers=auth(),
+        json={'items': [{'destination': 'wikimgr', 'payload': {}}]},
+    )
+
+    result = response.get_json()['results'][0]
+    assert result['text'] == 'accepted'
+    assert 'body' not in result
+
+
+def test_batch_requires_ingress_key(router_client, mock_request):
+    client, _ = router_client
+
+    response = client.post(
+        '/ingest/batch',
+        headers=auth('wrong-key'),
+        json={'items': [{'destination': 'wikimgr', 'payload': {}}]},
+    )
+
+    assert response.status_code == 401
+    assert mock_request.call_count == 0
+
+
+@pytest.mark.parametrize(
+    'body',
+    [{}, {'items': []}, {'items': {}}, [1, 2]],
+    ids=['no-items', 'empty', 'not-a-list', 'list-body'],
+)
+def test_invalid_batch_returns_400(router_client, mock_request, body):
+    client, _ = router_client
+
+    response = client.post('/ingest/batch', headers=auth(), json=body)
+
+    assert response.status_code == 400
+    assert mock_request.call_count == 0
+
+
+def test_oversized_batch_returns_413(router_modules, mock_request):
+    settings = import_service_module('router', 'config.settings')
+    app = Flask(__name__)
+    app.register_blueprint(router_modules['routes'].create_router_blueprint(
+        ROUTES, INGRESS_KEY, collecting_logger(), settings.RouterConfig(batch_max_items=2)
+    ))
+
+    response = app.test_client().post(
+        '/ingest/batch',
+        headers=auth(),
+        json={'items': [{'destination': 'wikimgr', 'payload': {}}] * 3},
+    )
+
+    assert response.status_code == 413
+    assert mock_request.call_count == 0
@@ -0,0 +1,103 @@
+"""Coalescing bursts of events into one delivery per window."""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module, sent_json
+from router_support import INGRESS_KEY
+
+
+@pytest.fixture
+def coalescer_module():
+    return import_service_module('router', 'services.coalescer')
+
+
+def recording_coalescer(coalescer_module):
+    delivered = []
+    done = threading.Event()
+
+    def deliver(destination, payload, correlation_id, source):
+        delivered.append((destination, payload, correlation_id))
+        done.set()
+
+    return coalescer_module.Coalescer(deliver, collecting_logger()), delivered, done
+
+
+def policy(mode='latest', window_ms=50, max_events=100):
+    return {'mode': mode, 'window_ms': window_ms, 'max_events': max_events}
+
+
+def test_latest_mode_delivers_only_the_last_event(coalescer_module):
+    coalescer, delivered, done = recording_coalescer(coalescer_module)
+
+    for n in range(5):
+        coalescer.add('tailscale', policy(), 'node-1', {'n': n}, f'cid-{n}', None)
+
+    assert done.wait(1)
+    assert delivered == [('tailscale', {'n': 4}, 'cid-0')]
+
+
+def test_list_mode_delivers_every_event_in_order(coalescer_module):
+    coalescer, delivered, done = recording_coalescer(coalescer_module)
+
+    for n in range(3):
+        coalescer.add('ci', policy(mode='list'), None, n, f'cid-{n}', None)
+
+    assert done.wait(1)
+    assert delivered == [('ci', [0, 1, 2], 'cid-0')]
+
+
+def test_keys_get_separate_windows(coalescer_module):
+    coalescer, delivered, _ = recording_coalescer(coalescer_module)
+
+    coalescer.add('tailscale', policy(), 'node-1', 'a', 'cid-a', None)
+    coalescer.add('tailscale', policy(), 'node-2', 'b', 'cid-b', None)
+    time.sleep(0.2)
+
+    assert sorted(payload for _, payload, _ in delivered) == ['a', 'b']
+
+
+def test_full_window_closes_early(coalescer_module):
+    coalescer, delivered, done = recording_coalescer(coalescer_module)
+
+    coalescer.add('ci', policy(mode='list', window_ms=60000, max_events=2), None, 1, 'cid-1', None)
+    coalescer.add('ci', policy(mode='list', window_ms=60000, max_events=2), None, 2, 'cid-2', None)
+
+    assert done.wait(1)
+    assert delivered == [('ci', [1, 2], 'cid-1')]
+
+
+def test_ingest_answers_202_and_delivers_once():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    forwarder = import_service_module('router', 'services.forwarder')
+    route = {
+        'method': 'POST',
+        'url': 'http://notifier.internal:9000/tailscale',
+        'auth_env': None,
+        'timeout_seconds': 10,
+        'coalesce': {'key': 'payload.node', 'window_ms': 50, 'mode': 'latest', 'max_events': 100},
+    }
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        {'tailscale': route}, INGRESS_KEY, collecting_logger()
+    ))
+    client = app.test_client()
+
+    with patch.object(forwarder.requests, 'request', return_value=FakeResponse()) as mock_request:
+        responses = [
+            client.post(
+                '/ingest',
+                headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+                json={'destination': 'tailscale', 'payload': {'node': 'n1', 'status': n}},
+            )
+            for n in range(5)
+        ]
+        time.sleep(0.3)
+
+    assert [r.status_code for r in responses] == [202] * 5
+    assert mock_request.call_count == 1
+    assert sent_json(mock_request.call_args.kwargs) == {'node': 'n1', 'status': 4}
@@ -0,0 +1,93 @@
+"""Compressed bodies on the edge->router and router->destination hops."""
+
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+
+from helpers import FakeResponse, collecting_logger, import_service_module, sent_json
+from router_support import INGRESS_KEY, ROUTES
+
+
+@pytest.fixture
+def compression():
+    return import_service_module('router', 'services.compression')
+
+
+def gzip_json(body):
+    return gzip.compress(json.dumps(body).encode('utf-8'))
+
+
+def test_decompress_stops_at_the_limit(compression):
+    bomb = gzip.compress(b'0' * (5 * 1024 * 1024))
+
+    assert compression.decompress(gzip.compress(b'hello'), 'gzip', 5) == b'hello'
+    with pytest.raises(compression.BodyTooLarge):
+        compression.decompress(bomb, 'gzip', 1024 * 1024)
+
+
+def test_decompress_rejects_corrupt_and_unknown_bodies(compression):
+    with pytest.raises(compression.DecompressionError):
+        compression.decompress(gzip.compress(b'hello')[:-12], 'gzip', 1024)
+    with pytest.raises(compression.UnsupportedEncoding):
+        compression.decompress(b'hello', 'br', 1024)
+    assert compression.decompress(b'hello', None, 1024) == b'hello'
+
+
+def test_zstd_round_trip(compression):
+    pytest.importorskip('zstandard')
+
+    encoded = compression.compress(b'{"a": 1}' * 100, 'zstd')
+    assert compression.decompress(encoded, 'zstd', 1024) == b'{"a": 1}' * 100
+
+
+def test_ingest_accepts_gzip_bodies(router_client, router_modules):
+    client, _ = router_client
+    envelope = {'destination': 'wikimgr', 'payload': {'text': 'x' * 2000}}
+
+    with patch.object(router_modules['forwarder'].requests, 'request', return_value=FakeResponse()) as mock_request:
+        response = client.post(
+            '/ingest',
+            data=gzip_json(envelope),
+            headers={'Authorization': f'Bearer {INGRESS_KEY}', 'Content-Encoding': 'gzip'},
+        )
+
+    assert response.status_code == 200
+    assert sent_json(mock_request.call_args.kwargs) == envelope['payload']
+
+
+@pytest.mark.parametrize(
+    ('data', 'encoding', 'status'),
+    [
+        (gzip.compress(b' ' * (11 * 1024 * 1024)), 'gzip', 413),
+        (b'not gzip', 'gzip', 400),
+        (b'{}', 'br', 415),
+    ],
+    ids=['bomb', 'corrupt', 'unsupported'],
+)
+def test_ingest_rejects_unusable_bodies(router_client, data, encoding, status):
+    client, _ = router_client
+
+    response = client.post(
+        '/ingest',
+        data=data,
+        headers={'Authorization': f'Bearer {INGRESS_KEY}', 'Content-Encoding': encoding},
+    )
+
+    assert response.status_code == status
+
+
+def test_routes_compress_bodies_above_the_threshold():
+    forwarder = import_service_module('router', 'services.forwarder')
+    route_config = {**ROUTES['wikimgr'], 'compression': {'encoding': 'gzip', 'min_bytes': 100}}
+
+    with patch.object(forwarder.requests, 'request', return_value=FakeResponse()) as mock_request:
+        forwarder.forward_to_destination('wikimgr', route_config, {'a': 1}, 'cid-1', collecting_logger())
+        forwarder.forward_to_destination('wikimgr', route_config, {'a': 'x' * 200}, 'cid-2', collecting_logger())
+
+    small, large = mock_request.call_args_list
+    assert sent_json(small.kwargs) == {'a': 1}
+    assert 'Content-Encoding' not in small.kwargs['headers']
+    assert large.kwargs['headers']['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(large.kwargs['data'])) == {'a': 'x' * 200}
@@ -0,0 +1,295 @@
+"""Durable and delayed delivery: the SQLite queue, its workers, and the admin endpoints."""
+
+import base64
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+from helpers import REPO_ROOT, collecting_logger, import_service_module
+from router_support import INGRESS_KEY
+
+AUTH = {'Authorization': f'Bearer {INGRESS_KEY}'}
+# Runs a native webhook through the real edge, with requests.post captured, and
+# prints the router request it produced. A separate interpreter, because the
+# edge and router modules cannot be imported side by side.
+EDGE_SCRIPT = """
+import base64, json, sys
+from unittest.mock import patch
+
+sys.path.insert(0, sys.argv[1])
+from flask import Flask
+
+from config.settings import EdgeConfig
+from http_handlers.webhook import create_edge_blueprint
+from services import router_forwarder
+
+
+class Response:
+    status_code = 202
+    content = b'{}'
+    headers = {'Content-Type': 'application/json'}
+
+
+config = EdgeConfig(
+    router_url='http://router.test/ingest', router_ingress_key=sys.argv[2], request_timeout=5,
+    max_body_size_mb=1, rate_limit_per_minute=100, edge_keys={'edge-token': 'trevor'},
+)
+forwarder = router_forwarder.RouterForwarder(config.router_url, config.router_ingress_key, 5, lambda *a, **k: None)
+app = Flask(__name__)
+app.register_blueprint(create_edge_blueprint(config, forwarder, lambda *a, **k: None))
+
+with patch.object(router_forwarder.requests, 'post', return_value=Response()) as post:
+    app.test_client().post(
+        '/webhook', headers={'Authorization': 'Bearer edge-token'}, data=sys.stdin.buffer.read(),
+        content_type='application/json',
+    )
+
+kwargs = post.call_args.kwargs
+print(json.dumps({'headers': kwargs['headers'], 'data': base64.b64encode(kwargs['data']).decode()}))
+"""
+
+ROUTE = {
+    'method': 'POST',
+    'url': 'http://wikimgr.internal:8000/append',
+    'auth_env': None,
+    'timeout_seconds': 10,
+    'delivery': 'durable',
+}
+
+
+@pytest.fixture
+def queue_module():
+    return import_service_module('router', 'services.delivery_queue')
+
+
+@pytest.fixture
+def result_cls():
+    return import_service_module('router', 'services.delivery').DeliveryResult
+
+
+@pytest.fixture
+def queue(queue_module, tmp_path):
+    return queue_module.DeliveryQueue(str(tmp_path / 'queue.db'))
+
+
+def durable_delivery(queue_module, queue, statuses, result_cls, max_attempts=3):
+    """A DurableDelivery whose deliveries answer with `statuses` in turn, without backoff waits."""
+    durable = queue_module.DurableDelivery(
+        queue, {'wikimgr': ROUTE}, collecting_logger(),
+        workers=1, max_attempts=max_attempts, backoff_base_seconds=0,
+    )
+    answers = iter(statuses)
+    durable.set_delivery(lambda destination, payload, correlation_id: result_cls(next(answers), b'{}'))
+    return durable
+
+
+def test_claimed_messages_are_leased(queue):
+    queue.enqueue('wikimgr', {'n': 1}, 'cid-1')
+
+    claimed = queue.claim(10, lease_seconds=60)
+
+    assert [(m.destination, m.payload, m.correlation_id) for m in claimed] == [('wikimgr', {'n': 1}, 'cid-1')]
+    assert queue.claim(10, lease_seconds=60) == []
+
+
+def test_success_removes_the_message(queue_module, queue, result_cls):
+    queue.enqueue('wikimgr', {}, 'cid')
+    durable = durable_delivery(queue_module, queue, [200], result_cls)
+
+    assert durable.drain_once() == 1
+    assert queue.counts() == {'pending': 0, 'dead': 0}
+
+
+def test_failures_retry_then_dead_letter(queue_module, queue, result_cls):
+    queue.enqueue('wikimgr', {}, 'cid')
+    durable = durable_delivery(queue_module, queue, [502, 503, 504], result_cls)
+
+    for _ in range(3):
+        assert durable.drain_once() == 1
+
+    dead = queue.list('dead')
+    assert queue.counts() == {'pending': 0, 'dead': 1}
+    assert dead[0]['attempts'] == 3
+    assert dead[0]['last_error'].startswith('HTTP 504')
+
+
+def test_client_errors_dead_letter_at_once(queue_module, queue, result_cls):
+    queue.enqueue('wikimgr', {}, 'cid')
+    durable = durable_delivery(queue_module, queue, [400], result_cls)
+
+    durable.drain_once()
+
+    assert queue.counts() == {'pending': 0, 'dead': 1}
+
+
+def test_failing_destination_is_paused(queue_module, queue, result_cls):
+    queue.enqueue('wikimgr', {}, 'cid-1')
+    queue.enqueue('wikimgr', {}, 'cid-2')
+    durable = durable_delivery(queue_module, queue, [503], result_cls)
+    durable.backoff_base_seconds = 60
+
+    assert durable.drain_once() == 1
+    assert durable.drain_once() == 0
+    assert queue.counts() == {'pending': 2, 'dead': 0}
+
+
+def test_ingest_queues_durable_routes_and_admin_requeues(queue_module, queue):
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    admin_module = import_service_module('router', 'http_handlers.queue_admin')
+    log_json = collecting_logger()
+    durable = queue_module.DurableDelivery(queue, {'wikimgr': ROUTE}, log_json)
+
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        {'wikimgr': ROUTE}, INGRESS_KEY, log_json, durable=durable
+    ))
+    app.register_blueprint(admin_module.create_queue_admin_blueprint(queue, INGRESS_KEY, log_json))
+    client = app.test_client()
+
+    response = client.post('/ingest', headers=AUTH, json={'destination': 'wikimgr', 'payload': {'n': 1}})
+    assert response.status_code == 202
+    message_id = response.get_json()['message_id']
+
+    [message] = queue.claim(1, lease_seconds=60)
+    queue.dead_letter(message.id, 1, 'HTTP 503: down')
+
+    assert client.get('/admin/queue').status_code == 401
+    listed = client.get('/admin/queue/messages?state=dead', headers=AUTH).get_json()
+    assert [m['id'] for m in listed['messages']] == [message_id]
+
+    assert client.post('/admin/queue/requeue', headers=AUTH, json={'ids': [message_id]}).get_json() == {
+        'requeued': 1
+    }
+    assert client.post('/admin/queue/purge', headers=AUTH, json={'state': 'pending'}).get_json() == {
+        'purged': 1
+    }
+    assert client.get('/admin/queue', headers=AUTH).get_json() == {'pending': 0, 'dead': 0}
+
+
+def test_durable_route_without_queue_is_rejected():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+
+    with pytest.raises(ValueError):
+        routes_module.create_router_blueprint({'wikimgr': ROUTE}, INGRESS_KEY, collecting_logger())
+
+
+def test_schedule_fields_are_parsed():
+    schedule = import_service_module('router', 'services.schedule')
+
+    assert schedule.parse_schedule({}, 3600) is None
+    assert schedule.parse_schedule({'deliver_at': '2001-01-01T00:00:00Z'}, 3600) == pytest.approx(time.time(), abs=1)
+    assert schedule.parse_schedule({'delay_seconds': 30}, 3600) == pytest.approx(time.time() + 30, abs=1)
+
+    for envelope in (
+        {'delay_seconds': -1},
+        {'delay_seconds': 7200},
+        {'deliver_at': '2030-01-01T00:00:00'},
+        {'delay_seconds': 1, 'deliver_at': 0},
+        {'delay_seconds': float('nan')},
+        {'delay_seconds': float('inf')},
+        {'deliver_at': float('nan')},
+        {'deliver_at': float('-inf')},
+    ):
+        with pytest.raises(schedule.ScheduleError):
+            schedule.parse_schedule(envelope, 3600)
+
+
+def delays_enabled():
+    return import_service_module('router', 'config.settings').RouterConfig(delayed_delivery=True)
+
+
+def test_delays_are_refused_unless_enabled(queue_module, queue):
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    routes = {'wikimgr': {**ROUTE, 'delivery': 'direct'}}
+    durable = queue_module.DurableDelivery(queue, routes, collecting_logger())
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        routes, INGRESS_KEY, collecting_logger(), durable=durable
+    ))
+
+    response = app.test_client().post(
+        '/ingest', headers=AUTH, json={'destination': 'wikimgr', 'payload': {}, 'delay_seconds': 60},
+    )
+
+    assert response.status_code == 400
+    assert queue.counts() == {'pending': 0, 'dead': 0}
+    with pytest.raises(ValueError, match='Delayed delivery needs a delivery queue'):
+        routes_module.create_router_blueprint(routes, INGRESS_KEY, collecting_logger(), delays_enabled())
+
+
+def test_delayed_envelopes_wait_in_the_queue(queue_module, queue):
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    route = {**ROUTE, 'delivery': 'direct'}
+    durable = queue_module.DurableDelivery(queue, {'wikimgr': route}, collecting_logger())
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        {'wikimgr': route}, INGRESS_KEY, collecting_logger(), delays_enabled(), durable=durable
+    ))
+
+    response = app.test_client().post(
+        '/ingest', headers=AUTH, json={'destination': 'wikimgr', 'payload': {}, 'delay_seconds': 60},
+    )
+
+    assert response.status_code == 202
+    assert response.get_json()['status'] == 'scheduled'
+    assert queue.counts() == {'pending': 1, 'dead': 0}
+    assert queue.claim(10, lease_seconds=60) == []
+
+
+@pytest.mark.parametrize('feature', [
+    {'ordering': {'key': 'payload.id'}},
+    {'coalesce': {'window_ms': 100, 'mode': 'latest', 'max_events': 100}},
+    {'cache': {'ttl_seconds': 60, 'max_entries': 10, 'max_bytes': 1024}},
+])
+def test_delays_are_refused_where_the_queue_would_skip_route_features(queue_module, queue, feature):
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    routes = {'wikimgr': {**ROUTE, 'delivery': 'direct', **feature}}
+    durable = queue_module.DurableDelivery(queue, routes, collecting_logger())
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        routes, INGRESS_KEY, collecting_logger(), delays_enabled(), durable=durable
+    ))
+
+    response = app.test_client().post(
+        '/ingest', headers=AUTH, json={'destination': 'wikimgr', 'payload': {'id': 1}, 'delay_seconds': 60},
+    )
+
+    assert response.status_code == 400
+    assert 'not supported' in response.get_json()['error']
+    assert queue.counts() == {'pending': 0, 'dead': 0}
+
+
+def test_edge_forwards_delays_to_the_router_schedule(queue_module, queue, monkeypatch):
+    envelope = {'destination': 'wikimgr', 'payload': {'n': 1}, 'delay_seconds': 60}
+    edge = subprocess.run(
+        [sys.executable, '-c', EDGE_SCRIPT, str(REPO_ROOT / 'edge'), INGRESS_KEY],
+        input=json.dumps(envelope).encode('utf-8'), capture_output=True, check=True,
+    )
+    sent = json.loads(edge.stdout)
+
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    schedules = []
+    parse_schedule = routes_module.parse_schedule
+
+    def recording_parse_schedule(envelope, max_delay_seconds):
+        schedules.append(envelope)
+        return parse_schedule(envelope, max_delay_seconds)
+
+    monkeypatch.setattr(routes_module, 'parse_schedule', recording_parse_schedule)
+    route = {**ROUTE, 'delivery': 'direct'}
+    durable = queue_module.DurableDelivery(queue, {'wikimgr': route}, collecting_logger())
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        {'wikimgr': route}, INGRESS_KEY, collecting_logger(), delays_enabled(), durable=durable
+    ))
+
+    response = app.test_client().post('/ingest', headers=sent['headers'], data=base64.b64decode(sent['data']))
+
+    assert schedules == [{'destination': 'wikimgr', 'payload': {'n': 1}, 'delay_seconds': 60}]
+    assert response.status_code == 202
+    assert response.get_json()['status'] == 'scheduled'
+    assert queue.counts() == {'pending': 1, 'dead': 0}
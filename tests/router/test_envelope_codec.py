@@ -0,0 +1,80 @@
+"""MessagePack envelopes on /ingest and /ingest/batch."""
+
+from unittest.mock import patch
+
+import pytest
+
+from helpers import FakeResponse, import_service_module, sent_json
+from router_support import INGRESS_KEY, ROUTES
+
+msgpack = pytest.importorskip('msgpack')
+
+HEADERS = {'Authorization': f'Bearer {INGRESS_KEY}', 'Content-Type': 'application/msgpack'}
+
+
+@pytest.fixture
+def mock_request(router_modules):
+    with patch.object(router_modules['forwarder'].requests, 'request', return_value=FakeResponse()) as mock:
+        yield mock
+
+
+def test_frame_carries_envelope_and_request_context(router_client, mock_request):
+    client, log_json = router_client
+    frame = {
+        'destination': 'wikimgr',
+        'payload': {'text': 'hello', 'count': 2},
+        'correlation_id': 'frame-cid',
+        'source': 'trevor',
+        'deadline_ms': 3000,
+    }
+
+    response = client.post('/ingest', headers=HEADERS, data=msgpack.packb(frame))
+
+    assert response.status_code == 200
+    kwargs = mock_request.call_args.kwargs
+    assert kwargs['url'] == ROUTES['wikimgr']['url']
+    assert sent_json(kwargs) == {'text': 'hello', 'count': 2}
+    assert kwargs['headers']['X-Correlation-ID'] == 'frame-cid'
+    # The frame's budget caps the route's 10s timeout.
+    assert kwargs['timeout'] <= 3
+    assert any(entry['correlation_id'] == 'frame-cid' for entry in log_json.entries)
+
+
+def test_batch_frame_is_delivered_item_by_item(router_client, mock_request):
+    client, _ = router_client
+    frame = {
+        'items': [
+            {'destination': 'wikimgr', 'payload': {'n': 1}, 'correlation_id': 'a'},
+            {'destination': 'tailscale', 'payload': [{'n': 2}], 'correlation_id': 'b'},
+        ],
+        'correlation_id': 'batch-cid',
+        'source': 'batch',
+        'deadline_ms': 5000,
+    }
+
+    response = client.post('/ingest/batch', headers=HEADERS, data=msgpack.packb(frame))
+
+    assert response.status_code == 200
+    assert [entry['status'] for entry in response.get_json()['results']] == [200, 200]
+    assert sorted(call.kwargs['headers']['X-Correlation-ID'] for call in mock_request.call_args_list) == ['a', 'b']
+
+
+def test_malformed_frame_returns_400(router_client, mock_request):
+    client, _ = router_client
+
+    response = client.post('/ingest', headers=HEADERS, data=b'\xc1')
+
+    assert response.status_code == 400
+    mock_request.assert_not_called()
+
+
+def test_router_without_msgpack_returns_415(router_client, mock_request):
+    client, _ = router_client
+    codec = import_service_module('router', 'services.envelope_codec')
+
+    with patch.object(codec, 'msgpack', None):
+        response = client.post('/ingest', headers=HEADERS, data=msgpack.packb({'destination': 'wikimgr'}))
+
+    assert response.status_code == 415
+    assert response.headers['X-Unsupported-Envelope'] == 'msgpack'
+
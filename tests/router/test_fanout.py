@@ -0,0 +1,124 @@
+"""Fan-out routes: one envelope, several targets, one aggregated answer."""
+
+from unittest.mock import patch
+
+import pytest
+import requests
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger
+from router_support import INGRESS_KEY
+
+
+def fanout_route(aggregate='all', quorum=None, count=3):
+    return {
+        'method': 'POST',
+        'auth_env': None,
+        'timeout_seconds': 5,
+        'aggregate': aggregate,
+        'quorum': quorum,
+        'targets': [
+            {
+                'name': f't{i}',
+                'url': f'http://t{i}.internal/hook',
+                'method': 'POST',
+                'auth_env': None,
+                'timeout_seconds': 5,
+            }
+            for i in range(count)
+        ],
+    }
+
+
+@pytest.fixture
+def make_client(router_modules):
+    def _make(route):
+        log_json = collecting_logger()
+        app = Flask(__name__)
+        app.register_blueprint(router_modules['routes'].create_router_blueprint(
+            {'events': route}, INGRESS_KEY, log_json
+        ))
+        return app.test_client(), log_json
+
+    return _make
+
+
+def respond_by_url(statuses):
+    """Answer each target URL with its configured status, or a connection error."""
+    def _request(method, url, **kwargs):
+        status = statuses[url]
+        if status is None:
+            raise requests.exceptions.ConnectionError('refused')
+        return FakeResponse(status_code=status)
+
+    return _request
+
+
+def post(client, correlation_id='fan-1'):
+    return client.post(
+        '/ingest',
+        headers={'Authorization': f'Bearer {INGRESS_KEY}', 'X-Correlation-ID': correlation_id},
+        json={'destination': 'events', 'payload': {'event': 'push'}},
+    )
+
+
+def test_all_policy_delivers_to_every_target(router_modules, make_client):
+    client, log_json = make_client(fanout_route('all'))
+    statuses = {f'http://t{i}.internal/hook': 200 for i in range(3)}
+
+    with patch.object(router_modules['forwarder'].requests, 'request',
+                      side_effect=respond_by_url(statuses)) as mock_request:
+        response = post(client)
+
+    assert response.status_code == 200
+    assert mock_request.call_count == 3
+    body = response.get_json()
+    assert body['succeeded'] == 3
+    assert [t['status'] for t in body['targets']] == [200, 200, 200]
+
+    # Every target's outcome is logged under the one correlation ID.
+    target_logs = [e for e in log_json.entries if e['message'] == 'Fan-out target responded']
+    assert sorted(e['target'] for e in target_logs) == ['t0', 't1', 't2']
+    assert {e['correlation_id'] for e in target_logs} == {'fan-1'}
+
+
+def test_all_policy_fails_when_any_target_fails(router_modules, make_client):
+    client, _ = make_client(fanout_route('all'))
+    statuses = {'http://t0.internal/hook': 200, 'http://t1.internal/hook': None,
+                'http://t2.internal/hook': 200}
+
+    with patch.object(router_modules['forwarder'].requests, 'request',
+                      side_effect=respond_by_url(statuses)):
+        response = post(client)
+
+    assert response.status_code == 502
+    assert response.get_json()['error'] == 'Bad gateway - fan-out policy not met'
+
+
+def test_first_policy_succeeds_with_one_success(router_modules, make_client):
+    client, _ = make_client(fanout_route('first'))
+    statuses = {'http://t0.internal/hook': 500, 'http://t1.internal/hook': None,
+                'http://t2.internal/hook': 200}
+
+    with patch.object(router_modules['forwarder'].requests, 'request',
+                      side_effect=respond_by_url(statuses)):
+        response = post(client)
+
+    assert response.status_code == 200
+    assert response.get_json()['succeeded'] >= 1
+
+
+@pytest.mark.parametrize(
+    'target_statuses,expected',
+    [([200, 200, 500], 200), ([200, 500, 500], 502)],
+    ids=['quorum-met', 'quorum-missed'],
+)
+def test_quorum_policy(router_modules, make_client, target_statuses, expected):
+    client, _ = make_client(fanout_route('quorum', quorum=2))
+    statuses = {f'http://t{i}.internal/hook': s for i, s in enumerate(target_statuses)}
+
+    with patch.object(router_modules['forwarder'].requests, 'request',
+                      side_effect=respond_by_url(statuses)):
+        response = post(client)
+
+    assert response.status_code == expected
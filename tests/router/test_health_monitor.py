@@ -0,0 +1,151 @@
+"""Background destination health checks."""
+
+from unittest.mock import patch
+
+import pytest
+import requests
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+from router_support import INGRESS_KEY
+
+ROUTES = {
+    'wikimgr': {
+        'method': 'POST',
+        'url': 'http://wikimgr.internal:8000/append',
+        'health_url': 'http://wikimgr.internal:8000/health',
+        'auth_env': None,
+        'timeout_seconds': 10,
+    },
+    'slack.ingest': {
+        'method': 'POST',
+        'url': 'http://a.internal/ingest',
+        'upstreams': ['http://a.internal/ingest', 'http://b.internal/ingest'],
+        'balancer': 'round_robin',
+        'auth_env': None,
+        'timeout_seconds': 10,
+    },
+}
+
+
+@pytest.fixture
+def health_monitor_module():
+    return import_service_module('router', 'services.health_monitor')
+
+
+def answer(statuses):
+    def _get(url, **kwargs):
+        status = statuses[url]
+        if status is None:
+            raise requests.exceptions.ConnectionError('refused')
+        return FakeResponse(status_code=status)
+
+    return _get
+
+
+def test_probes_cover_health_url_and_each_upstream(health_monitor_module):
+    probes = health_monitor_module.build_probes(ROUTES)
+
+    assert [(p.destination, p.url, p.strict) for p in probes] == [
+        ('wikimgr', 'http://wikimgr.internal:8000/health', True),
+        ('slack.ingest', 'http://a.internal/ingest', False),
+        ('slack.ingest', 'http://b.internal/ingest', False),
+    ]
+
+
+def test_upstream_health_url_speaks_for_each_replica(health_monitor_module):
+    replicas = ['http://a.internal/ingest', 'http://b.internal/ingest']
+    routes = {
+        'relative': {**ROUTES['slack.ingest'], 'health_url': '/healthz'},
+        'absolute': {**ROUTES['slack.ingest'], 'health_url': 'http://lb.internal/health'},
+    }
+
+    probes = health_monitor_module.build_probes(routes)
+
+    assert [(p.destination, p.url, p.replicas) for p in probes] == [
+        ('relative', 'http://a.internal/healthz', (replicas[0],)),
+        ('relative', 'http://b.internal/healthz', (replicas[1],)),
+        ('absolute', 'http://lb.internal/health', tuple(replicas)),
+    ]
+
+    monitor = health_monitor_module.HealthMonitor(routes, collecting_logger(), 30)
+    heard = []
+    monitor.add_listener(lambda destination, url, healthy: heard.append((destination, url, healthy)))
+    statuses = {'http://a.internal/healthz': 503, 'http://b.internal/healthz': 200, 'http://lb.internal/health': 503}
+    with patch.object(health_monitor_module.requests, 'get', side_effect=answer(statuses)):
+        monitor.check_now()
+
+    assert sorted(heard) == [
+        ('absolute', replicas[0], False),
+        ('absolute', replicas[1], False),
+        ('relative', replicas[0], False),
+        ('relative', replicas[1], True),
+    ]
+
+
+def test_snapshot_reflects_probe_results(health_monitor_module):
+    monitor = health_monitor_module.HealthMonitor(ROUTES, collecting_logger(), 30)
+    assert monitor.snapshot()['wikimgr']['healthy'] is None
+
+    statuses = {
+        'http://wikimgr.internal:8000/health': 503,
+        # A delivery URL answering 405 to GET is still up.
+        'http://a.internal/ingest': 405,
+        'http://b.internal/ingest': None,
+    }
+    with patch.object(health_monitor_module.requests, 'get', side_effect=answer(statuses)):
+        monitor.check_now()
+
+    table = monitor.snapshot()
+    assert table['wikimgr']['healthy'] is False
+    assert table['slack.ingest']['healthy'] is True
+    assert [p['healthy'] for p in table['slack.ingest']['probes']] == [True, False]
+    assert table['slack.ingest']['probes'][1]['error'] == 'ConnectionError'
+
+
+def test_unexpected_probe_error_is_logged_and_released(health_monitor_module):
+    log_json = collecting_logger()
+    monitor = health_monitor_module.HealthMonitor(ROUTES, log_json, 30)
+    probe = monitor._probes[0]  # pylint: disable=protected-access
+    monitor._in_flight.add(probe)  # pylint: disable=protected-access
+
+    with patch.object(health_monitor_module.requests, 'get', side_effect=RuntimeError('boom')):
+        monitor._check(probe)  # pylint: disable=protected-access
+
+    assert probe not in monitor._in_flight  # pylint: disable=protected-access
+    failures = [entry for entry in log_json.entries if entry['message'] == 'Health probe failed']
+    assert [(entry['url'], entry['error']) for entry in failures] == [(probe.url, 'RuntimeError: boom')]
+
+
+def test_health_endpoint_serves_cached_table_and_steers_pools(router_modules, health_monitor_module):
+    log_json = collecting_logger()
+    monitor = health_monitor_module.HealthMonitor(ROUTES, log_json, 30)
+
+    app = Flask(__name__)
+    app.register_blueprint(router_modules['routes'].create_router_blueprint(
+        ROUTES, INGRESS_KEY, log_json, health_monitor=monitor
+    ))
+    client = app.test_client()
+
+    statuses = {
+        'http://wikimgr.internal:8000/health': 200,
+        'http://a.internal/ingest': None,
+        'http://b.internal/ingest': 200,
+    }
+    with patch.object(health_monitor_module.requests, 'get', side_effect=answer(statuses)):
+        monitor.check_now()
+
+    health = client.get('/health').get_json()
+    assert health['checks']['wikimgr']['healthy'] is True
+    assert health['checks']['slack.ingest']['probes'][0]['healthy'] is False
+
+    with patch.object(router_modules['forwarder'].requests, 'request') as mock_request:
+        mock_request.return_value = FakeResponse()
+        for _ in range(3):
+            client.post(
+                '/ingest',
+                headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+                json={'destination': 'slack.ingest', 'payload': {}},
+            )
+
+    assert {c.kwargs['url'] for c in mock_request.call_args_list} == {'http://b.internal/ingest'}
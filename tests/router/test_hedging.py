@@ -0,0 +1,145 @@
+"""Latency tracking, hedged requests, and adaptive timeouts."""
+
+import threading
+
+import pytest
+
+from helpers import collecting_logger, import_service_module
+
+URLS = ['http://a.internal/status', 'http://b.internal/status']
+ROUTE = {
+    'method': 'GET',
+    'upstreams': URLS,
+    'url': URLS[0],
+    'auth_env': None,
+    'timeout_seconds': 5,
+    'hedge': {'percentile': 95, 'max_percent': 100, 'min_delay_ms': 10},
+}
+
+
+@pytest.fixture
+def latency():
+    return import_service_module('router', 'services.latency')
+
+
+@pytest.fixture
+def hedging():
+    return import_service_module('router', 'services.hedging')
+
+
+@pytest.fixture
+def delivery():
+    return import_service_module('router', 'services.delivery')
+
+
+def warmed_tracker(latency, seconds=0.01):
+    tracker = latency.LatencyTracker()
+    for _ in range(latency.MIN_SAMPLES):
+        tracker.record('status', seconds)
+    return tracker
+
+
+def test_percentile_needs_enough_samples(latency):
+    tracker = latency.LatencyTracker()
+    for _ in range(latency.MIN_SAMPLES - 1):
+        tracker.record('status', 0.01)
+    assert tracker.percentile('status', 95) is None
+
+    tracker.record('status', 0.01)
+    assert 0.01 <= tracker.percentile('status', 95) < 0.0125
+
+
+def test_percentile_reflects_the_slow_tail(latency):
+    tracker = latency.LatencyTracker()
+    for _ in range(90):
+        tracker.record('status', 0.01)
+    for _ in range(10):
+        tracker.record('status', 1.0)
+
+    assert tracker.percentile('status', 50) < 0.02
+    assert tracker.percentile('status', 99) >= 1.0
+
+
+def test_tracker_evicts_the_least_recently_used(latency, monkeypatch):
+    monkeypatch.setattr(latency, 'MAX_TRACKED', 2)
+    tracker = warmed_tracker(latency)
+    tracker.record('a', 0.01)
+    tracker.record('status', 0.01)
+    tracker.record('b', 0.01)
+
+    assert len(tracker) == 2
+    assert tracker.percentile('a', 50) is None
+    assert tracker.percentile('status', 50) is not None
+
+
+def test_slow_primary_is_hedged_to_another_replica(hedging, latency, delivery, monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def fake_deliver_to(destination, route_config, payload, correlation_id, log_json, deadline):
+        calls.append(route_config['url'])
+        if route_config['url'] == URLS[0]:
+            release.wait(2)
+            return delivery.DeliveryResult(200, b'"slow"')
+        return delivery.DeliveryResult(200, b'"fast"')
+
+    monkeypatch.setattr(delivery, '_deliver_to', fake_deliver_to)
+    pool = import_service_module('router', 'services.balancer').UpstreamPool(URLS, 'round_robin')
+    hedger = hedging.Hedger(4, warmed_tracker(latency))
+    log_json = collecting_logger()
+
+    try:
+        result = hedger.deliver('status', ROUTE, {}, 'cid', log_json, pool=pool)
+    finally:
+        release.set()
+
+    assert result.content == b'"fast"'
+    assert calls == URLS
+    assert 'Sending hedged request' in [e['message'] for e in log_json.entries]
+
+
+def test_expired_request_is_not_charged_to_a_replica(hedging, latency, delivery, monkeypatch):
+    calls = []
+    monkeypatch.setattr(delivery, '_deliver_to', lambda *args: calls.append(args))
+    pool = import_service_module('router', 'services.balancer').UpstreamPool(URLS, 'round_robin')
+    monkeypatch.setattr(pool, 'release', lambda *args, **kwargs: calls.append(args))
+    hedger = hedging.Hedger(4, warmed_tracker(latency))
+
+    result = hedger.deliver('status', ROUTE, {}, 'cid', collecting_logger(), hedging.time.monotonic() - 1, pool)
+
+    assert result.status_code == 504
+    assert calls == []
+
+
+def test_fast_primary_is_not_hedged(hedging, latency, delivery, monkeypatch):
+    calls = []
+
+    def fake_deliver(destination, route_config, payload, correlation_id, log_json, deadline=None):
+        calls.append(destination)
+        return delivery.DeliveryResult(200, b'{}')
+
+    monkeypatch.setattr(hedging, 'deliver', fake_deliver)
+    hedger = hedging.Hedger(4, warmed_tracker(latency, seconds=1.0))
+
+    result = hedger.deliver('status', {**ROUTE, 'upstreams': None}, {}, 'cid', collecting_logger())
+
+    assert result.status_code == 200
+    assert calls == ['status']
+
+
+def test_hedges_are_capped_by_max_percent(hedging, latency):
+    hedger = hedging.Hedger(1, latency.LatencyTracker())
+    for _ in range(10):
+        hedger._count_request('status')
+
+    assert hedger._take_hedge('status', 10)
+    assert not hedger._take_hedge('status', 10)
+
+
+def test_adaptive_timeout_is_clamped(latency):
+    route = {'timeout_seconds': 25, 'adaptive_timeout': {'percentile': 99, 'multiplier': 3, 'floor_seconds': 1}}
+
+    assert latency.adaptive_timeout(latency.LatencyTracker(), 'status', route) == 25
+    assert latency.adaptive_timeout(warmed_tracker(latency, 0.01), 'status', route) == 1
+    assert 6 <= latency.adaptive_timeout(warmed_tracker(latency, 2.0), 'status', route) < 8
+    assert latency.adaptive_timeout(warmed_tracker(latency, 20.0), 'status', route) == 25
@@ -12,7 +12,7 @@ from unittest.mock import patch
 
 import pytest
 
-from helpers import REPO_ROOT, FakeResponse
+from helpers import REPO_ROOT, FakeResponse, sent_json
 from router_support import INGRESS_KEY, ROUTES
 
 TAILSCALE_EVENTS = [
@@ -54,7 +54,7 @@ def test_tailscale_destination_routes_like_any_other(router_client, mock_request
     assert kwargs['method'] == 'POST'
     assert kwargs['timeout'] == 10
     # Payload reaches the internal service unchanged.
-    assert kwargs['json'] == TAILSCALE_EVENTS
+    assert sent_json(kwargs) == TAILSCALE_EVENTS
 
 
 def test_ordinary_destination_still_routes(router_client, mock_request):
@@ -70,7 +70,7 @@ def test_ordinary_destination_still_routes(router_client, mock_request):
 
     _, kwargs = mock_request.call_args
     assert kwargs['url'] == ROUTES['wikimgr']['url']
-    assert kwargs['json'] == {'text': 'hello'}
+    assert sent_json(kwargs) == {'text': 'hello'}
 
 
 def test_correlation_id_is_propagated(router_client, mock_request):
@@ -160,3 +160,46 @@ def test_router_source_contains_no_tailscale_logic():
     )
 
     assert result.stdout.strip() == '', f'Tailscale logic found in router: {result.stdout}'
+
+
+def test_deadline_caps_destination_timeout(router_client, mock_request):
+    client, _ = router_client
+
+    client.post(
+        '/ingest',
+        headers={**auth(), 'X-Request-Deadline-Ms': '2000'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    _, kwargs = mock_request.call_args
+    assert 0 < kwargs['timeout'] <= 2
+    # The shrinking budget travels on to the destination.
+    assert 0 < int(kwargs['headers']['X-Request-Deadline-Ms']) <= 2000
+
+
+def test_expired_deadline_is_dropped_before_forwarding(router_client, mock_request):
+    client, log_json = router_client
+
+    response = client.post(
+        '/ingest',
+        headers={**auth(), 'X-Request-Deadline-Ms': '0'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    assert response.status_code == 504
+    assert mock_request.call_count == 0
+    assert 'Deadline expired before forwarding' in [e['message'] for e in log_json.entries]
+
+
+def test_missing_deadline_keeps_route_timeout(router_client, mock_request):
+    client, _ = router_client
+
+    client.post(
+        '/ingest',
+        headers={**auth(), 'X-Request-Deadline-Ms': 'soon'},
+        json={'destination': 'wikimgr', 'payload': {}},
+    )
+
+    _, kwargs = mock_request.call_args
+    assert kwargs['timeout'] == ROUTES['wikimgr']['timeout_seconds']
+    assert 'X-Request-Deadline-Ms' not in kwargs['headers']
@@ -0,0 +1,54 @@
+"""The JSON codec gives the same text with or without orjson."""
+
+from unittest.mock import patch
+
+import pytest
+
+from helpers import import_service_module
+
+SAMPLES = [
+    {'destination': 'wikimgr', 'payload': {'text': 'héllo ✓', 'n': [1, 2.5, None, True]}},
+    [{'type': 'nodeCreated', 'data': {'nodeID': 'n1'}}],
+    {2: {'b': 1, 'a': 2}, 1: 'int keys'},
+    'plain string',
+]
+
+
+@pytest.fixture
+def codec():
+    return import_service_module('router', 'services.json_codec')
+
+
+@pytest.mark.parametrize('value', SAMPLES)
+@pytest.mark.parametrize('sort_keys', [False, True])
+def test_orjson_and_stdlib_agree(codec, value, sort_keys):
+    pytest.importorskip('orjson')
+
+    fast = codec.dumps_bytes(value, sort_keys=sort_keys)
+    with patch.object(codec, 'orjson', None):
+        slow = codec.dumps_bytes(value, sort_keys=sort_keys)
+
+    assert fast == slow
+    assert codec.dumps(value, sort_keys=sort_keys) == fast.decode('utf-8')
+
+
+@pytest.mark.parametrize('backend', ['default', 'stdlib'])
+def test_non_finite_floats_are_written_as_null(codec, backend):
+    value = {'nan': float('nan'), 'inf': [float('inf'), -float('inf')], 'ok': 1.5}
+
+    with patch.object(codec, 'orjson', None if backend == 'stdlib' else codec.orjson):
+        assert codec.dumps(value) == '{"nan":null,"inf":[null,null],"ok":1.5}'
+    # Even when a value only the standard library can encode forces the fallback.
+    assert codec.dumps({'big': 2 ** 70, 'nan': float('nan')}) == '{"big":1180591620717411303424,"nan":null}'
+
+
+def test_values_orjson_cannot_encode_fall_back(codec):
+    assert codec.dumps({'big': 2 ** 70}) == '{"big":1180591620717411303424}'
+
+
+@pytest.mark.parametrize('backend', ['default', 'stdlib'])
+def test_loads_accepts_bytes_and_rejects_garbage(codec, backend):
+    with patch.object(codec, 'orjson', None if backend == 'stdlib' else codec.orjson):
+        assert codec.loads(b'{"a":[1,"\xc3\xa9"]}') == {'a': [1, 'é']}
+        with pytest.raises(ValueError):
+            codec.loads(b'{not json')
@@ -0,0 +1,109 @@
+"""Key expressions and per-key ordered delivery."""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module, sent_json
+from router_support import INGRESS_KEY
+
+
+@pytest.fixture
+def key_expression():
+    return import_service_module('router', 'services.key_expression')
+
+
+@pytest.fixture
+def scheduler_module():
+    return import_service_module('router', 'services.ordered_delivery')
+
+
+def test_key_expressions_pick_fields(key_expression):
+    payload = {'repo': {'name': 'wiki'}, 'events': [{'nodeId': 'n1'}], 'count': 3}
+
+    def key(text, source='alice'):
+        return key_expression.parse_key_expression(text).extract(payload, source)
+
+    assert key('payload.repo.name') == 'wiki'
+    assert key('payload.events.0.nodeId') == 'n1'
+    assert key('payload.count') == '3'
+    assert key('payload.missing.field') is None
+    assert key('source') == 'alice'
+    assert key('source', source=None) is None
+
+
+@pytest.mark.parametrize('text', ['', 'body.id', 'source.name', 'payload..id', None])
+def test_malformed_key_expressions_are_rejected(key_expression, text):
+    with pytest.raises(ValueError):
+        key_expression.parse_key_expression(text)
+
+
+def test_same_key_runs_in_order_and_other_keys_run_alongside(scheduler_module):
+    scheduler = scheduler_module.PartitionedScheduler(max_workers=4)
+    release = threading.Event()
+    order = []
+
+    def task(name, block=False):
+        def run():
+            if block:
+                release.wait(2)
+            order.append(name)
+            return name
+        return run
+
+    first = scheduler.submit('a', task('a1', block=True))
+    second = scheduler.submit('a', task('a2'))
+    other = scheduler.submit('b', task('b1'))
+
+    assert other.result(timeout=1) == 'b1'
+    assert not second.done()
+
+    release.set()
+    assert [first.result(timeout=1), second.result(timeout=1)] == ['a1', 'a2']
+    assert order == ['b1', 'a1', 'a2']
+
+
+def test_ingest_orders_by_edge_source():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    forwarder = import_service_module('router', 'services.forwarder')
+    route = {
+        'method': 'POST',
+        'url': 'http://wikimgr.internal:8000/append',
+        'auth_env': None,
+        'timeout_seconds': 10,
+        'ordering': {'key': 'source'},
+    }
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(
+        {'wikimgr.append_log': route}, INGRESS_KEY, collecting_logger()
+    ))
+    client = app.test_client()
+    in_flight = []
+    overlapped = []
+
+    def slow_request(**kwargs):
+        in_flight.append(sent_json(kwargs)['n'])
+        overlapped.append(len(in_flight) > 1)
+        time.sleep(0.02)
+        in_flight.remove(sent_json(kwargs)['n'])
+        return FakeResponse()
+
+    def post(n):
+        client.post(
+            '/ingest',
+            headers={'Authorization': f'Bearer {INGRESS_KEY}', 'X-Edge-Source': 'alice'},
+            json={'destination': 'wikimgr.append_log', 'payload': {'n': n}},
+        )
+
+    with patch.object(forwarder.requests, 'request', side_effect=slow_request):
+        threads = [threading.Thread(target=post, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(2)
+
+    assert len(overlapped) == 4
+    assert not any(overlapped)
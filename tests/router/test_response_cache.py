@@ -0,0 +1,121 @@
+"""Response caching for GET routes."""
+
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+from router_support import INGRESS_KEY
+
+
+@pytest.fixture
+def cache_module():
+    return import_service_module('router', 'services.response_cache')
+
+
+@pytest.fixture
+def result_cls():
+    return import_service_module('router', 'services.delivery').DeliveryResult
+
+
+def test_key_ignores_payload_key_order(cache_module):
+    assert cache_module.cache_key('s', {'a': 1, 'b': 2}) == cache_module.cache_key('s', {'b': 2, 'a': 1})
+    assert cache_module.cache_key('s', {'a': 1}) != cache_module.cache_key('t', {'a': 1})
+
+
+def test_hit_within_ttl_and_reload_after(cache_module, result_cls):
+    cache = cache_module.ResponseCache(ttl_seconds=0.05, max_entries=10, max_bytes=1024)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return result_cls(200, b'ok')
+
+    assert cache.get_or_load('k', load)[1] == 'miss'
+    assert cache.get_or_load('k', load)[1] == 'hit'
+    time.sleep(0.06)
+    assert cache.get_or_load('k', load)[1] == 'miss'
+    assert len(loads) == 2
+
+
+def test_errors_are_not_cached(cache_module, result_cls):
+    cache = cache_module.ResponseCache(ttl_seconds=60, max_entries=10, max_bytes=1024)
+
+    cache.get_or_load('k', lambda: result_cls(502, b'bad'))
+
+    assert cache.get_or_load('k', lambda: result_cls(200, b'ok'))[1] == 'miss'
+
+
+def test_lru_eviction_by_count_and_bytes(cache_module, result_cls):
+    cache = cache_module.ResponseCache(ttl_seconds=60, max_entries=2, max_bytes=10)
+    cache.get_or_load('a', lambda: result_cls(200, b'aaaa'))
+    cache.get_or_load('b', lambda: result_cls(200, b'bbbb'))
+    cache.get_or_load('a', lambda: result_cls(200, b'aaaa'))  # a is now most recent
+    cache.get_or_load('c', lambda: result_cls(200, b'cccc'))  # evicts b
+
+    assert cache.get_or_load('a', lambda: result_cls(200, b'x'))[1] == 'hit'
+    assert cache.get_or_load('b', lambda: result_cls(200, b'bbbb'))[1] == 'miss'
+
+    # Too large to ever fit, so never stored.
+    cache.get_or_load('big', lambda: result_cls(200, b'x' * 11))
+    assert cache.get_or_load('big', lambda: result_cls(200, b'x'))[1] == 'miss'
+
+
+def test_concurrent_misses_share_one_load(cache_module, result_cls):
+    cache = cache_module.ResponseCache(ttl_seconds=60, max_entries=10, max_bytes=1024)
+    release = threading.Event()
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        release.wait(2)
+        return result_cls(200, b'ok')
+
+    sources = []
+    threads = [
+        threading.Thread(target=lambda: sources.append(cache.get_or_load('k', slow_load)[1]))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert len(loads) == 1
+    assert sorted(sources) == ['miss'] + ['shared'] * 4
+
+
+def test_ingest_serves_repeat_gets_from_cache(router_modules):
+    route = {
+        'method': 'GET',
+        'url': 'http://status.internal/status',
+        'auth_env': None,
+        'timeout_seconds': 5,
+        'cache': {'ttl_seconds': 60, 'max_entries': 10, 'max_bytes': 1024},
+    }
+    log_json = collecting_logger()
+    app = Flask(__name__)
+    app.register_blueprint(router_modules['routes'].create_router_blueprint(
+        {'status-checker': route}, INGRESS_KEY, log_json
+    ))
+    client = app.test_client()
+
+    with patch.object(router_modules['forwarder'].requests, 'request') as mock_request:
+        mock_request.return_value = FakeResponse(content=b'{"up": true}')
+        responses = [
+            client.post(
+                '/ingest',
+                headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+                json={'destination': 'status-checker', 'payload': {'q': 1}},
+            )
+            for _ in range(3)
+        ]
+
+    assert mock_request.call_count == 1
+    assert [r.get_json() for r in responses] == [{'up': True}] * 3
+    assert 'Served from response cache' in [e['message'] for e in log_json.entries]
@@ -0,0 +1,117 @@
+"""Wildcard destinations."""
+
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module
+from router_support import INGRESS_KEY
+
+
+def route(url, **extra):
+    return {'method': 'POST', 'url': url, 'auth_env': None, 'timeout_seconds': 10, **extra}
+
+
+ROUTES = {
+    'wikimgr.*': route('http://wiki.internal:8000/{suffix}', auth_env='DEST_WIKIMGR_SECRET'),
+    'wikimgr.admin.*': route('http://wiki-admin.internal:9000'),
+    'wikimgr.health': route('http://wiki.internal:8000/healthz', method='GET'),
+}
+
+
+@pytest.fixture
+def table():
+    return import_service_module('router', 'services.route_table').RouteTable(ROUTES)
+
+
+def test_exact_names_win(table):
+    assert table.get('wikimgr.health')['url'] == 'http://wiki.internal:8000/healthz'
+
+
+def test_suffix_builds_the_url_and_settings_are_inherited(table):
+    resolved = table.get('wikimgr.logs.captured')
+
+    assert resolved['url'] == 'http://wiki.internal:8000/logs/captured'
+    assert resolved['auth_env'] == 'DEST_WIKIMGR_SECRET'
+
+
+def test_longest_prefix_wins_and_url_without_placeholder_gets_a_path(table):
+    assert table.get('wikimgr.admin.reindex')['url'] == 'http://wiki-admin.internal:9000/reindex'
+
+
+@pytest.mark.parametrize('name', ['wikimgr', 'wikimgr.*', 'other.thing', None])
+def test_unserved_names(table, name):
+    assert table.get(name) is None
+
+
+@pytest.mark.parametrize('name', [
+    'wikimgr.a?x=1#',
+    'wikimgr.page#frag',
+    'wikimgr.%2e%2e.secret',
+    'wikimgr.a%2fb',
+    'wikimgr.a b',
+    'wikimgr.logs..captured',
+    'wikimgr.admin.re?index',
+])
+def test_unsafe_suffixes_match_nothing(table, name):
+    assert table.get(name) is None
+
+
+def test_unsafe_suffix_is_unknown_destination():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    forwarder = import_service_module('router', 'services.forwarder')
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(ROUTES, INGRESS_KEY, collecting_logger()))
+
+    with patch.object(forwarder.requests, 'request') as mock_request:
+        response = app.test_client().post(
+            '/ingest',
+            headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+            json={'destination': 'wikimgr.a?x=1#', 'payload': {}},
+        )
+
+    assert response.status_code == 404
+    assert not mock_request.called
+
+
+def test_ingest_delivers_to_wildcard_destination():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    forwarder = import_service_module('router', 'services.forwarder')
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(ROUTES, INGRESS_KEY, collecting_logger()))
+
+    with patch.object(forwarder.requests, 'request', return_value=FakeResponse()) as mock_request:
+        response = app.test_client().post(
+            '/ingest',
+            headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+            json={'destination': 'wikimgr.append_log', 'payload': {}},
+        )
+
+    assert response.status_code == 200
+    assert mock_request.call_args.kwargs['url'] == 'http://wiki.internal:8000/append_log'
+
+
+def test_latency_is_tracked_per_configured_route():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    forwarder = import_service_module('router', 'services.forwarder')
+    routes = {
+        **ROUTES,
+        'status.*': route('http://status.internal/{suffix}',
+                          adaptive_timeout={'percentile': 99, 'multiplier': 3, 'floor_seconds': 1}),
+    }
+    tracker = routes_module.LatencyTracker()
+    app = Flask(__name__)
+    with patch.object(routes_module, 'LatencyTracker', return_value=tracker):
+        app.register_blueprint(routes_module.create_router_blueprint(routes, INGRESS_KEY, collecting_logger()))
+
+    with patch.object(forwarder.requests, 'request', return_value=FakeResponse()):
+        for destination in ('status.a', 'status.b', 'wikimgr.append_log'):
+            app.test_client().post(
+                '/ingest',
+                headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+                json={'destination': destination, 'payload': {}},
+            )
+
+    # One histogram for the wildcard route, none for routes that do not adapt.
+    assert list(tracker._histograms) == ['status.*']  # pylint: disable=protected-access
@@ -0,0 +1,398 @@
+"""routes.yml loading and validation."""
+
+import pytest
+
+from helpers import import_service_module
+
+
+@pytest.fixture
+def load_routes_from(tmp_path, monkeypatch):
+    loader = import_service_module('router', 'config.routes_loader')
+
+    def _load(text):
+        routes_file = tmp_path / 'routes.yml'
+        routes_file.write_text(text)
+        monkeypatch.setattr(loader, 'ROUTES_FILE', routes_file)
+        return loader.load_routes()
+
+    return _load
+
+
+def test_defaults_are_applied(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  simple:
+    url: http://svc.internal/hook
+''')
+
+    assert routes['simple'] == {
+        'url': 'http://svc.internal/hook',
+        'method': 'POST',
+        'timeout_seconds': 25,
+        'auth_env': None,
+    }
+
+
+def test_missing_url_exits(load_routes_from):
+    with pytest.raises(SystemExit):
+        load_routes_from('''
+destinations:
+  broken:
+    method: POST
+''')
+
+
+def test_fanout_targets_inherit_route_settings(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  ci.events:
+    timeout_seconds: 7
+    auth_env: CI_TOKEN
+    aggregate: quorum
+    targets:
+      - http://a.internal/hook
+      - name: wiki
+        url: http://b.internal/hook
+        timeout_seconds: 3
+''')
+
+    route = routes['ci.events']
+    assert route['aggregate'] == 'quorum'
+    assert route['targets'][0] == {
+        'name': 'ci.events[0]',
+        'url': 'http://a.internal/hook',
+        'method': 'POST',
+        'timeout_seconds': 7,
+        'auth_env': 'CI_TOKEN',
+    }
+    assert route['targets'][1]['name'] == 'wiki'
+    assert route['targets'][1]['timeout_seconds'] == 3
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'targets: []',
+        'targets: [http://a]\n    aggregate: most',
+        'targets: [http://a]\n    aggregate: quorum\n    quorum: 2',
+        'targets: [{method: GET}]',
+    ],
+    ids=['empty', 'unknown-policy', 'quorum-too-large', 'target-without-url'],
+)
+def test_invalid_fanout_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    {route_yaml}
+''')
+
+
+def test_upstreams_default_to_round_robin(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  slack.ingest:
+    upstreams:
+      - http://a.internal/ingest
+      - http://b.internal/ingest
+''')
+
+    route = routes['slack.ingest']
+    assert route['balancer'] == 'round_robin'
+    assert route['url'] == 'http://a.internal/ingest'
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    ['upstreams: []', 'upstreams: [http://a, http://a]', 'upstreams: [http://a]\n    balancer: random'],
+    ids=['empty', 'duplicate', 'unknown-balancer'],
+)
+def test_invalid_upstreams_exit(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    {route_yaml}
+''')
+
+
+def test_cache_defaults_are_applied(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  status-checker:
+    method: GET
+    url: http://status.internal/status
+    cache:
+      ttl_seconds: 10
+''')
+
+    assert routes['status-checker']['cache'] == {
+        'ttl_seconds': 10,
+        'max_entries': 256,
+        'max_bytes': 1024 * 1024,
+    }
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'method: POST\n    cache: {ttl_seconds: 10}',
+        'method: GET\n    cache: {}',
+        'method: GET\n    cache: {ttl_seconds: 10, max_entries: 0}',
+    ],
+    ids=['not-get', 'no-ttl', 'zero-entries'],
+)
+def test_invalid_cache_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    url: http://a
+    {route_yaml}
+''')
+
+
+def test_hedge_defaults_are_applied(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  status:
+    method: GET
+    url: http://status.internal/status
+    hedge: {}
+''')
+
+    assert routes['status']['hedge'] == {'percentile': 95, 'max_percent': 10, 'min_delay_ms': 10}
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'hedge: {}',
+        'method: GET\n    hedge: {percentile: 100}',
+        'method: GET\n    hedge: {max_percent: 0}',
+        'method: GET\n    hedge: {min_delay_ms: -1}',
+        'method: GET\n    targets: [http://b]\n    hedge: {}',
+    ],
+    ids=['not-idempotent', 'bad-percentile', 'zero-budget', 'negative-delay', 'with-targets'],
+)
+def test_invalid_hedge_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    url: http://a
+    {route_yaml}
+''')
+
+
+def test_adaptive_timeout_defaults_are_applied(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  svc:
+    url: http://svc.internal/hook
+    adaptive_timeout: {}
+''')
+
+    assert routes['svc']['adaptive_timeout'] == {'percentile': 99, 'multiplier': 3, 'floor_seconds': 1}
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'adaptive_timeout: {multiplier: 0.5}',
+        'timeout_seconds: 2\n    adaptive_timeout: {floor_seconds: 5}',
+        'targets: [http://b]\n    adaptive_timeout: {}',
+    ],
+    ids=['multiplier-below-one', 'floor-above-ceiling', 'with-targets'],
+)
+def test_invalid_adaptive_timeout_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    url: http://a
+    {route_yaml}
+''')
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'delivery: eventually',
+        'method: GET\n    delivery: durable\n    cache: {ttl_seconds: 10}',
+    ],
+    ids=['unknown-mode', 'durable-with-cache'],
+)
+def test_invalid_delivery_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    url: http://a
+    {route_yaml}
+''')
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'ordering: source',
+        'ordering: {key: headers.x}',
+        'delivery: durable\n    ordering: {key: source}',
+    ],
+    ids=['not-a-mapping', 'bad-expression', 'with-durable'],
+)
+def test_invalid_ordering_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    url: http://a
+    {route_yaml}
+''')
+
+
+def test_coalesce_defaults_are_applied(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  tailscale:
+    url: http://notifier.internal/hook
+    coalesce: {key: payload.node, window_ms: 2000}
+''')
+
+    assert routes['tailscale']['coalesce'] == {
+        'key': 'payload.node', 'window_ms': 2000, 'mode': 'latest', 'max_events': 100,
+    }
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'coalesce: {mode: latest}',
+        'coalesce: {window_ms: 100, mode: merge}',
+        'coalesce: {window_ms: 100, key: body.id}',
+        'coalesce: {window_ms: 100, max_events: 0}',
+    ],
+    ids=['no-window', 'unknown-mode', 'bad-key', 'zero-max-events'],
+)
+def test_invalid_coalesce_exits(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  bad:
+    url: http://a
+    {route_yaml}
+''')
+
+
+@pytest.mark.parametrize(
+    'rules_yaml',
+    [
+        'rules: []',
+        'rules: [{match: {}, destination: svc}]',
+        'rules: [{match: {payload.type: x}, destination: missing}]',
+        'rules: [{match: {payload.type: x}, destination: bad}]',
+        'rules: [{match: {body.type: x}, destination: svc}]',
+    ],
+    ids=['empty', 'empty-match', 'unknown-destination', 'rules-route-target', 'bad-field'],
+)
+def test_invalid_rules_exit(load_routes_from, rules_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  svc:
+    url: http://svc
+  bad:
+    {rules_yaml}
+''')
+
+
+def test_rules_route_needs_no_url(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  svc:
+    url: http://svc
+  events:
+    rules:
+      - match: {payload.type: push}
+        destination: svc
+''')
+
+    assert 'url' not in routes['events']
+
+
+@pytest.mark.parametrize(
+    'route_yaml',
+    [
+        'svc.*x:\n    url: http://a',
+        '"*.svc":\n    url: http://a',
+        'svc.*:\n    url: http://a\n    cache: {ttl_seconds: 1}',
+    ],
+    ids=['not-last-segment', 'leading-wildcard', 'stateful-feature'],
+)
+def test_invalid_wildcard_routes_exit(load_routes_from, route_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  {route_yaml}
+''')
+
+
+def test_transforms_are_compiled_and_inherited_by_targets(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  ci.events:
+    transform:
+      select: [id]
+    targets:
+      - http://a.internal/hook
+      - url: http://b.internal/hook
+        transform:
+          static: {kind: ci}
+''')
+
+    first, second = routes['ci.events']['targets']
+    assert first['transform'] is routes['ci.events']['transform']
+    assert first['transform']({'id': 1, 'extra': True}) == {'id': 1}
+    assert second['transform']({'id': 1}) == {'id': 1, 'kind': 'ci'}
+
+
+@pytest.mark.parametrize(
+    'transform_yaml',
+    ['[id]', '{pick: [id]}', '{select: []}', '{rename: {a..b: c}}'],
+    ids=['not-mapping', 'unknown-step', 'empty-select', 'empty-field'],
+)
+def test_invalid_transform_exits(load_routes_from, transform_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  svc:
+    url: http://svc.internal/hook
+    transform: {transform_yaml}
+''')
+
+
+def test_compression_defaults_are_applied(load_routes_from):
+    routes = load_routes_from('''
+destinations:
+  svc:
+    url: http://svc.internal/hook
+    compression: {}
+''')
+
+    assert routes['svc']['compression'] == {'encoding': 'gzip', 'min_bytes': 1024}
+
+
+@pytest.mark.parametrize(
+    'compression_yaml',
+    ['gzip', '{encoding: br}', '{min_bytes: -1}'],
+    ids=['not-mapping', 'unknown-encoding', 'negative-threshold'],
+)
+def test_invalid_compression_exits(load_routes_from, compression_yaml):
+    with pytest.raises(SystemExit):
+        load_routes_from(f'''
+destinations:
+  svc:
+    url: http://svc.internal/hook
+    compression: {compression_yaml}
+''')
@@ -0,0 +1,90 @@
+"""Content-based routing rules."""
+
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from helpers import FakeResponse, collecting_logger, import_service_module, sent_json
+from router_support import INGRESS_KEY
+
+RULES = [
+    {'match': {'payload.type': 'nodeApproved'}, 'destination': 'approvals'},
+    {'match': {'payload.type': ['nodeCreated', 'nodeDeleted']}, 'destination': 'nodes'},
+    {'match': {'payload.type': 'nodeCreated', 'source': 'ops'}, 'destination': 'ops-nodes'},
+    {'match': {'payload.count': 1}, 'destination': 'singles'},
+]
+
+
+def route(url):
+    return {'method': 'POST', 'url': url, 'auth_env': None, 'timeout_seconds': 10}
+
+
+@pytest.fixture
+def rules_module():
+    return import_service_module('router', 'services.routing_rules')
+
+
+def test_first_matching_rule_wins(rules_module):
+    index = rules_module.RuleIndex(RULES)
+
+    assert index.lookup({'type': 'nodeApproved'}, None) == 'approvals'
+    assert index.lookup({'type': 'nodeDeleted'}, None) == 'nodes'
+    # Both rule 1 and rule 2 match; rule 1 comes first.
+    assert index.lookup({'type': 'nodeCreated'}, 'ops') == 'nodes'
+    assert index.lookup({'type': 'other'}, None) is None
+    assert index.lookup('not a mapping', None) is None
+
+
+def test_values_match_by_type(rules_module):
+    index = rules_module.RuleIndex(RULES)
+
+    assert index.lookup({'count': 1}, None) == 'singles'
+    assert index.lookup({'count': '1'}, None) is None
+    assert index.lookup({'count': True}, None) is None
+
+
+def test_event_batches_are_split_by_rule():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    forwarder = import_service_module('router', 'services.forwarder')
+    routes = {
+        'events': {**route('http://fallback.internal/events'), 'rules': RULES},
+        'approvals': route('http://approvals.internal/hook'),
+        'nodes': route('http://nodes.internal/hook'),
+    }
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(routes, INGRESS_KEY, collecting_logger()))
+
+    events = [{'type': 'nodeApproved'}, {'type': 'nodeCreated'}, {'type': 'other'}, {'type': 'nodeDeleted'}]
+    with patch.object(forwarder.requests, 'request', return_value=FakeResponse()) as mock_request:
+        response = app.test_client().post(
+            '/ingest',
+            headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+            json={'destination': 'events', 'payload': events},
+        )
+
+    delivered = {call.kwargs['url']: sent_json(call.kwargs) for call in mock_request.call_args_list}
+    assert response.status_code == 200
+    assert delivered == {
+        'http://approvals.internal/hook': [events[0]],
+        'http://nodes.internal/hook': [events[1], events[3]],
+        'http://fallback.internal/events': [events[2]],
+    }
+
+
+def test_unmatched_message_without_fallback_is_rejected():
+    routes_module = import_service_module('router', 'http_handlers.routes')
+    routes = {
+        'events': {'method': 'POST', 'auth_env': None, 'timeout_seconds': 10, 'rules': RULES[:1]},
+        'approvals': route('http://approvals.internal/hook'),
+    }
+    app = Flask(__name__)
+    app.register_blueprint(routes_module.create_router_blueprint(routes, INGRESS_KEY, collecting_logger()))
+
+    response = app.test_client().post(
+        '/ingest',
+        headers={'Authorization': f'Bearer {INGRESS_KEY}'},
+        json={'destination': 'events', 'payload': {'type': 'other'}},
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,82 @@
+"""Declarative payload transforms."""
+
+from unittest.mock import patch
+
+import pytest
+
+from helpers import FakeResponse, collecting_logger, import_service_module, sent_json
+
+
+@pytest.fixture
+def transform_module():
+    return import_service_module('router', 'services.transform')
+
+
+def test_steps_run_in_order_without_touching_the_payload(transform_module):
+    transform = transform_module.compile_transform({
+        'select': ['nodeId', 'actor.loginName', 'missing'],
+        'rename': {'actor.loginName': 'user', 'nodeId': 'node.id'},
+        'static': {'source': 'webhook-router'},
+    })
+    payload = {'nodeId': 'n1', 'actor': {'loginName': 'alice', 'id': 7}, 'noise': True}
+
+    assert transform(payload) == {'actor': {}, 'user': 'alice', 'node': {'id': 'n1'}, 'source': 'webhook-router'}
+    assert payload == {'nodeId': 'n1', 'actor': {'loginName': 'alice', 'id': 7}, 'noise': True}
+
+
+def test_flatten_forwards_the_items_of_each_batch(transform_module):
+    transform = transform_module.compile_transform({'flatten': 'events', 'select': ['type']})
+
+    assert transform({'events': [{'type': 'a', 'x': 1}, {'type': 'b'}]}) == [{'type': 'a'}, {'type': 'b'}]
+    assert transform([{'events': [{'type': 'a'}]}, {'events': 'oops'}, {'events': [{'type': 'c'}]}]) == [
+        {'type': 'a'}, {'events': 'oops'}, {'type': 'c'},
+    ]
+
+
+def test_payload_without_the_flatten_path_passes_through(transform_module):
+    transform = transform_module.compile_transform({'flatten': 'events', 'static': {'kind': 'x'}})
+    payload = {'type': 'ping'}
+
+    # Never an empty list: the destination gets what was sent.
+    assert transform(payload) is payload
+    assert transform({'events': []}) == {'events': []}
+
+
+def test_select_follows_list_indices(transform_module):
+    transform = transform_module.compile_transform({'select': ['events.1.type', 'events.0', 'events.7']})
+    payload = {'events': [{'type': 'a', 'x': 1}, {'type': 'b', 'x': 2}, {'type': 'c'}], 'noise': True}
+
+    assert transform(payload) == {'events': [{'type': 'a', 'x': 1}, {'type': 'b'}]}
+
+
+def test_rename_moves_values_through_lists(transform_module):
+    transform = transform_module.compile_transform({
+        'rename': {'events.0.actor': 'events.0.user', 'events.1': 'last', 'events.9.x': 'missing'},
+        'static': {'events.5.flag': True},
+    })
+    payload = {'events': [{'actor': 'alice', 'type': 'a'}, {'type': 'b'}]}
+
+    assert transform(payload) == {'events': [{'type': 'a', 'user': 'alice'}], 'last': {'type': 'b'}}
+    assert payload == {'events': [{'actor': 'alice', 'type': 'a'}, {'type': 'b'}]}
+
+
+def test_non_object_items_pass_through(transform_module):
+    transform = transform_module.compile_transform({'static': {'kind': 'x'}})
+
+    assert transform(['text', {'a': 1}]) == ['text', {'a': 1, 'kind': 'x'}]
+
+
+def test_forwarder_sends_the_transformed_payload(transform_module):
+    forwarder = import_service_module('router', 'services.forwarder')
+    route_config = {
+        'method': 'POST',
+        'url': 'http://svc.internal/hook',
+        'auth_env': None,
+        'timeout_seconds': 10,
+        'transform': transform_module.compile_transform({'rename': {'id': 'eventId'}}),
+    }
+
+    with patch.object(forwarder.requests, 'request', return_value=FakeResponse()) as mock_request:
+        forwarder.forward_to_destination('svc', route_config, {'id': 3}, 'cid-1', collecting_logger())
+
+    assert sent_json(mock_request.call_args.kwargs) == {'eventId': 3}